@@ -4,6 +4,8 @@ import bpy
 import numpy as np
 from abc import abstractmethod
 
+BACKGROUND_IMAGE_NODE_NAME = "Background Image"
+
 
 class BackgroundImageGenerator:
     """
@@ -61,6 +63,7 @@ class BackgroundImageGenerator:
         # Create new image node if it does not exist
         if self.image_node is None:
             image_node = tree.nodes.new("CompositorNodeImage")
+            image_node.name = BACKGROUND_IMAGE_NODE_NAME
             image_node.location = (100, 700)
             background_image = self.get_background_image()
             image = bpy.data.images.new(
@@ -3,6 +3,7 @@
 import bpy
 from typing import List
 
+from utils.tracer import trace_span
 from blender_objects.blender_object import BlenderObject
 
 
@@ -14,14 +15,14 @@ class BlenderCollection:
     def __init__(
         self,
         name: str,
-        parent_collection: bpy.types.Collection = bpy.context.scene.collection,
+        parent_collection: bpy.types.Collection | None = None,
     ) -> None:
         """
         Initialize the Blender collection.
 
         Args:
             name (str): The name of the Blender collection.
-            parent_collection (bpy.types.Collection): The parent collection to add the collection to. Defaults to the scene collection.
+            parent_collection (bpy.types.Collection | None, optional): The parent collection to add the collection to. Defaults to the collection of the current scene.
 
         Raises:
             Exception: If the collection already exists in the scene.
@@ -31,6 +32,10 @@ class BlenderCollection:
                 f"❌ Collection with name '{name}' already exists in the scene."
             )
 
+        # The scene is only looked up now, since the file may have been reloaded since import
+        if parent_collection is None:
+            parent_collection = bpy.context.scene.collection
+
         # Create the collection
         self.collection = bpy.data.collections.new(name)
         parent_collection.children.link(self.collection)
@@ -90,7 +95,8 @@ class BlenderCollection:
             )
 
         for obj in self.objects:
-            obj.apply_to_collection(self.collection)
+            with trace_span(type(obj).__name__, category="blender_object"):
+                obj.apply_to_collection(self.collection)
         bpy.context.view_layer.update()
 
         self.is_added_to_collection = True
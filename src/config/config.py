@@ -7,6 +7,7 @@ wrk_dir = os.getcwd()
 DATA_PATH = os.path.join(wrk_dir, "..", "data")
 INPUTS_FOLDER = os.path.join(DATA_PATH, "inputs")
 RENDER_FOLDER_PATH = os.path.join(DATA_PATH, "renders")
+RENDER_FOLDER_SHARD_LEVELS = 0 # Number of shard folder levels above the run folders, each with up to 256 folders, 0 for a flat layout
 
 # The generation seed. If None, a random seed will be used
 SEED = None
@@ -21,7 +22,7 @@ CAMERA_ID = "camera"
 ARMATURE_NAME = "Armature"
 BACKGROUND_COLLECTION_NAME = "Background"
 
-CAMERA_TYPE = "PANO" # Either PERSP or PANO
+CAMERA_TYPE = "PANO" # Either PERSP, PANO or ORTHO
 CAMERA_FOCAL_LENGTH = 25 # Camera focal length parameter
 CAMERA_FOV_DEGREES = 120 # Camera field of view parameter, not used for PERSP
 
@@ -32,8 +33,57 @@ HIDE_ARMATURE_PROBABILITY = 0.5 # Probability of hiding the armature during rend
 ANIMATION_LENGTH = 100 # Number of frames per animation
 BACKGROUND_COLOR_SKEW_FACTOR = 1.2 # Factor to skew the background color towards lighter colors (1.0 is no skew)
 BOUNDING_BOX_PADDING = 0.025 # Padding factor for the constellation bounding box of the scene
+ROI_CROP_SIZE = None # Size in pixels of the square bg and no-bg crops written around the bounding box, None to disable
 TAGS_THRESHOLD = 10
 CENTER_CAMERA_ON_DEVICE_PROBABILITY = 0.5 # Probability of centering the camera on the device at the start of the animation
+RENDER_PROFILE = None # Name of the render profile applied before rendering, either preview, production or ir-fast, None to keep the render settings of the blend file
+PROFILE_COMPARISON_N_FRAMES = 5 # Number of frames, evenly spaced over the timeline, rendered with each profile by --compare-profiles
+PROFILE_COMPARISON_FILE_NAME = "profile_comparison.json" # Name of the file of the time per frame and image difference of each profile
+SINGLE_PASS_RENDER = False # Whether to write the bg and no-bg images from a single render instead of two, where LEDs hidden behind background objects are also black in the no-bg image
+ANIMATION_RENDER = False # Whether to compute the frame data in a sweep over the timeline, then render each pass as one animation with persistent data
+ANIMATION_FOLDER_NAME = "animation" # Name of the temporary folder of the composite images written by animation renders
+DEDUPLICATE_FRAMES = False # Whether to link the outputs of the previous frame instead of rendering a frame whose armature pose, camera and animated visibilities did not change, not with sharded output or the animation render
+DEDUPLICATE_FRAMES_TOLERANCE = 1e-6 # Step the transforms are rounded to when comparing the scene state of frames, so that movements of negligible amplitude are ignored
+VISIBILITY_GATE = False # Whether to decide from the cheap annotation of each frame whether to render it, only render its no-bg pass, or skip it
+GATE_MIN_VISIBLE_LEDS = 1 # Minimum number of LEDs in frame, not occluded and close enough, for a frame to be fully rendered
+GATE_MAX_DISTANCE = None # Maximum distance from the camera of the LEDs counted by the gate, None for no limit
+GATE_FALLBACK_DECISION = "skip" # Decision for the frames failing the gate, either no_bg_only or skip, which only writes the frame data
+SCENE_ACCEPTANCE = False # Whether to simulate the timeline of each generated scene before rendering it, and generate a new one with a new seed if it is rejected
+SCENE_ACCEPTANCE_MAX_ATTEMPTS = 10 # Maximum number of scenes generated by a run before giving up
+ACCEPTANCE_MIN_IN_FRAME_RATIO = 0.3 # Minimum ratio of frames with at least one LED in frame for a scene to be accepted
+ACCEPTANCE_MIN_VISIBLE_FRAME_RATIO = 0.0 # Minimum ratio of frames with at least one LED in frame and not occluded for a scene to be accepted
+ACCEPTANCE_MIN_VISIBLE_LED_RATIO = 0.0 # Minimum mean ratio of LEDs in frame and not occluded per frame for a scene to be accepted
+NO_BG_BORDER_RENDER = False # Whether to only render the region of the in-frame LEDs in the no-bg pass, and skip it without LED in frame
+NO_BG_BORDER_PADDING = 0.05 # Padding of the no-bg render region around the in-frame LEDs, in camera view coordinates
+LED_MATERIAL_PASS_INDEX = 1 # Material pass index of the stylus LED materials, used to mask the no-bg image in single pass rendering
+RAY_CAST_OCCLUSION = True # Whether to decide the LED occlusion by casting a ray from each LED center to the camera
+PIXEL_VISIBILITY = False # Whether to count the visible pixels of each LED from the object index pass, deciding the occlusion if ray casts are disabled
+
+# Memory management, orphaned data is only purged when one of these limits is crossed
+MEMORY_RSS_GROWTH_WATERMARK_MB = 2048 # Process memory growth since the first render or the last purge above which to purge, in MB, only tracked where /proc is available
+MEMORY_DATABLOCKS_GROWTH_WATERMARK = 100 # Number of datablocks created since the first render or the last purge above which to purge
+MEMORY_TREND_WINDOW = 10 # Number of renders over which the memory growth is estimated
+MEMORY_TREND_THRESHOLD_MB = 20 # Memory growth per render above which a leak is assumed, in MB
+
+# Annotation output
+ANNOTATION_FILE_NAME = "data.jsonl" # Name of the frame data file, one JSON record per line
+ANNOTATION_INDEX_FILE_NAME = "data.index.json" # Name of the frame data offset index, written once all frames are recorded
+ANNOTATION_FSYNC_INTERVAL = 10 # Number of frame records written between two syncs to disk
+COLUMNAR_ANNOTATIONS = False # Whether to also write the frame data as (frames × LEDs) NumPy arrays
+COLUMNAR_ANNOTATION_FOLDER_NAME = "columnar" # Name of the folder of the columnar frame data
+SHARDED_OUTPUT = False # Whether to pack the images and annotation of each frame into tar shards instead of loose files
+SHARD_FOLDER_NAME = "shards" # Name of the shard folder, inside the render folder
+SHARD_MAX_SIZE_MB = 1024 # Size above which a new shard is started, in MB, an interrupted shard being recovered up to its last complete frame on resume
+FRAME_STORE = False # Whether to also write the bg and no-bg images of every frame to (frames × H × W × C) NumPy memory maps, requiring the Standard view transform and not with single pass rendering; the bg and no-bg images are then only written for sharded output or crops
+FRAME_STORE_FOLDER_NAME = "frame_store" # Name of the frame store folder, inside the render folder
+CAMERA_EXPORT_FOLDER_NAME = "camera_export" # Name of the folder of the per-frame camera, stylus and LED matrices, used to recompute labels without Blender
+RENDER_PARTS_FOLDER_NAME = "parts" # Name of the folder of the run files written by each worker, removed once merged
+SCENE_FILE_NAME = "scene.blend" # Name of the scene file saved in the render folder for the workers
+RENDER_STATE_FILE_NAME = "render_state.json" # Name of the file recording the seed, scene spec and frames of a run, used to resume it
+RENDER_LOCK_FOLDER_NAME = "render.lock" # Name of the folder created in the render folder by the process rendering it, so that no two processes render the same run
+RENDER_LOCK_LEASE_TIMEOUT_S = 3600 # Time in seconds after the last rendered frame of a run locked by another host before its lock can be taken over, longer than a frame takes to render
+GATE_STATS_FILE_NAME = "gate_stats.json" # Name of the file counting the visibility gate decisions of a run
+ACCEPTANCE_LOG_FILE_NAME = "acceptance_log.jsonl" # Name of the log of the scene acceptance tests of all runs, in the render folder root
 
 # Priority levels for scene generation
 MIN_PRIORITY = np.iinfo(np.int32).max
@@ -2,6 +2,7 @@
 
 from typing import List, Dict, Any
 from utils.seed import set_seed
+from utils.tracer import trace_span
 
 from module_operators.module_operator import ModuleOperator
 from input_data_generation.module_generator import ModuleGenerator
@@ -80,19 +81,22 @@ class InputDataGenerator:
         }
 
         # Generate the room and define room masks
-        room_data, wall_scales_per_wall = self.room_module.generate()
+        with trace_span(type(self.room_module).__name__, category="module_generator"):
+            room_data, wall_scales_per_wall = self.room_module.generate()
         InputDataGenerator.__update_input_data(input_data, room_data)
         existing_objects_per_wall = {k: [] for k in wall_scales_per_wall.keys()}
 
         # Generate the camera
-        camera_data, _ = self.camera_module.generate()
+        with trace_span(type(self.camera_module).__name__, category="module_generator"):
+            camera_data, _ = self.camera_module.generate()
         InputDataGenerator.__update_input_data(input_data, camera_data)
 
         # Generate data from other modules
         for module in self.modules:
-            module_data, existing_objects_per_wall = module.generate(
-                wall_scales_per_wall, existing_objects_per_wall
-            )
+            with trace_span(type(module).__name__, category="module_generator"):
+                module_data, existing_objects_per_wall = module.generate(
+                    wall_scales_per_wall, existing_objects_per_wall
+                )
             InputDataGenerator.__update_input_data(input_data, module_data)
 
         return input_data
@@ -0,0 +1,232 @@
+# This file contains the streaming annotation writer and reader classes, used to record frame data one compact record at a time.
+
+import os
+import json
+from typing import Any, Dict, Iterator, Set, Tuple
+
+
+class AnnotationWriter:
+    """
+    An append-only annotation writer, storing one JSON record per line and an offset index once finalized.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        index_file_path: str,
+        fsync_interval: int = 10,
+        resume: bool = False,
+    ) -> None:
+        """
+        Initialize the annotation writer.
+
+        Args:
+            file_path (str): The path of the JSON Lines annotation file.
+            index_file_path (str): The path of the index file, written when the writer is closed.
+            fsync_interval (int, optional): The number of records written between two fsync calls. Defaults to 10.
+            resume (bool, optional): Whether to keep the records of an interrupted run, dropping its torn last record, instead of appending to the file as is. Defaults to False.
+
+        Raises:
+            ValueError: If the fsync interval is less than or equal to 0.
+        """
+        if fsync_interval <= 0:
+            raise ValueError("❌ The fsync interval must be greater than 0.")
+
+        self.file_path = file_path
+        self.index_file_path = index_file_path
+        self.fsync_interval = fsync_interval
+        self.offsets: Dict[int, Tuple[int, int]] = {}
+        self.n_unsynced_records = 0
+        if resume and os.path.isfile(file_path):
+            self.__read_offsets()
+        self.file = open(file_path, "ab")
+        self.offset = self.file.tell()
+
+    def __read_offsets(self) -> None:
+        """
+        Read the offsets of the complete records of the annotation file, and truncate it after the last one.
+        """
+        offset = 0
+        with open(self.file_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self.offsets[json.loads(line)["frame"]] = (offset, len(line))
+                offset += len(line)
+        os.truncate(self.file_path, offset)
+
+    def get_frames(self) -> Set[int]:
+        """
+        Get the frames recorded in the annotation file.
+
+        Returns:
+            Set[int]: The frame indices.
+        """
+        return set(self.offsets)
+
+    def keep_frames(self, frames: Set[int]) -> None:
+        """
+        Truncate the annotation file before the first record whose frame is not kept, e.g. because its outputs were lost.
+
+        Args:
+            frames (Set[int]): The frame indices to keep.
+
+        Raises:
+            ValueError: If the writer is closed.
+        """
+        if self.file is None:
+            raise ValueError("❌ Cannot truncate a closed annotation writer.")
+
+        for frame, (offset, _) in sorted(self.offsets.items(), key=lambda item: item[1][0]):
+            if frame not in frames:
+                self.file.flush()
+                self.file.truncate(offset)
+                self.offset = offset
+                self.offsets = {
+                    kept_frame: (kept_offset, length)
+                    for kept_frame, (kept_offset, length) in self.offsets.items()
+                    if kept_offset < offset
+                }
+                return
+
+    def __enter__(self) -> "AnnotationWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write(self, frame: int, frame_data: Dict[str, Any]) -> None:
+        """
+        Append the data of a frame to the annotation file.
+
+        Args:
+            frame (int): The frame index.
+            frame_data (Dict[str, Any]): The frame data.
+
+        Raises:
+            ValueError: If the writer is closed.
+        """
+        if self.file is None:
+            raise ValueError("❌ Cannot write to a closed annotation writer.")
+
+        record = json.dumps({"frame": frame, "data": frame_data}, separators=(",", ":"))
+        record = (record + "\n").encode("utf-8")
+        self.file.write(record)
+        self.file.flush()
+        self.offsets[frame] = (self.offset, len(record))
+        self.offset += len(record)
+
+        # Only sync to disk every few records, a torn last line is skipped by the reader
+        self.n_unsynced_records += 1
+        if self.n_unsynced_records >= self.fsync_interval:
+            os.fsync(self.file.fileno())
+            self.n_unsynced_records = 0
+
+    def close(self) -> None:
+        """
+        Sync the annotation file and atomically write the offset index.
+        """
+        if self.file is None:
+            return
+
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        self.file = None
+
+        index = {
+            "file_name": os.path.basename(self.file_path),
+            "frames": {
+                str(frame): {"offset": offset, "length": length}
+                for frame, (offset, length) in self.offsets.items()
+            },
+        }
+        temporary_index_file_path = f"{self.index_file_path}.tmp"
+        with open(temporary_index_file_path, "w") as f:
+            json.dump(index, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_index_file_path, self.index_file_path)
+
+
+class AnnotationReader:
+    """
+    A lazy annotation reader, yielding frame data one record at a time.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        index_file_path: str | None = None,
+    ) -> None:
+        """
+        Initialize the annotation reader.
+
+        Args:
+            file_path (str): The path of the JSON Lines annotation file.
+            index_file_path (str | None, optional): The path of the index file, used for random access. Defaults to None.
+
+        Raises:
+            FileNotFoundError: If the annotation file does not exist.
+        """
+        if not os.path.isfile(file_path):
+            raise FileNotFoundError(f"❌ Annotation file {file_path} not found.")
+
+        self.file_path = file_path
+        self.index = None
+        if index_file_path is not None and os.path.isfile(index_file_path):
+            with open(index_file_path, "r") as f:
+                self.index = json.load(f)["frames"]
+
+    def __iter__(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Iterate over the frames of the annotation file, in writing order.
+
+        Yields:
+            int: The frame index.
+            Dict[str, Any]: The frame data.
+        """
+        with open(self.file_path, "rb") as f:
+            for line in f:
+                # Skip a record torn by an interrupted write
+                if not line.endswith(b"\n"):
+                    break
+                record = json.loads(line)
+                yield record["frame"], record["data"]
+
+    def __getitem__(self, frame: int) -> Dict[str, Any]:
+        """
+        Get the data of a single frame, seeking directly to it if an index is available.
+
+        Args:
+            frame (int): The frame index.
+
+        Raises:
+            KeyError: If the frame is not found.
+
+        Returns:
+            Dict[str, Any]: The frame data.
+        """
+        if self.index is None:
+            for current_frame, frame_data in self:
+                if current_frame == frame:
+                    return frame_data
+            raise KeyError(f"❌ Frame {frame} not found.")
+
+        if str(frame) not in self.index:
+            raise KeyError(f"❌ Frame {frame} not found.")
+        frame_index = self.index[str(frame)]
+        with open(self.file_path, "rb") as f:
+            f.seek(frame_index["offset"])
+            record = json.loads(f.read(frame_index["length"]))
+
+        return record["data"]
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get all frames as a dictionary keyed by frame index, as in the former data.json file.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: The frame data per frame index.
+        """
+        return {str(frame): frame_data for frame, frame_data in self}
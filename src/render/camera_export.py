@@ -0,0 +1,181 @@
+# This file contains the camera export writer, which records the per-frame camera, stylus and LED matrices as memory-mapped NumPy arrays, so that labels can be recomputed without Blender.
+
+import os
+import numpy as np
+from typing import Any, Dict, List
+
+FRAMES_FILE_NAME = "frames.npy"
+LEDS_FILE_NAME = "leds.npy"
+LED_NAMES_FILE_NAME = "led_names.npy"
+
+INTRINSICS_NUMERIC_FIELDS = [
+    "lens",
+    "fisheye_lens",
+    "fisheye_fov",
+    "ortho_scale",
+    "sensor_width",
+    "sensor_height",
+    "shift_x",
+    "shift_y",
+    "resolution_x",
+    "resolution_y",
+    "pixel_aspect_x",
+    "pixel_aspect_y",
+]
+INTRINSICS_STRING_FIELDS = ["type", "panorama_type", "sensor_fit"]
+
+FRAME_DTYPE = np.dtype(
+    [
+        ("frame", np.int32),
+        ("camera_matrix_world", np.float64, (4, 4)),
+        ("stylus_matrix_world", np.float64, (4, 4)),
+    ]
+    + [(field, np.float64) for field in INTRINSICS_NUMERIC_FIELDS]
+    + [(field, "U32") for field in INTRINSICS_STRING_FIELDS]
+)
+LED_DTYPE = np.dtype(
+    [
+        ("led_matrix_world", np.float64, (4, 4)),
+        ("arrow_matrix_world", np.float64, (4, 4)),
+    ]
+)
+
+
+class CameraExportWriter:
+    """
+    A camera export writer, filling preallocated (frames) and (frames × LEDs) memory-mapped arrays frame by frame.
+    """
+
+    def __init__(
+        self,
+        folder_path: str,
+        led_names: List[str],
+        frame_start: int,
+        n_frames: int,
+        resume: bool = False,
+    ) -> None:
+        """
+        Initialize the camera export writer.
+
+        Args:
+            folder_path (str): The folder to write the arrays to.
+            led_names (List[str]): The names of the LEDs, in column order.
+            frame_start (int): The index of the first frame.
+            n_frames (int): The number of frames of the run.
+            resume (bool, optional): Whether to keep the rows written by an interrupted run, if its arrays exist. Defaults to False.
+
+        Raises:
+            ValueError: If no LED name is given.
+            ValueError: If the number of frames is less than or equal to 0.
+            ValueError: If the resumed arrays do not match the frames and LEDs of the run.
+        """
+        if len(led_names) == 0:
+            raise ValueError("❌ At least one LED name must be given.")
+        if n_frames <= 0:
+            raise ValueError("❌ The number of frames must be greater than 0.")
+
+        os.makedirs(folder_path, exist_ok=True)
+        self.frame_start = frame_start
+        self.n_frames = n_frames
+        self.n_leds = len(led_names)
+
+        np.save(os.path.join(folder_path, LED_NAMES_FILE_NAME), np.array(led_names))
+        frames_file_path = os.path.join(folder_path, FRAMES_FILE_NAME)
+        leds_file_path = os.path.join(folder_path, LEDS_FILE_NAME)
+        if resume and os.path.isfile(frames_file_path) and os.path.isfile(leds_file_path):
+            self.frames = np.lib.format.open_memmap(frames_file_path, mode="r+")
+            self.leds = np.lib.format.open_memmap(leds_file_path, mode="r+")
+            if self.leds.shape != (n_frames, len(led_names)):
+                raise ValueError("❌ The resumed arrays do not match the frames and LEDs of the run.")
+            return
+
+        self.frames = np.lib.format.open_memmap(
+            frames_file_path,
+            mode="w+",
+            dtype=FRAME_DTYPE,
+            shape=(n_frames,),
+        )
+        self.leds = np.lib.format.open_memmap(
+            leds_file_path,
+            mode="w+",
+            dtype=LED_DTYPE,
+            shape=(n_frames, len(led_names)),
+        )
+
+        # Frames that are never written stay marked as missing
+        self.frames["frame"] = -1
+
+    def __enter__(self) -> "CameraExportWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write(
+        self,
+        frame: int,
+        camera_matrix_world: np.ndarray,
+        intrinsics: Dict[str, Any],
+        stylus_matrix_world: np.ndarray,
+        led_matrices: np.ndarray,
+        arrow_matrices: np.ndarray,
+    ) -> None:
+        """
+        Write the matrices and camera intrinsics of a frame to its row.
+
+        Args:
+            frame (int): The frame index.
+            camera_matrix_world (np.ndarray): The camera world matrix, of shape (4, 4).
+            intrinsics (Dict[str, Any]): The camera intrinsics, as returned by get_camera_intrinsics.
+            stylus_matrix_world (np.ndarray): The stylus world matrix, of shape (4, 4).
+            led_matrices (np.ndarray): The LED world matrices, in column order, of shape (N, 4, 4).
+            arrow_matrices (np.ndarray): The LED arrow world matrices, in column order, of shape (N, 4, 4).
+
+        Raises:
+            ValueError: If the frame is out of the range of the run.
+            ValueError: If the number of LED matrices does not match the number of LEDs.
+        """
+        row = frame - self.frame_start
+        if row < 0 or row >= self.n_frames:
+            raise ValueError(f"❌ Frame {frame} is out of the range of the run.")
+        if len(led_matrices) != self.n_leds or len(arrow_matrices) != self.n_leds:
+            raise ValueError(f"❌ Expected the matrices of {self.n_leds} LEDs.")
+
+        self.frames["frame"][row] = frame
+        self.frames["camera_matrix_world"][row] = camera_matrix_world
+        self.frames["stylus_matrix_world"][row] = stylus_matrix_world
+        for field in INTRINSICS_NUMERIC_FIELDS + INTRINSICS_STRING_FIELDS:
+            self.frames[field][row] = intrinsics[field]
+
+        self.leds["led_matrix_world"][row] = led_matrices
+        self.leds["arrow_matrix_world"][row] = arrow_matrices
+
+    def close(self) -> None:
+        """
+        Flush the arrays to disk.
+        """
+        self.frames.flush()
+        self.leds.flush()
+
+
+def load_camera_export(folder_path: str) -> Dict[str, np.ndarray]:
+    """
+    Load the camera export of a run as read-only memory maps, without copying.
+
+    Args:
+        folder_path (str): The folder the arrays were written to.
+
+    Raises:
+        FileNotFoundError: If the folder does not exist.
+
+    Returns:
+        Dict[str, np.ndarray]: The frame records, the (frames × LEDs) LED records and the LED names.
+    """
+    if not os.path.isdir(folder_path):
+        raise FileNotFoundError(f"❌ Camera export folder {folder_path} not found.")
+
+    return {
+        "frames": np.load(os.path.join(folder_path, FRAMES_FILE_NAME), mmap_mode="r"),
+        "leds": np.load(os.path.join(folder_path, LEDS_FILE_NAME), mmap_mode="r"),
+        "led_names": np.load(os.path.join(folder_path, LED_NAMES_FILE_NAME)),
+    }
@@ -0,0 +1,191 @@
+# This file contains the columnar annotation store, which records per-LED frame data as memory-mapped NumPy arrays.
+
+import os
+import numpy as np
+from typing import Any, Dict, List
+
+LED_OCCLUDED_FLAG = 1 << 0
+LED_IN_FRAME_FLAG = 1 << 1
+
+FRAMES_FILE_NAME = "frames.npy"
+LEDS_FILE_NAME = "leds.npy"
+LED_NAMES_FILE_NAME = "led_names.npy"
+
+FRAME_DTYPE = np.dtype(
+    [
+        ("frame", np.int32),
+        ("stylus_relative_orientation", np.float32),
+        ("bounding_box_u", np.float32),
+        ("bounding_box_v", np.float32),
+        ("bounding_box_width", np.float32),
+        ("bounding_box_height", np.float32),
+    ]
+)
+LED_DTYPE = np.dtype(
+    [
+        ("u", np.float32),
+        ("v", np.float32),
+        ("x", np.float32),
+        ("y", np.float32),
+        ("z", np.float32),
+        ("distance_from_camera", np.float32),
+        ("led_relative_orientation", np.float32),
+        ("flags", np.uint8),
+    ]
+)
+
+
+class ColumnarAnnotationWriter:
+    """
+    A columnar annotation writer, filling preallocated (frames × LEDs) memory-mapped arrays frame by frame.
+    """
+
+    def __init__(
+        self,
+        folder_path: str,
+        led_names: List[str],
+        frame_start: int,
+        n_frames: int,
+        resume: bool = False,
+    ) -> None:
+        """
+        Initialize the columnar annotation writer.
+
+        Args:
+            folder_path (str): The folder to write the arrays to.
+            led_names (List[str]): The names of the LEDs, in column order.
+            frame_start (int): The index of the first frame.
+            n_frames (int): The number of frames of the run.
+            resume (bool, optional): Whether to keep the rows written by an interrupted run, if its arrays exist. Defaults to False.
+
+        Raises:
+            ValueError: If no LED name is given.
+            ValueError: If the number of frames is less than or equal to 0.
+            ValueError: If the resumed arrays do not match the frames and LEDs of the run.
+        """
+        if len(led_names) == 0:
+            raise ValueError("❌ At least one LED name must be given.")
+        if n_frames <= 0:
+            raise ValueError("❌ The number of frames must be greater than 0.")
+
+        os.makedirs(folder_path, exist_ok=True)
+        self.folder_path = folder_path
+        self.led_columns = {led_name: i for i, led_name in enumerate(led_names)}
+        self.frame_start = frame_start
+        self.n_frames = n_frames
+
+        np.save(os.path.join(folder_path, LED_NAMES_FILE_NAME), np.array(led_names))
+        frames_file_path = os.path.join(folder_path, FRAMES_FILE_NAME)
+        leds_file_path = os.path.join(folder_path, LEDS_FILE_NAME)
+        if resume and os.path.isfile(frames_file_path) and os.path.isfile(leds_file_path):
+            self.frames = np.lib.format.open_memmap(frames_file_path, mode="r+")
+            self.leds = np.lib.format.open_memmap(leds_file_path, mode="r+")
+            if self.leds.shape != (n_frames, len(led_names)):
+                raise ValueError("❌ The resumed arrays do not match the frames and LEDs of the run.")
+            return
+
+        self.frames = np.lib.format.open_memmap(
+            frames_file_path,
+            mode="w+",
+            dtype=FRAME_DTYPE,
+            shape=(n_frames,),
+        )
+        self.leds = np.lib.format.open_memmap(
+            leds_file_path,
+            mode="w+",
+            dtype=LED_DTYPE,
+            shape=(n_frames, len(led_names)),
+        )
+
+        # Frames that are never written stay marked as missing
+        self.frames["frame"] = -1
+        for field in FRAME_DTYPE.names[1:]:
+            self.frames[field] = np.nan
+        for field in LED_DTYPE.names[:-1]:
+            self.leds[field] = np.nan
+
+    def __enter__(self) -> "ColumnarAnnotationWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write(self, frame: int, frame_data: Dict[str, Any]) -> None:
+        """
+        Write the data of a frame to its row.
+
+        Args:
+            frame (int): The frame index.
+            frame_data (Dict[str, Any]): The frame data, as returned by get_frame_data.
+
+        Raises:
+            ValueError: If the frame is out of the range of the run.
+        """
+        row = frame - self.frame_start
+        if row < 0 or row >= self.n_frames:
+            raise ValueError(f"❌ Frame {frame} is out of the range of the run.")
+
+        self.frames["frame"][row] = frame
+        self.frames["stylus_relative_orientation"][row] = frame_data[
+            "stylus_relative_orientation"
+        ]
+        bounding_box = frame_data["bounding_box"]
+        if bounding_box is not None:
+            self.frames["bounding_box_u"][row] = bounding_box["center"]["u"]
+            self.frames["bounding_box_v"][row] = bounding_box["center"]["v"]
+            self.frames["bounding_box_width"][row] = bounding_box["width"]
+            self.frames["bounding_box_height"][row] = bounding_box["height"]
+
+        for led_name, led_data in frame_data["leds"].items():
+            column = self.led_columns[led_name]
+            for field in LED_DTYPE.names[:-1]:
+                self.leds[field][row, column] = led_data[field]
+            self.leds["flags"][row, column] = (
+                LED_OCCLUDED_FLAG if led_data["is_occluded"] else 0
+            ) | (LED_IN_FRAME_FLAG if led_data["is_in_frame"] else 0)
+
+    def close(self) -> None:
+        """
+        Flush the arrays to disk.
+        """
+        self.frames.flush()
+        self.leds.flush()
+
+
+def load_columnar_annotations(folder_path: str) -> Dict[str, np.ndarray]:
+    """
+    Load the columnar annotations of a run as read-only memory maps, without copying.
+
+    Args:
+        folder_path (str): The folder the arrays were written to.
+
+    Raises:
+        FileNotFoundError: If the folder does not exist.
+
+    Returns:
+        Dict[str, np.ndarray]: The frame records, the (frames × LEDs) LED records and the LED names.
+    """
+    if not os.path.isdir(folder_path):
+        raise FileNotFoundError(f"❌ Columnar annotation folder {folder_path} not found.")
+
+    return {
+        "frames": np.load(os.path.join(folder_path, FRAMES_FILE_NAME), mmap_mode="r"),
+        "leds": np.load(os.path.join(folder_path, LEDS_FILE_NAME), mmap_mode="r"),
+        "led_names": np.load(os.path.join(folder_path, LED_NAMES_FILE_NAME)),
+    }
+
+
+def unpack_led_flags(flags: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Unpack the bit-packed LED visibility flags.
+
+    Args:
+        flags (np.ndarray): The flags of the LED records.
+
+    Returns:
+        Dict[str, np.ndarray]: The occlusion and in frame boolean arrays.
+    """
+    return {
+        "is_occluded": (flags & LED_OCCLUDED_FLAG) != 0,
+        "is_in_frame": (flags & LED_IN_FRAME_FLAG) != 0,
+    }
@@ -0,0 +1,430 @@
+# This file contains functions to set up the compositor node tree once per run, before rendering frames.
+
+import os
+
+# EXR encoding is disabled by default in OpenCV, and is only checked on first use
+os.environ.setdefault("OPENCV_IO_ENABLE_OPENEXR", "1")
+
+import re
+import cv2
+import bpy
+import numpy as np
+from typing import Dict, List, Tuple
+
+from config.config import LED_MATERIAL_PASS_INDEX
+
+IMAGE_OUTPUT_NODE_NAME = "Image Output"
+SEGMENTATION_OUTPUT_NODE_NAME = "Segmentation Output"
+NO_BG_OUTPUT_NODE_NAME = "No-bg Output"
+LED_MASK_NODE_NAME = "LED Mask"
+LED_EMISSION_NODE_NAME = "LED Emission"
+SCALE_NODE_NAME = "Scale"
+BLACK_BACKGROUND_NODE_NAME = "Black Background"
+BACKGROUND_SWITCH_NODE_NAME = "Background Switch"
+FRAME_STORE_VIEWER_NODE_NAME = "Frame Store Viewer"
+VIEWER_IMAGE_NAME = "Viewer Node"
+LED_INDEX_VIEWER_NODE_NAME = "LED Index Viewer"
+
+FILE_FORMAT_EXTENSIONS = {
+    "PNG": ".png",
+    "JPEG": ".jpg",
+    "BMP": ".bmp",
+    "TIFF": ".tif",
+    "OPEN_EXR": ".exr",
+    "OPEN_EXR_MULTILAYER": ".exr",
+}
+
+
+def get_node(tree: bpy.types.NodeTree, name: str) -> bpy.types.Node:
+    """
+    Get a node of the compositor node tree.
+
+    Args:
+        tree (bpy.types.NodeTree): The compositor node tree.
+        name (str): The name of the node.
+
+    Raises:
+        ValueError: If the node is not found.
+
+    Returns:
+        bpy.types.Node: The node.
+    """
+    node = tree.nodes.get(name)
+    if node is None:
+        raise ValueError(f"❌ {name} node not found.")
+
+    return node
+
+
+def get_or_create_node(
+    tree: bpy.types.NodeTree, node_type: str, name: str
+) -> bpy.types.Node:
+    """
+    Get a node of the compositor node tree, creating it if it does not exist.
+
+    Args:
+        tree (bpy.types.NodeTree): The compositor node tree.
+        node_type (str): The type of the node.
+        name (str): The name of the node.
+
+    Returns:
+        bpy.types.Node: The node.
+    """
+    node = tree.nodes.get(name)
+    if node is None:
+        node = tree.nodes.new(node_type)
+        node.name = name
+        node.label = name
+
+    return node
+
+
+def get_render_layers_node(
+    tree: bpy.types.NodeTree, view_layer_name: str | None = None
+) -> bpy.types.Node:
+    """
+    Get the render layers node of a view layer.
+
+    Args:
+        tree (bpy.types.NodeTree): The compositor node tree.
+        view_layer_name (str | None, optional): The name of the view layer. Defaults to the first render layers node.
+
+    Raises:
+        ValueError: If the render layers node is not found.
+
+    Returns:
+        bpy.types.Node: The render layers node.
+    """
+    for node in tree.nodes:
+        if node.type == "R_LAYERS" and (
+            view_layer_name is None or node.layer == view_layer_name
+        ):
+            return node
+
+    raise ValueError("❌ Render layers node not found.")
+
+
+def copy_file_output_format(
+    source_node: bpy.types.Node, target_node: bpy.types.Node
+) -> None:
+    """
+    Copy the image format and file name of a file output node to another one, so that both write the same kind of files.
+
+    Args:
+        source_node (bpy.types.Node): The file output node to copy from.
+        target_node (bpy.types.Node): The file output node to copy to.
+    """
+    target_node.format.file_format = source_node.format.file_format
+    target_node.format.color_mode = source_node.format.color_mode
+    target_node.format.color_depth = source_node.format.color_depth
+    target_node.format.compression = source_node.format.compression
+    target_node.file_slots[0].path = source_node.file_slots[0].path
+
+
+def get_output_file_path(
+    file_output_node: bpy.types.Node, folder_path: str, frame: int
+) -> str:
+    """
+    Get the path of the file written by a file output node for a frame, following the Blender frame number substitution.
+
+    Args:
+        file_output_node (bpy.types.Node): The file output node.
+        folder_path (str): The base path the node writes to.
+        frame (int): The frame index.
+
+    Raises:
+        ValueError: If the file format of the node is not supported.
+
+    Returns:
+        str: The path of the written file.
+    """
+    file_format = file_output_node.format.file_format
+    if file_format not in FILE_FORMAT_EXTENSIONS:
+        raise ValueError(f"❌ File format {file_format} not supported.")
+
+    # The last run of # is replaced by the padded frame number, else 4 digits are appended
+    slot_path = file_output_node.file_slots[0].path
+    frame_placeholders = list(re.finditer(r"#+", slot_path))
+    if len(frame_placeholders) > 0:
+        placeholder = frame_placeholders[-1]
+        file_name = (
+            slot_path[: placeholder.start()]
+            + f"{frame:0{len(placeholder.group())}d}"
+            + slot_path[placeholder.end() :]
+        )
+    else:
+        file_name = f"{slot_path}{frame:04d}"
+
+    return os.path.join(
+        bpy.path.abspath(folder_path), file_name + FILE_FORMAT_EXTENSIONS[file_format]
+    )
+
+
+def write_black_output_image(
+    file_output_node: bpy.types.Node, file_path: str, width: int, height: int
+) -> None:
+    """
+    Write a black image in the format of a file output node, as it would write for an empty render.
+
+    Args:
+        file_output_node (bpy.types.Node): The file output node.
+        file_path (str): The path of the image.
+        width (int): The width of the image, in pixels.
+        height (int): The height of the image, in pixels.
+
+    Raises:
+        ValueError: If the file format of the node is not supported.
+    """
+    image_format = file_output_node.format
+    if image_format.file_format not in FILE_FORMAT_EXTENSIONS:
+        raise ValueError(f"❌ File format {image_format.file_format} not supported.")
+
+    if image_format.file_format.startswith("OPEN_EXR"):
+        dtype = np.float32
+    elif image_format.color_depth == "16":
+        dtype = np.uint16
+    else:
+        dtype = np.uint8
+    n_channels = {"BW": 1, "RGB": 3, "RGBA": 4}[image_format.color_mode]
+
+    # The no-bg background is transparent black, as rendered
+    image = np.zeros((height, width, n_channels), dtype=dtype)
+
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    cv2.imwrite(file_path, image)
+
+
+def setup_single_pass_compositor(leds: List[bpy.types.Object]) -> Dict[str, int]:
+    """
+    Set up the compositor to write the no-bg image from the same render as the bg image.
+    The no-bg image is the emission pass masked by the material index pass of the LEDs, so that only directly visible LEDs remain and everything else is black.
+    Unlike the two pass no-bg image, where only the arm and stylus hide the LEDs, LEDs hidden behind background objects are black too.
+
+    Args:
+        leds (List[bpy.types.Object]): The LED objects.
+
+    Raises:
+        ValueError: If the image output node is not found.
+        ValueError: If another material already has the LED material pass index.
+        ValueError: If the render layers node is not found.
+
+    Returns:
+        Dict[str, int]: The pass indices of the LED materials before they were marked, by material name, to restore them after rendering.
+    """
+    scene = bpy.context.scene
+    tree = scene.node_tree
+    image_output_node = get_node(tree, IMAGE_OUTPUT_NODE_NAME)
+
+    led_materials = {
+        material_slot.material.name: material_slot.material
+        for led in leds
+        for material_slot in led.material_slots
+        if material_slot.material is not None
+    }
+    colliding_material_names = [
+        material.name
+        for material in bpy.data.materials
+        if material.name not in led_materials
+        and material.pass_index == LED_MATERIAL_PASS_INDEX
+    ]
+    if len(colliding_material_names) > 0:
+        raise ValueError(
+            f"❌ Materials {', '.join(colliding_material_names)} already have the LED material pass index {LED_MATERIAL_PASS_INDEX}."
+        )
+
+    # Enable the passes and mark the LED materials
+    view_layer = bpy.context.view_layer
+    view_layer.use_pass_emit = True
+    view_layer.use_pass_material_index = True
+    pass_indices = {}
+    for name, material in led_materials.items():
+        pass_indices[name] = material.pass_index
+        material.pass_index = LED_MATERIAL_PASS_INDEX
+    render_layers_node = get_render_layers_node(tree, view_layer.name)
+
+    # Mask the emission pass with the LED materials
+    led_mask_node = get_or_create_node(tree, "CompositorNodeIDMask", LED_MASK_NODE_NAME)
+    led_mask_node.index = LED_MATERIAL_PASS_INDEX
+    led_mask_node.use_antialiasing = True
+    tree.links.new(render_layers_node.outputs["IndexMA"], led_mask_node.inputs[0])
+
+    led_emission_node = get_or_create_node(
+        tree, "CompositorNodeMixRGB", LED_EMISSION_NODE_NAME
+    )
+    led_emission_node.blend_type = "MULTIPLY"
+    led_emission_node.inputs[0].default_value = 1.0
+    tree.links.new(render_layers_node.outputs["Emit"], led_emission_node.inputs[1])
+    tree.links.new(led_mask_node.outputs[0], led_emission_node.inputs[2])
+
+    # Write the masked emission next to the bg image
+    no_bg_output_node = get_or_create_node(
+        tree, "CompositorNodeOutputFile", NO_BG_OUTPUT_NODE_NAME
+    )
+    copy_file_output_format(image_output_node, no_bg_output_node)
+    tree.links.new(led_emission_node.outputs[0], no_bg_output_node.inputs[0])
+
+    return pass_indices
+
+
+def restore_material_pass_indices(pass_indices: Dict[str, int]) -> None:
+    """
+    Restore the pass indices of materials marked for rendering.
+
+    Args:
+        pass_indices (Dict[str, int]): The pass indices to restore, by material name.
+    """
+    for name, pass_index in pass_indices.items():
+        material = bpy.data.materials.get(name)
+        if material is not None:
+            material.pass_index = pass_index
+
+
+def setup_background_switch(background_image_node: bpy.types.Node) -> None:
+    """
+    Set up a switch between the background image and a black background in front of the scale node, so that switching passes allocates no image.
+
+    Args:
+        background_image_node (bpy.types.Node): The image node of the random background.
+
+    Raises:
+        ValueError: If the scale node is not found.
+    """
+    tree = bpy.context.scene.node_tree
+    scale_node = get_node(tree, SCALE_NODE_NAME)
+
+    black_background_node = get_or_create_node(
+        tree, "CompositorNodeRGB", BLACK_BACKGROUND_NODE_NAME
+    )
+    # Transparent black, as the all-zero image of the black background image generator
+    black_background_node.outputs[0].default_value = (0.0, 0.0, 0.0, 0.0)
+
+    background_switch_node = get_or_create_node(
+        tree, "CompositorNodeSwitch", BACKGROUND_SWITCH_NODE_NAME
+    )
+    background_switch_node.check = False
+    tree.links.new(background_image_node.outputs[0], background_switch_node.inputs[0])
+    tree.links.new(black_background_node.outputs[0], background_switch_node.inputs[1])
+    tree.links.new(background_switch_node.outputs[0], scale_node.inputs[0])
+
+
+def set_black_background(is_black: bool) -> bool:
+    """
+    Switch between the background image and the black background.
+
+    Args:
+        is_black (bool): Whether to use the black background.
+
+    Raises:
+        ValueError: If the background switch node is not found.
+
+    Returns:
+        bool: Whether the black background was used before.
+    """
+    background_switch_node = get_node(
+        bpy.context.scene.node_tree, BACKGROUND_SWITCH_NODE_NAME
+    )
+    was_black = background_switch_node.check
+    background_switch_node.check = is_black
+
+    return was_black
+
+
+def setup_frame_store_viewer() -> None:
+    """
+    Set up a viewer node fed with the same image as the image output node, so that the render result can be read back from memory.
+
+    Raises:
+        ValueError: If the image output node is not found.
+        ValueError: If the image output node has no input.
+    """
+    tree = bpy.context.scene.node_tree
+    image_output_node = get_node(tree, IMAGE_OUTPUT_NODE_NAME)
+    if len(image_output_node.inputs[0].links) == 0:
+        raise ValueError(f"❌ {IMAGE_OUTPUT_NODE_NAME} node has no input.")
+
+    viewer_node = get_or_create_node(
+        tree, "CompositorNodeViewer", FRAME_STORE_VIEWER_NODE_NAME
+    )
+    viewer_node.use_alpha = True
+    tree.links.new(image_output_node.inputs[0].links[0].from_socket, viewer_node.inputs[0])
+    tree.nodes.active = viewer_node
+
+
+def get_viewer_pixels() -> np.ndarray:
+    """
+    Get the pixels of the last composited image from the viewer node.
+
+    Raises:
+        ValueError: If the viewer image is not found.
+
+    Returns:
+        np.ndarray: The linear RGBA pixels, bottom row first, of shape (H, W, 4).
+    """
+    viewer_image = bpy.data.images.get(VIEWER_IMAGE_NAME)
+    if viewer_image is None:
+        raise ValueError("❌ Viewer image not found.")
+
+    width, height = viewer_image.size
+    pixels = np.empty(width * height * 4, dtype=np.float32)
+    viewer_image.pixels.foreach_get(pixels)
+
+    return pixels.reshape(height, width, 4)
+
+
+def setup_led_index_viewer(
+    leds: List[bpy.types.Object],
+) -> Tuple[int, Dict[str, int]]:
+    """
+    Set up the object index pass of the LEDs, shown by a viewer node, so that the visible pixels of each LED can be counted from memory.
+    The LED with index i in the list gets the pass index offset + i + 1, above the pass index of every other object and the index of every ID mask node, which keep their own.
+
+    Args:
+        leds (List[bpy.types.Object]): The LED objects.
+
+    Raises:
+        ValueError: If the render layers node is not found.
+
+    Returns:
+        int: The pass index offset of the LEDs.
+        Dict[str, int]: The pass indices of the LEDs before they were numbered, by object name, to restore them after rendering.
+    """
+    scene = bpy.context.scene
+    tree = scene.node_tree
+
+    view_layer = bpy.context.view_layer
+    view_layer.use_pass_object_index = True
+    led_names = {led.name for led in leds}
+    used_pass_indices = [
+        obj.pass_index for obj in bpy.data.objects if obj.name not in led_names
+    ]
+    used_pass_indices += [node.index for node in tree.nodes if node.type == "ID_MASK"]
+    pass_index_offset = max(used_pass_indices, default=0)
+    pass_indices = {}
+    for i, led in enumerate(leds):
+        pass_indices[led.name] = led.pass_index
+        led.pass_index = pass_index_offset + i + 1
+    render_layers_node = get_render_layers_node(tree, view_layer.name)
+
+    led_index_viewer_node = get_or_create_node(
+        tree, "CompositorNodeViewer", LED_INDEX_VIEWER_NODE_NAME
+    )
+    led_index_viewer_node.use_alpha = False
+    tree.links.new(
+        render_layers_node.outputs["IndexOB"], led_index_viewer_node.inputs[0]
+    )
+    tree.nodes.active = led_index_viewer_node
+
+    return pass_index_offset, pass_indices
+
+
+def restore_object_pass_indices(pass_indices: Dict[str, int]) -> None:
+    """
+    Restore the pass indices of objects numbered for rendering.
+
+    Args:
+        pass_indices (Dict[str, int]): The pass indices to restore, by object name.
+    """
+    for name, pass_index in pass_indices.items():
+        obj = bpy.data.objects.get(name)
+        if obj is not None:
+            obj.pass_index = pass_index
@@ -0,0 +1,331 @@
+# This file contains functions to render disjoint frame ranges of a saved scene in parallel Blender processes, and to merge their outputs into a single run folder.
+
+import os
+import bpy
+import json
+import shutil
+import subprocess
+import numpy as np
+from typing import List, Tuple
+
+from render.annotation_stream import AnnotationReader, AnnotationWriter
+from render.columnar_annotation_store import LED_NAMES_FILE_NAME
+from render.shard_writer import SHARD_FILE_NAME_FORMAT, SHARD_INDEX_FILE_EXTENSION
+from render.visibility_gate import merge_gate_stats
+from config.config import (
+    ANNOTATION_FILE_NAME,
+    ANNOTATION_INDEX_FILE_NAME,
+    ANNOTATION_FSYNC_INTERVAL,
+    COLUMNAR_ANNOTATION_FOLDER_NAME,
+    CAMERA_EXPORT_FOLDER_NAME,
+    FRAME_STORE_FOLDER_NAME,
+    SHARD_FOLDER_NAME,
+    RENDER_PARTS_FOLDER_NAME,
+    SCENE_FILE_NAME,
+    GATE_STATS_FILE_NAME,
+)
+
+
+def get_part_folder_path(render_folder_path: str, frame_range: Tuple[int, int]) -> str:
+    """
+    Get the folder path of the run files of a frame range.
+
+    Args:
+        render_folder_path (str): The folder path of the run.
+        frame_range (Tuple[int, int]): The first and last frames of the range.
+
+    Returns:
+        str: The part folder path.
+    """
+    return os.path.join(
+        render_folder_path,
+        RENDER_PARTS_FOLDER_NAME,
+        f"{frame_range[0]:04d}-{frame_range[1]:04d}",
+    )
+
+
+def split_frame_range(
+    frame_start: int, frame_end: int, n_workers: int
+) -> List[Tuple[int, int]]:
+    """
+    Split a frame range into contiguous ranges of balanced sizes, one per worker.
+
+    Args:
+        frame_start (int): The first frame.
+        frame_end (int): The last frame.
+        n_workers (int): The number of workers.
+
+    Raises:
+        ValueError: If the number of workers is less than or equal to 0.
+
+    Returns:
+        List[Tuple[int, int]]: The first and last frames of each range, without empty ranges.
+    """
+    if n_workers <= 0:
+        raise ValueError("❌ The number of workers must be greater than 0.")
+
+    frames = np.arange(frame_start, frame_end + 1)
+    return [
+        (int(worker_frames[0]), int(worker_frames[-1]))
+        for worker_frames in np.array_split(frames, n_workers)
+        if len(worker_frames) > 0
+    ]
+
+
+def save_scene(render_folder_path: str) -> str:
+    """
+    Save a copy of the scene in the run folder, with its generated images packed, so that workers render exactly the same scene.
+
+    Args:
+        render_folder_path (str): The folder path of the run.
+
+    Returns:
+        str: The path of the saved scene.
+    """
+    for image in bpy.data.images:
+        if image.type == "IMAGE" and image.has_data and image.packed_file is None:
+            image.pack()
+
+    scene_file_path = os.path.abspath(os.path.join(render_folder_path, SCENE_FILE_NAME))
+    bpy.ops.wm.save_as_mainfile(filepath=scene_file_path, copy=True)
+
+    return scene_file_path
+
+
+def render_with_workers(
+    scene_file_path: str,
+    script_path: str,
+    render_folder_path: str,
+    armature_suffix: str,
+    seed: int,
+    frame_ranges: List[Tuple[int, int]],
+    trace_file_path: str | None = None,
+    resume: bool = False,
+) -> None:
+    """
+    Render the frame ranges of a saved scene in parallel Blender processes, sharing the CPU threads between them.
+
+    Args:
+        scene_file_path (str): The path of the saved scene.
+        script_path (str): The path of the run script, run by each worker.
+        render_folder_path (str): The folder path of the run.
+        armature_suffix (str): The suffix of the armature.
+        seed (int): The random seed of the run.
+        frame_ranges (List[Tuple[int, int]]): The first and last frames of each worker.
+        trace_file_path (str | None, optional): The path of the trace file, each worker tracing to its own file next to it. Defaults to None.
+        resume (bool, optional): Whether the workers resume the interrupted render of their frame range. Defaults to False.
+
+    Raises:
+        ValueError: If a worker fails.
+    """
+    n_threads = max((os.cpu_count() or 1) // len(frame_ranges), 1)
+    workers = []
+    for frame_start, frame_end in frame_ranges:
+        command = [
+            bpy.app.binary_path,
+            "--background",
+            scene_file_path,
+            "--python",
+            script_path,
+            "--",
+            "--frame-range",
+            str(frame_start),
+            str(frame_end),
+            "--render-folder",
+            os.path.abspath(render_folder_path),
+            "--armature-suffix",
+            armature_suffix,
+            "--seed",
+            str(seed),
+            "--threads",
+            str(n_threads),
+        ]
+        if trace_file_path is not None:
+            trace_file_root, trace_file_extension = os.path.splitext(trace_file_path)
+            command += [
+                "--trace",
+                os.path.abspath(
+                    f"{trace_file_root}.{frame_start:04d}-{frame_end:04d}{trace_file_extension}"
+                ),
+            ]
+        if resume:
+            command.append("--resume")
+        print(f"➡️  Starting worker for frames {frame_start} to {frame_end}.")
+        workers.append(
+            subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(script_path)))
+        )
+
+    return_codes = [worker.wait() for worker in workers]
+    for (frame_start, frame_end), return_code in zip(frame_ranges, return_codes):
+        if return_code != 0:
+            raise ValueError(
+                f"❌ Worker for frames {frame_start} to {frame_end} failed with code {return_code}."
+            )
+
+
+def merge_annotations(render_folder_path: str, part_folder_paths: List[str]) -> None:
+    """
+    Merge the annotation files of the parts, in frame order, into the annotation file of the run.
+
+    Args:
+        render_folder_path (str): The folder path of the run.
+        part_folder_paths (List[str]): The part folder paths, in frame order.
+    """
+    # Start over the annotations of an interrupted merge
+    annotation_file_path = os.path.join(render_folder_path, ANNOTATION_FILE_NAME)
+    if os.path.isfile(annotation_file_path):
+        os.remove(annotation_file_path)
+
+    with AnnotationWriter(
+        file_path=os.path.join(render_folder_path, ANNOTATION_FILE_NAME),
+        index_file_path=os.path.join(render_folder_path, ANNOTATION_INDEX_FILE_NAME),
+        fsync_interval=ANNOTATION_FSYNC_INTERVAL,
+    ) as annotation_writer:
+        for part_folder_path in part_folder_paths:
+            annotation_reader = AnnotationReader(
+                os.path.join(part_folder_path, ANNOTATION_FILE_NAME)
+            )
+            for frame, frame_data in annotation_reader:
+                annotation_writer.write(frame, frame_data)
+
+
+def merge_array_folders(
+    render_folder_path: str, part_folder_paths: List[str], folder_name: str
+) -> None:
+    """
+    Concatenate the per-frame arrays of the parts along their first axis, and copy the shared LED names.
+
+    Args:
+        render_folder_path (str): The folder path of the run.
+        part_folder_paths (List[str]): The part folder paths, in frame order.
+        folder_name (str): The name of the array folder, in the run and part folders.
+    """
+    part_array_folder_paths = [
+        os.path.join(part_folder_path, folder_name)
+        for part_folder_path in part_folder_paths
+        if os.path.isdir(os.path.join(part_folder_path, folder_name))
+    ]
+    if len(part_array_folder_paths) == 0:
+        return
+
+    array_folder_path = os.path.join(render_folder_path, folder_name)
+    os.makedirs(array_folder_path, exist_ok=True)
+    for file_name in sorted(os.listdir(part_array_folder_paths[0])):
+        if not file_name.endswith(".npy"):
+            continue
+        if file_name == LED_NAMES_FILE_NAME:
+            shutil.copyfile(
+                os.path.join(part_array_folder_paths[0], file_name),
+                os.path.join(array_folder_path, file_name),
+            )
+            continue
+
+        part_arrays = [
+            np.load(os.path.join(part_array_folder_path, file_name), mmap_mode="r")
+            for part_array_folder_path in part_array_folder_paths
+        ]
+        array = np.lib.format.open_memmap(
+            os.path.join(array_folder_path, file_name),
+            mode="w+",
+            dtype=part_arrays[0].dtype,
+            shape=(sum(len(part_array) for part_array in part_arrays),)
+            + part_arrays[0].shape[1:],
+        )
+        row = 0
+        for part_array in part_arrays:
+            array[row : row + len(part_array)] = part_array
+            row += len(part_array)
+        array.flush()
+
+
+def merge_shards(render_folder_path: str, part_folder_paths: List[str]) -> None:
+    """
+    Link the shards of the parts to the run, numbering them in frame order and updating their indexes.
+    The shards stay in the parts until they are removed, so that an interrupted merge can be started over.
+
+    Args:
+        render_folder_path (str): The folder path of the run.
+        part_folder_paths (List[str]): The part folder paths, in frame order.
+    """
+    shard_folder_path = os.path.join(render_folder_path, SHARD_FOLDER_NAME)
+    if os.path.isdir(shard_folder_path):
+        shutil.rmtree(shard_folder_path)
+    n_shards = 0
+    for part_folder_path in part_folder_paths:
+        part_shard_folder_path = os.path.join(part_folder_path, SHARD_FOLDER_NAME)
+        if not os.path.isdir(part_shard_folder_path):
+            continue
+        os.makedirs(shard_folder_path, exist_ok=True)
+
+        for index_file_name in sorted(os.listdir(part_shard_folder_path)):
+            if not index_file_name.endswith(SHARD_INDEX_FILE_EXTENSION):
+                continue
+            with open(os.path.join(part_shard_folder_path, index_file_name), "r") as f:
+                index = json.load(f)
+
+            shard_file_name = SHARD_FILE_NAME_FORMAT.format(n_shards)
+            os.link(
+                os.path.join(part_shard_folder_path, index["file_name"]),
+                os.path.join(shard_folder_path, shard_file_name),
+            )
+            index["file_name"] = shard_file_name
+            with open(
+                os.path.join(shard_folder_path, shard_file_name + SHARD_INDEX_FILE_EXTENSION),
+                "w",
+            ) as f:
+                json.dump(index, f)
+            n_shards += 1
+
+
+def is_merged(render_folder_path: str) -> bool:
+    """
+    Check if the parts of a run were already merged, their folder being removed once merged.
+
+    Args:
+        render_folder_path (str): The folder path of the run.
+
+    Returns:
+        bool: Whether the parts were merged.
+    """
+    return not os.path.isdir(
+        os.path.join(render_folder_path, RENDER_PARTS_FOLDER_NAME)
+    ) and os.path.isfile(os.path.join(render_folder_path, ANNOTATION_INDEX_FILE_NAME))
+
+
+def merge_render_parts(
+    render_folder_path: str, frame_ranges: List[Tuple[int, int]]
+) -> None:
+    """
+    Merge the run files written by the workers of each frame range into the run folder, then remove the part folders.
+    The merged files are identical to the ones of a sequential render.
+
+    Args:
+        render_folder_path (str): The folder path of the run.
+        frame_ranges (List[Tuple[int, int]]): The first and last frames of each worker.
+
+    Raises:
+        FileNotFoundError: If the annotation file of a part is not found.
+    """
+    part_folder_paths = [
+        get_part_folder_path(render_folder_path, frame_range)
+        for frame_range in sorted(frame_ranges)
+    ]
+
+    merge_annotations(render_folder_path, part_folder_paths)
+    for folder_name in [
+        COLUMNAR_ANNOTATION_FOLDER_NAME,
+        CAMERA_EXPORT_FOLDER_NAME,
+        FRAME_STORE_FOLDER_NAME,
+    ]:
+        merge_array_folders(render_folder_path, part_folder_paths, folder_name)
+    merge_shards(render_folder_path, part_folder_paths)
+    merge_gate_stats(
+        [
+            os.path.join(part_folder_path, GATE_STATS_FILE_NAME)
+            for part_folder_path in part_folder_paths
+        ],
+        os.path.join(render_folder_path, GATE_STATS_FILE_NAME),
+    )
+
+    shutil.rmtree(os.path.join(render_folder_path, RENDER_PARTS_FOLDER_NAME))
+    print(f"✅ Merged {len(part_folder_paths)} parts into {render_folder_path}.")
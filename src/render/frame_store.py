@@ -0,0 +1,198 @@
+# This file contains the frame store class, which records the rendered images of a pass as a memory-mapped (frames × H × W × C) NumPy array.
+
+import os
+import numpy as np
+from typing import Dict
+
+FRAME_STORE_DTYPES = {
+    "8": np.uint8,
+    "16": np.uint16,
+}
+
+
+def linear_to_srgb(pixels: np.ndarray) -> np.ndarray:
+    """
+    Encode linear pixel values with the sRGB transfer function, as done by the standard view transform when writing images.
+
+    Args:
+        pixels (np.ndarray): The linear pixel values.
+
+    Returns:
+        np.ndarray: The sRGB encoded pixel values, clipped to [0, 1].
+    """
+    pixels = np.clip(pixels, 0.0, 1.0)
+
+    return np.where(
+        pixels <= 0.0031308,
+        12.92 * pixels,
+        1.055 * np.power(pixels, 1 / 2.4) - 0.055,
+    )
+
+
+class FrameStore:
+    """
+    A frame store, filling a preallocated memory-mapped array with the render result of each frame, without encoding images.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        frame_start: int,
+        n_frames: int,
+        height: int,
+        width: int,
+        n_channels: int = 3,
+        color_depth: str = "8",
+        resume: bool = False,
+    ) -> None:
+        """
+        Initialize the frame store.
+
+        Args:
+            file_path (str): The path of the .npy file.
+            frame_start (int): The index of the first frame.
+            n_frames (int): The number of frames of the run.
+            height (int): The height of the frames, in pixels.
+            width (int): The width of the frames, in pixels.
+            n_channels (int, optional): The number of channels kept, 1 for grayscale, 3 for RGB or 4 for RGBA. Defaults to 3.
+            color_depth (str, optional): The color depth, "8" or "16" bits. Defaults to "8".
+            resume (bool, optional): Whether to keep the frames written by an interrupted run, if its array exists. Defaults to False.
+
+        Raises:
+            ValueError: If the number of frames is less than or equal to 0.
+            ValueError: If the number of channels is not 1, 3 or 4.
+            ValueError: If the color depth is not supported.
+            ValueError: If the resumed array does not match the frames of the run.
+        """
+        if n_frames <= 0:
+            raise ValueError("❌ The number of frames must be greater than 0.")
+        if n_channels not in [1, 3, 4]:
+            raise ValueError("❌ The number of channels must be 1, 3 or 4.")
+        if color_depth not in FRAME_STORE_DTYPES:
+            raise ValueError(f"❌ Color depth {color_depth} not supported.")
+
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        self.frame_start = frame_start
+        self.n_frames = n_frames
+        self.n_channels = n_channels
+        self.dtype = FRAME_STORE_DTYPES[color_depth]
+        if resume and os.path.isfile(file_path):
+            self.frames = np.lib.format.open_memmap(file_path, mode="r+")
+            if self.frames.shape != (n_frames, height, width, n_channels):
+                raise ValueError("❌ The resumed array does not match the frames of the run.")
+            return
+
+        self.frames = np.lib.format.open_memmap(
+            file_path,
+            mode="w+",
+            dtype=self.dtype,
+            shape=(n_frames, height, width, n_channels),
+        )
+
+    def __enter__(self) -> "FrameStore":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write(self, frame: int, pixels: np.ndarray) -> None:
+        """
+        Write the render result of a frame to its slot.
+
+        Args:
+            frame (int): The frame index.
+            pixels (np.ndarray): The linear RGBA pixels of the render result, bottom row first, of shape (H, W, 4).
+
+        Raises:
+            ValueError: If the frame is out of the range of the run.
+            ValueError: If the pixels do not match the frame size.
+        """
+        row = frame - self.frame_start
+        if row < 0 or row >= self.n_frames:
+            raise ValueError(f"❌ Frame {frame} is out of the range of the run.")
+        if pixels.shape[:2] != self.frames.shape[1:3]:
+            raise ValueError(
+                f"❌ Pixels of shape {pixels.shape[:2]} do not match the frame size {self.frames.shape[1:3]}."
+            )
+
+        # Images are stored top row first, with only the alpha channel left linear
+        pixels = pixels[::-1]
+        if self.n_channels == 1:
+            values = linear_to_srgb(
+                pixels[..., :3] @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+            )[..., None]
+        else:
+            values = np.concatenate(
+                [linear_to_srgb(pixels[..., :3]), np.clip(pixels[..., 3:], 0.0, 1.0)],
+                axis=-1,
+            )[..., : self.n_channels]
+
+        max_value = np.iinfo(self.dtype).max
+        self.frames[row] = np.rint(values * max_value).astype(self.dtype)
+
+    def write_black(self, frame: int) -> None:
+        """
+        Write a transparent black frame to its slot, as the no-bg pass renders an empty frame, for a frame that was not rendered.
+
+        Args:
+            frame (int): The frame index.
+
+        Raises:
+            ValueError: If the frame is out of the range of the run.
+        """
+        row = frame - self.frame_start
+        if row < 0 or row >= self.n_frames:
+            raise ValueError(f"❌ Frame {frame} is out of the range of the run.")
+
+        self.frames[row] = 0
+
+    def copy(self, frame: int, source_frame: int) -> None:
+        """
+        Copy the stored render result of a frame to the slot of another one.
+
+        Args:
+            frame (int): The frame index.
+            source_frame (int): The index of the frame to copy.
+
+        Raises:
+            ValueError: If a frame is out of the range of the run.
+        """
+        row = frame - self.frame_start
+        source_row = source_frame - self.frame_start
+        if row < 0 or row >= self.n_frames:
+            raise ValueError(f"❌ Frame {frame} is out of the range of the run.")
+        if source_row < 0 or source_row >= self.n_frames:
+            raise ValueError(f"❌ Frame {source_frame} is out of the range of the run.")
+
+        self.frames[row] = self.frames[source_row]
+
+    def close(self) -> None:
+        """
+        Flush the array to disk.
+        """
+        self.frames.flush()
+
+
+def load_frame_stores(folder_path: str) -> Dict[str, np.ndarray]:
+    """
+    Load the frame stores of a run as read-only memory maps, without copying.
+
+    Args:
+        folder_path (str): The folder the frame stores were written to.
+
+    Raises:
+        FileNotFoundError: If the folder does not exist.
+
+    Returns:
+        Dict[str, np.ndarray]: The (frames × H × W × C) arrays, by pass name.
+    """
+    if not os.path.isdir(folder_path):
+        raise FileNotFoundError(f"❌ Frame store folder {folder_path} not found.")
+
+    return {
+        os.path.splitext(file_name)[0]: np.load(
+            os.path.join(folder_path, file_name), mmap_mode="r"
+        )
+        for file_name in sorted(os.listdir(folder_path))
+        if file_name.endswith(".npy")
+    }
@@ -0,0 +1,106 @@
+# This file contains the LED pixel counter class, which measures the visibility of each LED from the object index pass of the render.
+
+import bpy
+import numpy as np
+from typing import Any, Dict, List, Tuple
+
+from render.compositor import (
+    setup_led_index_viewer,
+    restore_object_pass_indices,
+    get_viewer_pixels,
+)
+from render.projection import project_points
+
+
+class LedPixelCounter:
+    """
+    An LED pixel counter, counting the pixels of each LED in the object index pass read from memory with a single array reduction per frame.
+    """
+
+    def __init__(self, leds: List[bpy.types.Object]) -> None:
+        """
+        Initialize the LED pixel counter, setting up the object index pass.
+
+        Args:
+            leds (List[bpy.types.Object]): The LED objects.
+
+        Raises:
+            ValueError: If the render layers node is not found.
+        """
+        self.pass_index_offset, self.previous_pass_indices = setup_led_index_viewer(leds)
+
+        self.leds = leds
+        self.local_corners = np.array(
+            [[tuple(corner) for corner in led.bound_box] for led in leds]
+        )
+
+    def restore_pass_indices(self) -> None:
+        """
+        Restore the pass indices the LEDs had before they were numbered.
+        """
+        restore_object_pass_indices(self.previous_pass_indices)
+
+    def count_visible_pixels(self) -> np.ndarray:
+        """
+        Count the pixels of each LED in the object index pass of the last render.
+
+        Raises:
+            ValueError: If the viewer image is not found.
+
+        Returns:
+            np.ndarray: The number of visible pixels of each LED, of shape (N,).
+        """
+        indices = np.rint(get_viewer_pixels()[..., 0]).astype(np.int64).ravel()
+        indices -= self.pass_index_offset
+        indices = indices[(indices > 0) & (indices <= len(self.leds))]
+
+        return np.bincount(indices, minlength=len(self.leds) + 1)[1:]
+
+    def get_expected_pixels(
+        self, camera_matrix_world: np.ndarray, intrinsics: Dict[str, Any]
+    ) -> np.ndarray:
+        """
+        Estimate the number of pixels each LED would cover if it were not occluded, as the ellipse inscribed in its projected bounding box.
+
+        Args:
+            camera_matrix_world (np.ndarray): The camera world matrix, of shape (4, 4).
+            intrinsics (Dict[str, Any]): The camera intrinsics.
+
+        Returns:
+            np.ndarray: The expected number of pixels of each LED, at least 1, of shape (N,).
+        """
+        led_matrices = np.array([np.array(led.matrix_world) for led in self.leds])
+        corners = (
+            np.einsum("nij,nkj->nki", led_matrices[:, :3, :3], self.local_corners)
+            + led_matrices[:, None, :3, 3]
+        )
+        projected_corners = project_points(corners, camera_matrix_world, intrinsics)
+
+        extents = np.ptp(projected_corners[..., :2], axis=1)
+        resolution_scale = bpy.context.scene.render.resolution_percentage / 100
+        width = extents[:, 0] * intrinsics["resolution_x"] * resolution_scale
+        height = extents[:, 1] * intrinsics["resolution_y"] * resolution_scale
+
+        return np.maximum(np.pi / 4 * width * height, 1.0)
+
+    def get_visibility(
+        self, camera_matrix_world: np.ndarray, intrinsics: Dict[str, Any]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the visible pixels and the visibility fraction of each LED for the last rendered frame.
+
+        Args:
+            camera_matrix_world (np.ndarray): The camera world matrix, of shape (4, 4).
+            intrinsics (Dict[str, Any]): The camera intrinsics.
+
+        Raises:
+            ValueError: If the viewer image is not found.
+
+        Returns:
+            np.ndarray: The number of visible pixels of each LED, of shape (N,).
+            np.ndarray: The visible fraction of each LED, in [0, 1], of shape (N,).
+        """
+        visible_pixels = self.count_visible_pixels()
+        expected_pixels = self.get_expected_pixels(camera_matrix_world, intrinsics)
+
+        return visible_pixels, np.minimum(visible_pixels / expected_pixels, 1.0)
@@ -0,0 +1,201 @@
+# This file contains the memory manager class, which purges orphaned Blender data only when memory grows too much.
+
+import gc
+import os
+import bpy
+import numpy as np
+from typing import Dict
+
+from utils.tracer import trace_span
+
+DATABLOCK_COLLECTION_NAMES = [
+    "images",
+    "meshes",
+    "materials",
+    "node_groups",
+    "textures",
+    "objects",
+    "collections",
+    "actions",
+]
+
+
+class MemoryManager:
+    """
+    A memory manager, tracking the process memory and the Blender datablock counts after each render to decide when to purge.
+    The watermarks are relative to the memory and datablocks measured after the first render or the last purge, as Blender rarely returns freed memory to the system and purging only removes orphaned datablocks.
+    """
+
+    def __init__(
+        self,
+        rss_growth_watermark_mb: float,
+        datablocks_growth_watermark: int,
+        trend_window: int,
+        trend_threshold_mb: float,
+    ) -> None:
+        """
+        Initialize the memory manager.
+
+        Args:
+            rss_growth_watermark_mb (float): The process memory growth since the first render or the last purge above which to purge, in MB.
+            datablocks_growth_watermark (int): The number of datablocks created since the first render or the last purge above which to purge.
+            trend_window (int): The number of renders over which the memory trend is estimated.
+            trend_threshold_mb (float): The memory growth per render above which a leak is assumed, in MB.
+
+        Raises:
+            ValueError: If the process memory growth watermark is less than or equal to 0.
+            ValueError: If the datablocks growth watermark is less than or equal to 0.
+            ValueError: If the trend window is less than 2.
+            ValueError: If the trend threshold is less than or equal to 0.
+        """
+        if rss_growth_watermark_mb <= 0:
+            raise ValueError("❌ The process memory growth watermark must be greater than 0.")
+        if datablocks_growth_watermark <= 0:
+            raise ValueError("❌ The datablocks growth watermark must be greater than 0.")
+        if trend_window < 2:
+            raise ValueError("❌ The trend window must be at least 2.")
+        if trend_threshold_mb <= 0:
+            raise ValueError("❌ The trend threshold must be greater than 0.")
+
+        self.rss_growth_watermark_mb = rss_growth_watermark_mb
+        self.datablocks_growth_watermark = datablocks_growth_watermark
+        self.base_rss_mb = None
+        self.n_base_datablocks = None
+        self.trend_window = trend_window
+        self.trend_threshold_mb = trend_threshold_mb
+        self.rss_history_mb = []
+        self.n_purges = 0
+
+        # The peak memory, the only one available without /proc, never decreases after a purge
+        self.is_rss_tracked = MemoryManager.get_rss_mb() is not None
+        if not self.is_rss_tracked:
+            print(
+                "⚠️  Current process memory not available, only purging on datablock growth."
+            )
+
+    @staticmethod
+    def get_rss_mb() -> float | None:
+        """
+        Get the current resident memory of the process.
+
+        Returns:
+            float | None: The resident memory, in MB, or None if /proc is not available.
+        """
+        if not os.path.exists("/proc/self/statm"):
+            return None
+
+        with open("/proc/self/statm", "r") as f:
+            n_pages = int(f.read().split()[1])
+        return n_pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+    @staticmethod
+    def get_datablock_counts() -> Dict[str, int]:
+        """
+        Get the number of datablocks of the collections that grow while rendering.
+
+        Returns:
+            Dict[str, int]: The number of datablocks per collection.
+        """
+        return {
+            name: len(getattr(bpy.data, name)) for name in DATABLOCK_COLLECTION_NAMES
+        }
+
+    def __get_rss_trend_mb(self) -> float:
+        """
+        Get the memory growth per render over the trend window, as the slope of a linear fit.
+
+        Returns:
+            float: The memory growth per render, in MB.
+        """
+        if len(self.rss_history_mb) < self.trend_window:
+            return 0.0
+
+        history = np.array(self.rss_history_mb[-self.trend_window :])
+        slope, _ = np.polyfit(np.arange(len(history)), history, 1)
+
+        return float(slope)
+
+    def __get_purge_reason(
+        self, rss_mb: float | None, datablock_counts: Dict[str, int]
+    ) -> str | None:
+        """
+        Get the reason to purge, if any.
+
+        Args:
+            rss_mb (float | None): The current resident memory, in MB, or None if not tracked.
+            datablock_counts (Dict[str, int]): The current number of datablocks per collection.
+
+        Returns:
+            str | None: The reason to purge, or None if no purge is needed.
+        """
+        if rss_mb is not None:
+            rss_growth_mb = rss_mb - self.base_rss_mb
+            if rss_growth_mb > self.rss_growth_watermark_mb:
+                return f"memory grown by {rss_growth_mb:.0f} MB above {self.rss_growth_watermark_mb:.0f} MB"
+
+        n_new_datablocks = sum(datablock_counts.values()) - self.n_base_datablocks
+        if n_new_datablocks > self.datablocks_growth_watermark:
+            return f"{n_new_datablocks} new datablocks above {self.datablocks_growth_watermark}"
+
+        rss_trend_mb = self.__get_rss_trend_mb()
+        if rss_trend_mb > self.trend_threshold_mb:
+            return f"memory growing by {rss_trend_mb:.1f} MB per render"
+
+        return None
+
+    def purge(self, reason: str) -> None:
+        """
+        Purge orphaned data and collect garbage, logging what was reclaimed.
+
+        Args:
+            reason (str): The reason to purge.
+        """
+        rss_before_mb = MemoryManager.get_rss_mb()
+        datablock_counts_before = MemoryManager.get_datablock_counts()
+
+        with trace_span("purge", category="render", reason=reason):
+            bpy.ops.wm.redraw_timer(
+                type="DRAW_WIN_SWAP", iterations=1
+            )  # Redraw the scene to prevent memory leak
+            bpy.ops.outliner.orphans_purge(do_recursive=True)  # Remove orphaned objects
+            gc.collect()  # Collect garbage
+
+        rss_after_mb = MemoryManager.get_rss_mb()
+        datablock_counts_after = MemoryManager.get_datablock_counts()
+        reclaimed_datablocks = {
+            name: datablock_counts_before[name] - datablock_counts_after[name]
+            for name in DATABLOCK_COLLECTION_NAMES
+            if datablock_counts_before[name] != datablock_counts_after[name]
+        }
+        self.n_purges += 1
+        self.rss_history_mb = []
+
+        # Measure the growth from what is left after the purge, so that live data does not trigger a purge per render
+        self.base_rss_mb = rss_after_mb
+        self.n_base_datablocks = sum(datablock_counts_after.values())
+        reclaimed_memory = (
+            "unknown memory"
+            if rss_after_mb is None
+            else f"{rss_before_mb - rss_after_mb:.0f} MB"
+        )
+        print(
+            f"♻️  Purged memory ({reason}): reclaimed {reclaimed_memory} and datablocks {reclaimed_datablocks}."
+        )
+
+    def step(self) -> None:
+        """
+        Record the memory usage after a render and purge if a watermark is crossed or a leak trend is detected.
+        """
+        rss_mb = MemoryManager.get_rss_mb()
+        if rss_mb is not None:
+            self.rss_history_mb.append(rss_mb)
+            self.rss_history_mb = self.rss_history_mb[-self.trend_window :]
+
+        datablock_counts = MemoryManager.get_datablock_counts()
+        if self.n_base_datablocks is None:
+            self.base_rss_mb = rss_mb
+            self.n_base_datablocks = sum(datablock_counts.values())
+
+        reason = self.__get_purge_reason(rss_mb, datablock_counts)
+        if reason is not None:
+            self.purge(reason)
@@ -0,0 +1,180 @@
+# This file contains the LED occlusion tester class, which answers the LED visibility queries of a frame against BVH trees of the scene geometry.
+
+import bpy
+import numpy as np
+from typing import List, Tuple
+from mathutils import Vector
+from mathutils.bvhtree import BVHTree
+
+from config.config import BACKGROUND_COLLECTION_NAME
+
+GEOMETRY_OBJECT_TYPES = {"MESH", "CURVE", "SURFACE", "META", "FONT"}
+
+
+class LedOcclusionTester:
+    """
+    An LED occlusion tester, casting rays from the LEDs to the camera against BVH trees of the occluding geometry.
+    The background geometry never moves and is built into a tree once per run, the rest of the scene (arm, stylus body) once per frame.
+    """
+
+    def __init__(
+        self,
+        leds: List[bpy.types.Object],
+        armature_arm: bpy.types.Object,
+        distance_eps: float = 1e-3,
+    ) -> None:
+        """
+        Initialize the LED occlusion tester.
+
+        Args:
+            leds (List[bpy.types.Object]): The LED objects, which never occlude each other.
+            armature_arm (bpy.types.Object): The armature arm object, which only occludes if it is rendered.
+            distance_eps (float, optional): The distance epsilon. Defaults to 1e-3.
+
+        Raises:
+            ValueError: If the distance epsilon is less than 0.
+        """
+        if distance_eps < 0:
+            raise ValueError("❌ The distance epsilon must be greater than or equal to 0.")
+
+        self.led_names = {led.name for led in leds}
+        self.armature_arm = armature_arm
+        self.distance_eps = distance_eps
+        self.static_object_names = set()
+        background_collection = bpy.data.collections.get(BACKGROUND_COLLECTION_NAME)
+        if background_collection is not None:
+            self.static_object_names = {
+                obj.name for obj in background_collection.all_objects
+            }
+        self.static_bvh_tree = None
+        self.dynamic_bvh_tree = None
+        self.is_static_bvh_tree_built = False
+
+    def __is_occluder(self, object: bpy.types.Object) -> bool:
+        """
+        Check if an evaluated object can occlude the LEDs.
+
+        Args:
+            object (bpy.types.Object): The evaluated object.
+
+        Returns:
+            bool: Whether the object can occlude the LEDs.
+        """
+        if object.type not in GEOMETRY_OBJECT_TYPES:
+            return False
+        if object.name in self.led_names:
+            return False
+        if object.name == self.armature_arm.name and self.armature_arm.hide_render:
+            return False
+
+        return True
+
+    @staticmethod
+    def __get_world_triangles(object: bpy.types.Object) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the world space triangles of an evaluated object.
+
+        Args:
+            object (bpy.types.Object): The evaluated object.
+
+        Returns:
+            np.ndarray: The world space vertices, of shape (V, 3).
+            np.ndarray: The triangle vertex indices, of shape (T, 3).
+        """
+        mesh = object.to_mesh()
+        mesh.calc_loop_triangles()
+        vertices = np.empty(len(mesh.vertices) * 3, dtype=np.float64)
+        mesh.vertices.foreach_get("co", vertices)
+        triangles = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int64)
+        mesh.loop_triangles.foreach_get("vertices", triangles)
+        object.to_mesh_clear()
+
+        matrix_world = np.array(object.matrix_world)
+        vertices = vertices.reshape(-1, 3) @ matrix_world[:3, :3].T + matrix_world[:3, 3]
+
+        return vertices, triangles.reshape(-1, 3)
+
+    @staticmethod
+    def __build_bvh_tree(objects: List[bpy.types.Object]) -> BVHTree | None:
+        """
+        Build a single BVH tree from the geometry of several evaluated objects.
+
+        Args:
+            objects (List[bpy.types.Object]): The evaluated objects.
+
+        Returns:
+            BVHTree | None: The BVH tree, or None if the objects have no triangles.
+        """
+        all_vertices = []
+        all_triangles = []
+        n_vertices = 0
+        for object in objects:
+            vertices, triangles = LedOcclusionTester.__get_world_triangles(object)
+            if len(triangles) == 0:
+                continue
+            all_vertices.append(vertices)
+            all_triangles.append(triangles + n_vertices)
+            n_vertices += len(vertices)
+
+        if len(all_triangles) == 0:
+            return None
+
+        return BVHTree.FromPolygons(
+            np.concatenate(all_vertices).tolist(),
+            np.concatenate(all_triangles).tolist(),
+            all_triangles=True,
+        )
+
+    def update(self) -> None:
+        """
+        Rebuild the BVH tree of the moving geometry for the current frame, and the background one on first use.
+        """
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+        occluders = [obj for obj in depsgraph.objects if self.__is_occluder(obj)]
+
+        if not self.is_static_bvh_tree_built:
+            self.static_bvh_tree = LedOcclusionTester.__build_bvh_tree(
+                [obj for obj in occluders if obj.name in self.static_object_names]
+            )
+            self.is_static_bvh_tree_built = True
+
+        self.dynamic_bvh_tree = LedOcclusionTester.__build_bvh_tree(
+            [obj for obj in occluders if obj.name not in self.static_object_names]
+        )
+
+    def are_leds_occluded(
+        self, led_centers: np.ndarray, camera_location: np.ndarray
+    ) -> np.ndarray:
+        """
+        Check if LEDs are occluded by any object between the camera and the LEDs.
+
+        Args:
+            led_centers (np.ndarray): The centers of the LEDs, of shape (N, 3).
+            camera_location (np.ndarray): The location of the camera, of shape (3,).
+
+        Returns:
+            np.ndarray: Whether each LED is occluded.
+        """
+        bvh_trees = [
+            bvh_tree
+            for bvh_tree in [self.static_bvh_tree, self.dynamic_bvh_tree]
+            if bvh_tree is not None
+        ]
+
+        camera_location = Vector(camera_location)
+        are_occluded = np.zeros(len(led_centers), dtype=bool)
+        for i, led_center in enumerate(led_centers):
+            # Cast a ray from the LED to the camera
+            led_center = Vector(led_center)
+            direction = camera_location - led_center
+            length = direction.length
+            direction.normalize()
+            for bvh_tree in bvh_trees:
+                location, _, _, _ = bvh_tree.ray_cast(
+                    led_center, direction, length + self.distance_eps
+                )
+                if location is not None:
+                    are_occluded[i] = True
+                    break
+
+        return are_occluded
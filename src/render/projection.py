@@ -0,0 +1,305 @@
+# This file contains the camera projection engine, projecting arrays of world points for perspective, panoramic and orthographic cameras.
+# It only depends on NumPy, so that projections can be computed outside of Blender.
+
+import numpy as np
+from typing import Any, Dict
+
+
+def get_camera_intrinsics(scene: Any, camera: Any) -> Dict[str, Any]:
+    """
+    Get the intrinsics of a camera, read once from Blender so that projections no longer need it.
+
+    Args:
+        scene (bpy.types.Scene): The scene, giving the render resolution.
+        camera (bpy.types.Camera): The camera data.
+
+    Returns:
+        Dict[str, Any]: The camera intrinsics.
+    """
+    return {
+        "type": camera.type,
+        "panorama_type": camera.panorama_type,
+        "lens": camera.lens,
+        "fisheye_lens": camera.fisheye_lens,
+        "fisheye_fov": camera.fisheye_fov,
+        "ortho_scale": camera.ortho_scale,
+        "sensor_width": camera.sensor_width,
+        "sensor_height": camera.sensor_height,
+        "sensor_fit": camera.sensor_fit,
+        "shift_x": camera.shift_x,
+        "shift_y": camera.shift_y,
+        "resolution_x": scene.render.resolution_x,
+        "resolution_y": scene.render.resolution_y,
+        "pixel_aspect_x": scene.render.pixel_aspect_x,
+        "pixel_aspect_y": scene.render.pixel_aspect_y,
+    }
+
+
+def get_normalized_matrix(matrix: np.ndarray) -> np.ndarray:
+    """
+    Remove the scale from world matrices, as done by Matrix.normalized.
+
+    Args:
+        matrix (np.ndarray): The world matrices, of shape (..., 4, 4).
+
+    Returns:
+        np.ndarray: The world matrices without scale.
+    """
+    matrix = np.array(matrix, dtype=np.float64)
+    matrix[..., :3, :3] /= np.linalg.norm(matrix[..., :3, :3], axis=-2, keepdims=True)
+
+    return matrix
+
+
+def get_camera_local_coordinates(
+    points: np.ndarray, camera_matrix_world: np.ndarray
+) -> np.ndarray:
+    """
+    Transform world points to the local coordinates of the camera.
+
+    Args:
+        points (np.ndarray): The world points, of shape (..., N, 3).
+        camera_matrix_world (np.ndarray): The camera world matrix, of shape (..., 4, 4).
+
+    Returns:
+        np.ndarray: The points in camera coordinates, of shape (..., N, 3).
+    """
+    world_to_camera = np.linalg.inv(get_normalized_matrix(camera_matrix_world))
+    rotation = world_to_camera[..., :3, :3]
+    translation = world_to_camera[..., None, :3, 3]
+
+    return np.einsum("...ij,...nj->...ni", rotation, points) + translation
+
+
+def get_view_aspect(intrinsics: Dict[str, Any]) -> np.ndarray:
+    """
+    Get the view frame aspect correction of the camera, as done by Camera.view_frame.
+
+    Args:
+        intrinsics (Dict[str, Any]): The camera intrinsics.
+
+    Returns:
+        np.ndarray: The horizontal and vertical aspect corrections, of shape (..., 2).
+    """
+    aspect_x = np.asarray(intrinsics["resolution_x"] * intrinsics["pixel_aspect_x"], dtype=np.float64)
+    aspect_y = np.asarray(intrinsics["resolution_y"] * intrinsics["pixel_aspect_y"], dtype=np.float64)
+    if intrinsics["sensor_fit"] == "HORIZONTAL":
+        is_horizontal_fit = np.ones_like(aspect_x, dtype=bool)
+    elif intrinsics["sensor_fit"] == "VERTICAL":
+        is_horizontal_fit = np.zeros_like(aspect_x, dtype=bool)
+    else:
+        is_horizontal_fit = aspect_x >= aspect_y
+
+    return np.stack(
+        [
+            np.where(is_horizontal_fit, 1.0, aspect_x / aspect_y),
+            np.where(is_horizontal_fit, aspect_y / aspect_x, 1.0),
+        ],
+        axis=-1,
+    )
+
+
+def project_points_perspective(
+    local_points: np.ndarray, intrinsics: Dict[str, Any]
+) -> np.ndarray:
+    """
+    Project camera points for a perspective camera, matching world_to_camera_view.
+
+    Args:
+        local_points (np.ndarray): The points in camera coordinates, of shape (..., N, 3).
+        intrinsics (Dict[str, Any]): The camera intrinsics.
+
+    Returns:
+        np.ndarray: The projected coordinates and depths, of shape (..., N, 3).
+    """
+    half_sensor = 0.5 * np.asarray(
+        intrinsics["sensor_height"]
+        if intrinsics["sensor_fit"] == "VERTICAL"
+        else intrinsics["sensor_width"],
+        dtype=np.float64,
+    )
+    lens = np.asarray(intrinsics["lens"], dtype=np.float64)
+    aspect = get_view_aspect(intrinsics)
+
+    # View frame half extents and shifts at unit depth
+    half_extents = aspect * (half_sensor / lens)[..., None]
+    shifts = (
+        np.stack(
+            [
+                np.asarray(intrinsics["shift_x"], dtype=np.float64),
+                np.asarray(intrinsics["shift_y"], dtype=np.float64),
+            ],
+            axis=-1,
+        )
+        * (2.0 * half_sensor / lens)[..., None]
+    )
+
+    depths = -local_points[..., 2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        coordinates = local_points[..., :2] / depths[..., None]
+        coordinates = (coordinates - (shifts - half_extents)[..., None, :]) / (
+            2.0 * half_extents[..., None, :]
+        )
+    coordinates = np.where((depths == 0.0)[..., None], 0.5, coordinates)
+    depths = np.where(depths == 0.0, 0.0, depths)
+
+    return np.concatenate([coordinates, depths[..., None]], axis=-1)
+
+
+def project_points_orthographic(
+    local_points: np.ndarray, intrinsics: Dict[str, Any]
+) -> np.ndarray:
+    """
+    Project camera points for an orthographic camera, matching world_to_camera_view.
+
+    Args:
+        local_points (np.ndarray): The points in camera coordinates, of shape (..., N, 3).
+        intrinsics (Dict[str, Any]): The camera intrinsics.
+
+    Returns:
+        np.ndarray: The projected coordinates and depths, of shape (..., N, 3).
+    """
+    ortho_scale = np.asarray(intrinsics["ortho_scale"], dtype=np.float64)
+    aspect = get_view_aspect(intrinsics)
+
+    half_extents = 0.5 * aspect * ortho_scale[..., None]
+    shifts = (
+        np.stack(
+            [
+                np.asarray(intrinsics["shift_x"], dtype=np.float64),
+                np.asarray(intrinsics["shift_y"], dtype=np.float64),
+            ],
+            axis=-1,
+        )
+        * ortho_scale[..., None]
+    )
+
+    depths = -local_points[..., 2]
+    coordinates = (local_points[..., :2] - (shifts - half_extents)[..., None, :]) / (
+        2.0 * half_extents[..., None, :]
+    )
+
+    return np.concatenate([coordinates, depths[..., None]], axis=-1)
+
+
+def project_points_panoramic(
+    local_points: np.ndarray, intrinsics: Dict[str, Any]
+) -> np.ndarray:
+    """
+    Project camera points for an equisolid fisheye panoramic camera.
+    From: https://blender.stackexchange.com/questions/40702/how-can-i-get-the-projection-matrix-of-a-panoramic-camera-with-a-fisheye-equisol.
+
+    Args:
+        local_points (np.ndarray): The points in camera coordinates, of shape (..., N, 3).
+        intrinsics (Dict[str, Any]): The camera intrinsics.
+
+    Raises:
+        ValueError: If the panorama type is not equisolid fisheye.
+
+    Returns:
+        np.ndarray: The projected coordinates and depths, of shape (..., N, 3).
+    """
+    if intrinsics["panorama_type"] != "FISHEYE_EQUISOLID":
+        raise ValueError(
+            f"❌ Panorama type {intrinsics['panorama_type']} not supported."
+        )
+
+    f = np.asarray(intrinsics["fisheye_lens"], dtype=np.float64)[..., None]
+    pixel_aspect_ratio = np.asarray(
+        intrinsics["resolution_x"] / intrinsics["resolution_y"], dtype=np.float64
+    )[..., None]
+    if intrinsics["sensor_fit"] == "VERTICAL":
+        h = np.asarray(intrinsics["sensor_height"], dtype=np.float64)[..., None]
+        w = pixel_aspect_ratio * h
+    else:
+        w = np.asarray(intrinsics["sensor_width"], dtype=np.float64)[..., None]
+        h = w / pixel_aspect_ratio
+
+    depths = -local_points[..., 2]
+    norms = np.linalg.norm(local_points, axis=-1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        directions = np.where(norms > 0.0, local_points / norms, 0.0)
+
+    phi = np.arctan2(directions[..., 1], directions[..., 0])
+    l = np.minimum(np.hypot(directions[..., 0], directions[..., 1]), 1.0)
+    theta = np.arcsin(l)
+
+    # Equisolid projection
+    r = 2.0 * f * np.sin(theta / 2.0)
+    u = r * np.cos(phi) / w + 0.5
+    v = r * np.sin(phi) / h + 0.5
+
+    return np.stack([u, v, depths], axis=-1)
+
+
+def project_points(
+    points: np.ndarray, camera_matrix_world: np.ndarray, intrinsics: Dict[str, Any]
+) -> np.ndarray:
+    """
+    Project world points to normalized camera view coordinates, (0, 0) being the bottom left corner of the frame.
+    Leading dimensions of the points and camera world matrices broadcast, so that several frames can be projected at once.
+
+    Args:
+        points (np.ndarray): The world points, of shape (..., N, 3).
+        camera_matrix_world (np.ndarray): The camera world matrix, of shape (..., 4, 4).
+        intrinsics (Dict[str, Any]): The camera intrinsics, whose numerical values may be arrays of shape (...).
+
+    Raises:
+        ValueError: If the camera type is not supported.
+
+    Returns:
+        np.ndarray: The projected u and v coordinates and the depths along the view axis, of shape (..., N, 3).
+    """
+    points = np.asarray(points, dtype=np.float64)
+    local_points = get_camera_local_coordinates(points, camera_matrix_world)
+
+    if intrinsics["type"] == "PERSP":
+        return project_points_perspective(local_points, intrinsics)
+    elif intrinsics["type"] == "PANO":
+        return project_points_panoramic(local_points, intrinsics)
+    elif intrinsics["type"] == "ORTHO":
+        return project_points_orthographic(local_points, intrinsics)
+    else:
+        raise ValueError(f"❌ Camera type {intrinsics['type']} not supported.")
+
+
+def are_points_in_frame(projected_coordinates: np.ndarray) -> np.ndarray:
+    """
+    Check if projected points are in the camera frame.
+
+    Args:
+        projected_coordinates (np.ndarray): The projected coordinates, of shape (..., N, 2) or (..., N, 3).
+
+    Returns:
+        np.ndarray: Whether each point is in the camera frame, of shape (..., N).
+    """
+    u = projected_coordinates[..., 0]
+    v = projected_coordinates[..., 1]
+
+    return (0 <= u) & (u <= 1) & (0 <= v) & (v <= 1)
+
+
+def get_relative_orientations(
+    matrix_world: np.ndarray, local_vector: np.ndarray, camera_matrix_world: np.ndarray
+) -> np.ndarray:
+    """
+    Get the relative orientations of objects to the camera, as the cosine between an object vector and the camera view direction.
+
+    Args:
+        matrix_world (np.ndarray): The object world matrices, of shape (..., N, 4, 4).
+        local_vector (np.ndarray): The vector of the objects in their local coordinates, of shape (3,).
+        camera_matrix_world (np.ndarray): The camera world matrix, of shape (..., 4, 4).
+
+    Returns:
+        np.ndarray: The relative orientations, of shape (..., N).
+    """
+    object_directions = np.einsum(
+        "...ij,j->...i", np.asarray(matrix_world)[..., :3, :3], np.asarray(local_vector)
+    )
+    object_directions /= np.linalg.norm(object_directions, axis=-1, keepdims=True)
+    camera_view_directions = -np.asarray(camera_matrix_world)[..., :3, 2]
+    camera_view_directions /= np.linalg.norm(
+        camera_view_directions, axis=-1, keepdims=True
+    )
+
+    return np.einsum("...ni,...i->...n", object_directions, camera_view_directions)
@@ -1,39 +1,105 @@
 # This file contains functions to render the animation and collect frame data.
 
 import os
-import gc
 import bpy
-import math
-import json
+import copy
+import shutil
 import numpy as np
 from tqdm import tqdm
 from mathutils import Vector
 from typing import Tuple, List, Dict, Any
-from bpy_extras.object_utils import world_to_camera_view
 
-from background_image.black_background_image_generator import (
-    BlackBackgroundImageGenerator,
+from background_image.background_image_generator import BACKGROUND_IMAGE_NODE_NAME
+from utils.seed import get_seed
+from utils.tracer import trace_span
+from render.annotation_stream import AnnotationReader, AnnotationWriter
+from render.columnar_annotation_store import ColumnarAnnotationWriter
+from render.occlusion import LedOcclusionTester
+from render.led_visibility import LedPixelCounter
+from render.memory_manager import MemoryManager
+from render.view_layers import (
+    setup_no_bg_view_layer,
+    set_render_view_layer,
+    NO_BG_VIEW_LAYER_NAME,
 )
-from background_image.random_background_image_generator import (
-    RandomBackgroundImageGenerator,
+from render.compositor import (
+    setup_single_pass_compositor,
+    restore_material_pass_indices,
+    setup_background_switch,
+    set_black_background,
+    get_node,
+    get_output_file_path,
+    setup_frame_store_viewer,
+    get_viewer_pixels,
+    write_black_output_image,
+    IMAGE_OUTPUT_NODE_NAME,
+    SEGMENTATION_OUTPUT_NODE_NAME,
+    NO_BG_OUTPUT_NODE_NAME,
+)
+from render.roi_crop import write_crops, get_crop_file_path
+from render.shard_writer import ShardWriter
+from render.frame_store import FrameStore
+from render.camera_export import CameraExportWriter
+from render.frame_range_render import get_part_folder_path
+from render.render_folder import allocate_render_folder
+from render.render_state import refresh_render_lock
+from render.scene_state import SceneStateHasher
+from render.visibility_gate import (
+    VisibilityGate,
+    write_gate_stats,
+    GATE_RENDER,
+    GATE_NO_BG_ONLY,
+    GATE_SKIP,
+)
+from render.projection import (
+    get_camera_intrinsics,
+    project_points,
+    are_points_in_frame,
+    get_relative_orientations,
 )
 from config.config import (
     RENDER_FOLDER_PATH,
+    RENDER_FOLDER_SHARD_LEVELS,
     CAMERA_NAME,
-    CAMERA_TYPE,
-    BACKGROUND_COLLECTION_NAME,
-    RENDER_RESOLUTION,
+    ARMATURE_NAME,
     BOUNDING_BOX_PADDING,
-    SEED,
     CENTER_CAMERA_ON_DEVICE_PROBABILITY,
+    ANNOTATION_FILE_NAME,
+    ANNOTATION_INDEX_FILE_NAME,
+    ANNOTATION_FSYNC_INTERVAL,
+    COLUMNAR_ANNOTATIONS,
+    COLUMNAR_ANNOTATION_FOLDER_NAME,
+    SINGLE_PASS_RENDER,
+    ANIMATION_RENDER,
+    ANIMATION_FOLDER_NAME,
+    DEDUPLICATE_FRAMES,
+    DEDUPLICATE_FRAMES_TOLERANCE,
+    VISIBILITY_GATE,
+    GATE_MIN_VISIBLE_LEDS,
+    GATE_MAX_DISTANCE,
+    GATE_FALLBACK_DECISION,
+    GATE_STATS_FILE_NAME,
+    NO_BG_BORDER_RENDER,
+    NO_BG_BORDER_PADDING,
+    MEMORY_RSS_GROWTH_WATERMARK_MB,
+    MEMORY_DATABLOCKS_GROWTH_WATERMARK,
+    MEMORY_TREND_WINDOW,
+    MEMORY_TREND_THRESHOLD_MB,
+    ROI_CROP_SIZE,
+    SHARDED_OUTPUT,
+    SHARD_FOLDER_NAME,
+    SHARD_MAX_SIZE_MB,
+    FRAME_STORE,
+    FRAME_STORE_FOLDER_NAME,
+    RAY_CAST_OCCLUSION,
+    PIXEL_VISIBILITY,
+    CAMERA_EXPORT_FOLDER_NAME,
 )
 
 
-def render_bg_frame(
-    render_folder_path: str,
-) -> None:
+def set_bg_output_folder(render_folder_path: str) -> None:
     """
-    Render a frame with a random background image.
+    Set the folders the image and segmentation output nodes write the bg pass to.
 
     Args:
         render_folder_path (str): The folder path to render the frame to.
@@ -46,91 +112,47 @@ def render_bg_frame(
     segmentation_output_node.base_path = os.path.join(
         render_folder_path, "segmentation"
     )
-    bpy.ops.wm.redraw_timer(
-        type="DRAW_WIN_SWAP", iterations=1
-    )  # Redraw the scene to prevent memory leak
-    bpy.ops.render.render(animation=False, write_still=False)
-    bpy.ops.outliner.orphans_purge(do_recursive=True)  # Remove orphaned objects
-    gc.collect()  # Collect garbage
 
 
-def get_black_material(material_name: str = "BlackMaterial") -> bpy.types.Material:
+def render_bg_frame(
+    render_folder_path: str,
+    memory_manager: MemoryManager,
+    animation: bool = False,
+) -> None:
     """
-    Get a black material, creating it if it does not exist.
+    Render a frame with a random background image.
 
     Args:
-        material_name (str, optional): The name of the material. Defaults to "BlackMaterial".
-
-    Returns:
-        bpy.types.Material: The black material.
-    """
-    if material_name not in bpy.data.materials:
-        black_material = bpy.data.materials.new(name=material_name)
-        black_material.use_nodes = True
-        black_material.node_tree.nodes.clear()
-        black_material_output = black_material.node_tree.nodes.new(
-            "ShaderNodeOutputMaterial"
-        )
-        black_material_diffuse = black_material.node_tree.nodes.new(
-            "ShaderNodeBsdfDiffuse"
-        )
-        black_material_diffuse.inputs["Color"].default_value = (0, 0, 0, 1)
-        black_material.node_tree.links.new(
-            black_material_output.inputs["Surface"],
-            black_material_diffuse.outputs["BSDF"],
-        )
-    else:
-        black_material = bpy.data.materials.get(material_name)
-
-    return black_material
+        render_folder_path (str): The folder path to render the frame to.
+        memory_manager (MemoryManager): The memory manager.
+        animation (bool, optional): Whether to render all frames of the scene range at once instead of the current frame. Defaults to False.
+    """
+    set_bg_output_folder(render_folder_path)
+    bpy.ops.render.render(animation=animation, write_still=False)
+    memory_manager.step()
 
 
-def hide_background(
-    frame_index: int,
-    armature_suffix: str,
-    armature_arm: bpy.types.Object,
-) -> Tuple[Dict[bpy.types.Object, bool], float]:
+def hide_background() -> Tuple[str, float]:
     """
-    Hide the background in the scene.
-
-    Args:
-        frame_index (int): The frame index.
-        armature_suffix (str): The suffix of the armature.
-        armature_arm (bpy.types.Object): The armature arm object.
+    Hide the background in the scene, by rendering the no-bg view layer set up for the run.
 
     Raises:
-        ValueError: If the armature arm is not found.
-        ValueError: If the inner stylus is not found.
+        ValueError: If the no-bg view layer is not found.
+        ValueError: If the render layers node is not found.
+        ValueError: If the background switch node is not found.
         ValueError: If the glare node is not found.
 
     Returns:
-        Dict[bpy.types.Object, bool]: The old hide render states of the background objects.
+        str: The name of the view layer rendered before.
         float: The old glare value.
     """
-    # Hide background objects and store old states
-    background_objects = bpy.data.collections[BACKGROUND_COLLECTION_NAME].objects
-    old_hide_render_states = {obj: obj.hide_render for obj in background_objects}
-    for background_object in background_objects:
-        background_object.hide_render = True
-        background_object.keyframe_insert(data_path="hide_render", frame=frame_index)
-
-    # Set black arm model
-    black_material = get_black_material()
-    armature_arm.data.materials.clear()
-    armature_arm.data.materials.append(black_material)
-
-    # Set device as black material
-    inner_stylus = bpy.data.objects.get(f"Inner{armature_suffix}")
-    if inner_stylus is None:
-        raise ValueError("❌ Inner stylus not found.")
-    inner_stylus.data.materials.clear()
-    inner_stylus.data.materials.append(black_material)
-
-    # Add black background
-    black_background_image_generator = BlackBackgroundImageGenerator(
-        width=RENDER_RESOLUTION[0], height=RENDER_RESOLUTION[1]
+    # Render the view layer without background and with the arm and stylus held out
+    old_view_layer_name = set_render_view_layer(
+        bpy.context.scene, NO_BG_VIEW_LAYER_NAME
     )
-    black_background_image_generator.apply_to_scene()
+
+    # Switch to the black background
+    set_black_background(True)
 
     # Remove fog effect
     tree = bpy.context.scene.node_tree
@@ -140,50 +162,31 @@ def hide_background(
     old_glare_value = glare_node.mix
     glare_node.mix = -1
 
-    return old_hide_render_states, old_glare_value
+    return old_view_layer_name, old_glare_value
 
 
 def show_background(
-    frame_index: int,
-    armature_suffix: str,
-    random_background_image_generator: RandomBackgroundImageGenerator,
-    old_hide_render_states: Dict[bpy.types.Object, bool],
+    old_view_layer_name: str,
     old_glare_value: float,
 ) -> None:
     """
     Show the background in the scene.
 
     Args:
-        frame_index (int): The frame index.
-        armature_suffix (str): The suffix of the armature.
-        random_background_image_generator (RandomBackgroundImageGenerator): The random background image generator.
-        old_hide_render_states (Dict[bpy.types.Object, bool]): The old hide render states of the background objects.
+        old_view_layer_name (str): The name of the view layer rendered before.
         old_glare_value (float): The old glare value.
 
     Raises:
-        ValueError: If the armature arm is not found.
-        ValueError: If the inner stylus is not found.
+        ValueError: If the view layer is not found.
+        ValueError: If the render layers node is not found.
+        ValueError: If the background switch node is not found.
         ValueError: If the glare node is not found.
     """
-    # Add back the random background image
-    random_background_image_generator.apply_to_scene()
+    # Switch back to the random background image
+    set_black_background(False)
 
-    # Add back the background objects
-    for background_object, old_hide_render_state in old_hide_render_states.items():
-        background_object.hide_render = old_hide_render_state
-        background_object.keyframe_insert(data_path="hide_render", frame=frame_index)
-
-    # Remove black material arm model
-    armature_arm = bpy.data.objects.get(f"Arm{armature_suffix}")
-    if armature_arm is None:
-        raise ValueError("❌ Armature arm not found.")
-    armature_arm.data.materials.clear()
-
-    # Remove black device material
-    inner_stylus = bpy.data.objects.get(f"Inner{armature_suffix}")
-    if inner_stylus is None:
-        raise ValueError("❌ Inner stylus not found.")
-    inner_stylus.data.materials.clear()
+    # Render the main view layer again
+    set_render_view_layer(bpy.context.scene, old_view_layer_name)
 
     # Add back fog effect
     tree = bpy.context.scene.node_tree
@@ -193,28 +196,90 @@ def show_background(
     glare_node.mix = old_glare_value
 
 
+def get_no_bg_border(
+    leds_state: Dict[str, np.ndarray], padding: float
+) -> Tuple[float, float, float, float] | None:
+    """
+    Get the render border of the no-bg pass around the in-frame LEDs, outside of which the frame is black.
+    LEDs occluded by the background are kept, since the background is not rendered in the no-bg pass.
+
+    Args:
+        leds_state (Dict[str, np.ndarray]): The state of the LEDs for the current frame.
+        padding (float): The padding of the border, in camera view coordinates.
+
+    Returns:
+        Tuple[float, float, float, float] | None: The minimum and maximum x and y of the border, in camera view coordinates, or None if no LED is in frame.
+    """
+    center, width, height = get_bounding_box(
+        leds_state, padding, is_visible=leds_state["is_in_frame"]
+    )
+    if center is None:
+        return None
+
+    return (
+        center.x - width / 2,
+        center.x + width / 2,
+        center.y - height / 2,
+        center.y + height / 2,
+    )
+
+
+def write_black_no_bg_frame(render_folder_path: str, frame: int) -> None:
+    """
+    Write a black no-bg image for a frame without LED in frame, instead of rendering it, unless the image output node is muted.
+
+    Args:
+        render_folder_path (str): The folder path to render the frame to.
+        frame (int): The frame index.
+
+    Raises:
+        ValueError: If the image output node is not found.
+        ValueError: If the file format of the image output node is not supported.
+    """
+    scene = bpy.context.scene
+    image_output_node = get_node(scene.node_tree, IMAGE_OUTPUT_NODE_NAME)
+    if image_output_node.mute:
+        return
+
+    resolution_scale = scene.render.resolution_percentage / 100
+    write_black_output_image(
+        image_output_node,
+        get_output_file_path(
+            image_output_node, os.path.join(render_folder_path, "no-bg"), frame
+        ),
+        int(scene.render.resolution_x * resolution_scale),
+        int(scene.render.resolution_y * resolution_scale),
+    )
+
+
 def render_no_bg_frame(
     render_folder_path: str,
-    frame_index: int,
-    armature_suffix: str,
-    armature_arm: bpy.types.Object,
-    random_background_image_generator: RandomBackgroundImageGenerator,
+    memory_manager: MemoryManager,
+    border: Tuple[float, float, float, float] | None = None,
+    animation: bool = False,
 ) -> None:
     """
     Render a frame without background noise.
 
     Args:
         render_folder_path (str): The folder path to render the frame to.
-        frame_index (int): The frame index to render.
-        armature_suffix (str): The suffix of the armature.
-        armature_arm (bpy.types.Object): The armature arm object.
-        random_background_image_generator (RandomBackgroundImageGenerator): The random background image generator.
+        memory_manager (MemoryManager): The memory manager.
+        border (Tuple[float, float, float, float] | None, optional): The minimum and maximum x and y of the region to render, the rest of the full-size frame staying black. Defaults to the whole frame.
+        animation (bool, optional): Whether to render all frames of the scene range at once instead of the current frame. Defaults to False.
     """
-    old_hide_render_states, old_glare_value = hide_background(
-        frame_index,
-        armature_suffix,
-        armature_arm,
-    )
+    old_view_layer_name, old_glare_value = hide_background()
+
+    # Only path trace the region of the LEDs, without cropping the output
+    render_settings = bpy.context.scene.render
+    if border is not None:
+        render_settings.use_border = True
+        render_settings.use_crop_to_border = False
+        (
+            render_settings.border_min_x,
+            render_settings.border_max_x,
+            render_settings.border_min_y,
+            render_settings.border_max_y,
+        ) = border
 
     # Render the frame
     image_output_node = bpy.data.scenes["Scene"].node_tree.nodes["Image Output"]
@@ -223,245 +288,244 @@ def render_no_bg_frame(
         "Segmentation Output"
     ]
     segmentation_output_node.mute = True
-    bpy.ops.wm.redraw_timer(
-        type="DRAW_WIN_SWAP", iterations=1
-    )  # Redraw the scene to prevent memory leak
-    bpy.ops.render.render(animation=False, write_still=False)
-    bpy.ops.outliner.orphans_purge(do_recursive=True)  # Remove orphaned objects
-    gc.collect()  # Collect garbage
+    bpy.ops.render.render(animation=animation, write_still=False)
+    memory_manager.step()
     segmentation_output_node.mute = False
+    render_settings.use_border = False
 
     show_background(
-        frame_index,
-        armature_suffix,
-        random_background_image_generator,
-        old_hide_render_states,
+        old_view_layer_name,
         old_glare_value,
     )
 
 
-def get_object_center(object: bpy.types.Object) -> Vector:
+def render_single_pass_frame(
+    render_folder_path: str,
+    memory_manager: MemoryManager,
+    animation: bool = False,
+) -> None:
     """
-    Get the center of an object, which has an associated arrow object.
+    Render a frame once, writing both the image with a random background and the image without background noise.
 
     Args:
-        object (bpy.types.Object): The object to get the center of.
-
-    Raises:
-        ValueError: If the associated arrow object is not found.
-
-    Returns:
-        Vector: The center of the object.
+        render_folder_path (str): The folder path to render the frame to.
+        memory_manager (MemoryManager): The memory manager.
+        animation (bool, optional): Whether to render all frames of the scene range at once instead of the current frame. Defaults to False.
     """
-    arrow_name = object.name.replace("LED", "Arrow")
-    arrow = bpy.data.objects.get(arrow_name)
-    if arrow is None:
-        raise ValueError(
-            f"❌ Associated arrow {arrow_name} for object {object.name} not found."
-        )
-    arrow_location = arrow.matrix_world.translation
-
-    return arrow_location
+    image_output_node = bpy.data.scenes["Scene"].node_tree.nodes["Image Output"]
+    image_output_node.base_path = os.path.join(render_folder_path, "bg")
+    segmentation_output_node = bpy.data.scenes["Scene"].node_tree.nodes[
+        "Segmentation Output"
+    ]
+    segmentation_output_node.base_path = os.path.join(
+        render_folder_path, "segmentation"
+    )
+    no_bg_output_node = bpy.data.scenes["Scene"].node_tree.nodes[
+        NO_BG_OUTPUT_NODE_NAME
+    ]
+    no_bg_output_node.base_path = os.path.join(render_folder_path, "no-bg")
+    bpy.ops.render.render(animation=animation, write_still=False)
+    memory_manager.step()
 
 
-def is_led_occluded(
-    led: bpy.types.Object,
-    camera_object: bpy.types.Object,
-    leds: List[bpy.types.Object],
-    armature_arm: bpy.types.Object,
-    distance_eps: float = 1e-3,
-) -> bool:
+def get_rendered_image_file_paths(render_folder_path: str, frame: int) -> Dict[str, str]:
     """
-    Check if an LED is occluded by any object between the camera and the LED.
+    Get the paths of the bg and no-bg images rendered for a frame.
 
     Args:
-        led (bpy.types.Object): The LED object.
-        camera_object (bpy.types.Object): The camera object.
-        leds (List[bpy.types.Object]): The LED objects.
-        armature_arm (bpy.types.Object): The armature arm object.
-        distance_eps (float, optional): The distance epsilon. Defaults to 1e-3.
+        render_folder_path (str): The folder path the frame was rendered to.
+        frame (int): The frame index.
+
+    Raises:
+        ValueError: If an output node is not found.
+        ValueError: If the file format of an output node is not supported.
 
     Returns:
-        bool: Whether the LED is occluded.
+        Dict[str, str]: The image paths, by pass name.
     """
-    # Get the direction from the camera to the LED
-    led_location = get_object_center(led)
-    direction = camera_object.location - led_location
-    length = direction.length
-    direction.normalize()
-
-    # Remove LEDs and add arm if needed from the scene
-    for l in leds:
-        l.hide_set(True)
-    armature_arm.hide_set(armature_arm.hide_render)
-
-    # Cast a ray from the camera to the LED
-    scene = bpy.context.scene
-    result = scene.ray_cast(
-        depsgraph=bpy.context.evaluated_depsgraph_get(),
-        origin=led_location,
-        direction=direction,
-        distance=length + distance_eps,
+    tree = bpy.context.scene.node_tree
+    image_output_node = get_node(tree, IMAGE_OUTPUT_NODE_NAME)
+    no_bg_output_node = (
+        get_node(tree, NO_BG_OUTPUT_NODE_NAME)
+        if SINGLE_PASS_RENDER
+        else image_output_node
     )
 
-    # Add back LEDs to the scene
-    for l in leds:
-        l.hide_set(False)
-
-    return result[0]
+    return {
+        "bg": get_output_file_path(
+            image_output_node, os.path.join(render_folder_path, "bg"), frame
+        ),
+        "no-bg": get_output_file_path(
+            no_bg_output_node, os.path.join(render_folder_path, "no-bg"), frame
+        ),
+    }
 
 
-def is_led_in_frame(led_projected_coordinates: Vector) -> bool:
+def get_frame_file_paths(
+    render_folder_path: str, frame: int, frame_data: Dict[str, Any]
+) -> Dict[str, str]:
     """
-    Check if a LED is in the camera frame.
+    Get the paths of all the files written for a frame: the rendered images, the segmentation and the crops if any.
+    Frames only rendered without background, or skipped, by the visibility gate only have their no-bg files, or none.
 
     Args:
-        led_projected_coordinates (Vector): The projected coordinates of the LED.
+        render_folder_path (str): The folder path the frame was rendered to.
+        frame (int): The frame index.
+        frame_data (Dict[str, Any]): The frame data.
+
+    Raises:
+        ValueError: If an output node is not found.
+        ValueError: If the file format of an output node is not supported.
 
     Returns:
-        bool: Whether the LED is in the camera frame.
+        Dict[str, str]: The file paths, by key.
     """
-
-    return (
-        0 <= led_projected_coordinates.x <= 1 and 0 <= led_projected_coordinates.y <= 1
+    file_paths = get_rendered_image_file_paths(render_folder_path, frame)
+    file_paths["segmentation"] = get_output_file_path(
+        get_node(bpy.context.scene.node_tree, SEGMENTATION_OUTPUT_NODE_NAME),
+        os.path.join(render_folder_path, "segmentation"),
+        frame,
     )
+    if frame_data.get("crop") is not None:
+        for pass_name in ["bg", "no-bg"]:
+            file_paths[f"{pass_name}-crop"] = get_crop_file_path(
+                render_folder_path,
+                pass_name,
+                frame,
+                os.path.splitext(file_paths[pass_name])[1],
+            )
 
+    gate_decision = frame_data.get("gate", GATE_RENDER)
+    if gate_decision == GATE_NO_BG_ONLY:
+        file_paths = {
+            key: file_path for key, file_path in file_paths.items() if key.startswith("no-bg")
+        }
+    elif gate_decision == GATE_SKIP:
+        file_paths = {}
 
-def get_object_relative_orientation(
-    object: bpy.types.Object, object_vector: Vector, camera_object: bpy.types.Object
-) -> float:
-    """
-    Get the relative orientation of an object to the camera.
-
-    Args:
-        object (bpy.types.Object): The object to get the relative orientation of.
-        object_vector (Vector): The vector of the object.
-        camera_object (bpy.types.Object): The camera object.
-    """
-    object_rotation = object.matrix_world.to_3x3()
-    camera_rotation = camera_object.matrix_world.to_3x3()
-    object_direction = object_rotation @ object_vector
-    object_direction.normalize()
-    camera_view_direction = camera_rotation @ Vector((0, 0, -1))
-    camera_view_direction.normalize()
-    relative_orientation = object_direction.dot(camera_view_direction)
-
-    return relative_orientation
+    return file_paths
 
 
-def get_projected_coordinates_perspective(
-    led_center: Vector, camera_object: bpy.types.Object
-) -> Vector:
+def get_led_arrows(leds: List[bpy.types.Object]) -> List[bpy.types.Object]:
     """
-    Get the projected coordinates of a point in the camera view for a perspective camera.
+    Get the arrow objects associated with the LEDs, giving their centers and orientations.
 
     Args:
-        led_center (Vector): The center of the LED.
-        camera_object (bpy.types.Object): The camera object.
+        leds (List[bpy.types.Object]): The LED objects.
+
+    Raises:
+        ValueError: If the associated arrow object of an LED is not found.
 
     Returns:
-        Vector: The projected coordinates of the LED.
+        List[bpy.types.Object]: The arrow objects, in the order of the LEDs.
     """
-    scene = bpy.context.scene
-    return world_to_camera_view(scene, camera_object, led_center)
+    led_arrows = []
+    for led in leds:
+        arrow_name = led.name.replace("LED", "Arrow")
+        arrow = bpy.data.objects.get(arrow_name)
+        if arrow is None:
+            raise ValueError(
+                f"❌ Associated arrow {arrow_name} for object {led.name} not found."
+            )
+        led_arrows.append(arrow)
+
+    return led_arrows
 
 
-def get_projected_coordinates_panoramic(
-    led_center: Vector, camera: bpy.types.Camera, camera_object: bpy.types.Object
-) -> Vector:
+def get_leds_state(
+    camera_object: bpy.types.Object,
+    camera: bpy.types.Camera,
+    led_arrows: List[bpy.types.Object],
+    led_occlusion_tester: LedOcclusionTester | None,
+    led_pixel_counter: LedPixelCounter | None,
+) -> Dict[str, np.ndarray]:
     """
-    Get the projected coordinates of a point in the camera view for a panoramic camera.
-    From: https://blender.stackexchange.com/questions/40702/how-can-i-get-the-projection-matrix-of-a-panoramic-camera-with-a-fisheye-equisol.
+    Get the state of all LEDs for the current frame, computing each quantity exactly once.
+    Occlusion is decided by ray casts if the occlusion tester is given, else by the visible pixels of the rendered frame.
 
     Args:
-        led_center (Vector): The center of the LED.
-        camera (bpy.types.Camera): The camera.
         camera_object (bpy.types.Object): The camera object.
+        camera (bpy.types.Camera): The camera.
+        led_arrows (List[bpy.types.Object]): The arrow objects associated with the LEDs.
+        led_occlusion_tester (LedOcclusionTester | None): The LED occlusion tester, or None to skip the ray casts.
+        led_pixel_counter (LedPixelCounter | None): The LED pixel counter, or None to skip the pixel visibility.
+
+    Raises:
+        ValueError: If the camera type is not supported.
+        ValueError: If neither the occlusion tester nor the pixel counter is given.
+        ValueError: If the viewer image is not found, with pixel visibility.
 
     Returns:
-        Vector: The projected coordinates of the LED.
+        Dict[str, np.ndarray]: The centers, projected coordinates, occlusion, in frame, distance from camera and relative orientation of the LEDs, and their visible pixels and visibility fraction if counted.
     """
-    scene = bpy.context.scene
-    f = camera_object.data.fisheye_lens
-    pixel_aspect_ratio = scene.render.resolution_x / scene.render.resolution_y
-    if camera.sensor_fit == "VERTICAL":
-        h = camera.sensor_height
-        w = pixel_aspect_ratio * h
-    else:
-        w = camera.sensor_width
-        h = w / pixel_aspect_ratio
-
-    led_center = camera_object.matrix_world.inverted() @ led_center
-    led_center.normalize()
-
-    phi = math.atan2(led_center.y, led_center.x)
-    l = min((led_center.x**2 + led_center.y**2) ** 0.5, 1.0)
-    theta = math.asin(l)
-
-    # Equisolid projection
-    r = 2.0 * f * math.sin(theta / 2.0)
-    u = r * math.cos(phi) / w + 0.5
-    v = r * math.sin(phi) / h + 0.5
+    if led_occlusion_tester is None and led_pixel_counter is None:
+        raise ValueError("❌ Either ray cast occlusion or pixel visibility must be enabled.")
+
+    arrow_matrices = np.array([np.array(arrow.matrix_world) for arrow in led_arrows])
+    camera_matrix_world = np.array(camera_object.matrix_world)
+    camera_location = camera_matrix_world[:3, 3]
+    intrinsics = get_camera_intrinsics(bpy.context.scene, camera)
+
+    centers = arrow_matrices[:, :3, 3]
+    projected_coordinates = project_points(centers, camera_matrix_world, intrinsics)
+
+    leds_state = {
+        "centers": centers,
+        "projected_coordinates": projected_coordinates,
+        "is_in_frame": are_points_in_frame(projected_coordinates),
+        "distance_from_camera": np.linalg.norm(camera_location - centers, axis=-1),
+        "led_relative_orientation": get_relative_orientations(
+            arrow_matrices, np.array((0, 0, 1)), camera_matrix_world
+        ),
+    }
+
+    if led_pixel_counter is not None:
+        visible_pixels, visibility_fraction = led_pixel_counter.get_visibility(
+            camera_matrix_world, intrinsics
+        )
+        leds_state["visible_pixels"] = visible_pixels
+        leds_state["visibility_fraction"] = visibility_fraction
+        leds_state["is_occluded"] = visible_pixels == 0
+
+    if led_occlusion_tester is not None:
+        # Build the occluding geometry of the frame once for all LED visibility queries
+        led_occlusion_tester.update()
+        leds_state["is_occluded"] = led_occlusion_tester.are_leds_occluded(
+            centers, camera_location
+        )
 
-    return Vector((u, v))
+    return leds_state
 
 
 def get_bounding_box(
-    leds: List[bpy.types.Object],
-    camera_object: bpy.types.Object,
-    camera: bpy.types.Camera,
-    armature_arm: bpy.types.Object,
+    leds_state: Dict[str, np.ndarray],
     padding: int,
+    is_visible: np.ndarray | None = None,
 ) -> Tuple[Vector, int, int]:
     """
-    Get the bounding box of the LEDs in the camera view.
+    Get the bounding box of the visible LEDs in the camera view.
 
     Args:
-        leds (List[bpy.types.Object]): The LED objects.
-        camera_object (bpy.types.Object): The camera object.
-        camera (bpy.types.Camera): The camera.
-        armature_arm (bpy.types.Object): The armature arm object.
+        leds_state (Dict[str, np.ndarray]): The state of the LEDs for the current frame.
         padding (int): The padding of the bounding box, in camera view coordinates.
-
-    Raises:
-        ValueError: If the camera type is not supported.
+        is_visible (np.ndarray | None, optional): Whether each LED is visible. Defaults to the LEDs in frame and not occluded.
 
     Returns:
         Vector: The center of the bounding box.
         int: The width of the bounding box.
         int: The height of the bounding box.
     """
-    projected_coordinates = []
-    for led in leds:
-        # Check if LED is visible
-        led_center = get_object_center(led)
-        if CAMERA_TYPE == "PERSP":
-            led_projected_coordinates = get_projected_coordinates_perspective(
-                led_center, camera_object
-            )
-        elif CAMERA_TYPE == "PANO":
-            led_projected_coordinates = get_projected_coordinates_panoramic(
-                led_center, camera, camera_object
-            )
-        else:
-            raise ValueError(f"❌ Camera type {CAMERA_TYPE} not supported.")
-
-        is_occluded = is_led_occluded(led, camera_object, leds, armature_arm)
-        is_in_frame = is_led_in_frame(led_projected_coordinates)
-
-        if is_occluded or not is_in_frame:
-            continue
-
-        projected_coordinates.append(led_projected_coordinates)
-
-    if len(projected_coordinates) == 0:
+    if is_visible is None:
+        is_visible = leds_state["is_in_frame"] & ~leds_state["is_occluded"]
+    if not np.any(is_visible):
         return None, None, None
+    projected_coordinates = leds_state["projected_coordinates"][is_visible]
 
     # Get bounding box
-    u_min = max(min([p.x for p in projected_coordinates]) - padding, 0)
-    u_max = min(max([p.x for p in projected_coordinates]) + padding, 1)
-    v_min = max(min([p.y for p in projected_coordinates]) - padding, 0)
-    v_max = min(max([p.y for p in projected_coordinates]) + padding, 1)
+    u_min = max(float(np.min(projected_coordinates[:, 0])) - padding, 0)
+    u_max = min(float(np.max(projected_coordinates[:, 0])) + padding, 1)
+    v_min = max(float(np.min(projected_coordinates[:, 1])) - padding, 0)
+    v_max = min(float(np.max(projected_coordinates[:, 1])) + padding, 1)
 
     center = Vector(((u_min + u_max) / 2, (v_min + v_max) / 2))
     width = u_max - u_min
@@ -472,45 +536,35 @@ def get_bounding_box(
 
 def get_frame_data(
     camera_object: bpy.types.Object,
-    camera: bpy.types.Camera,
     stylus: bpy.types.Object,
     leds: List[bpy.types.Object],
-    armature_suffix: str,
+    leds_state: Dict[str, np.ndarray],
 ) -> Dict[str, Any]:
     """
     Get the frame data.
 
     Args:
         camera_object (bpy.types.Object): The camera object.
-        camera (bpy.types.Camera): The camera.
         stylus (bpy.types.Object): The stylus.
         leds (List[bpy.types.Object]): The LED objects.
-        armature_suffix (str): The suffix of the armature.
-
-    Raises:
-        ValueError: If the armature arm is not found.
+        leds_state (Dict[str, np.ndarray]): The state of the LEDs for the current frame.
 
     Returns:
         Dict[str, Any]: The frame data.
     """
-    # Get armature arm
-    armature_arm = bpy.data.objects.get(f"Arm{armature_suffix}")
-    if armature_arm is None:
-        raise ValueError("❌ Armature arm not found.")
-
     # Get frame data
-    frame_data = {"seed": SEED}
+    frame_data = {"seed": get_seed()}
 
     # Get stylus orientation information
-    stylus_relative_orientation = get_object_relative_orientation(
-        stylus, Vector((1, 0, 0)), camera_object
-    )
-    frame_data["stylus_relative_orientation"] = stylus_relative_orientation
+    stylus_relative_orientation = get_relative_orientations(
+        np.array(stylus.matrix_world)[None],
+        np.array((1, 0, 0)),
+        np.array(camera_object.matrix_world),
+    )[0]
+    frame_data["stylus_relative_orientation"] = float(stylus_relative_orientation)
 
     # Get bouding box information
-    bb_center, bb_width, bb_height = get_bounding_box(
-        leds, camera_object, camera, armature_arm, BOUNDING_BOX_PADDING
-    )
+    bb_center, bb_width, bb_height = get_bounding_box(leds_state, BOUNDING_BOX_PADDING)
     if bb_center is None or bb_width is None or bb_height is None:
         frame_data["bounding_box"] = None
     else:
@@ -525,45 +579,150 @@ def get_frame_data(
 
     # Get LED information
     frame_data["leds"] = {}
-    for led in leds:
-        # Get camera and world coordinates
-        led_center = get_object_center(led)
-        if CAMERA_TYPE == "PERSP":
-            led_projected_coordinates = get_projected_coordinates_perspective(
-                led_center, camera_object
+    for i, led in enumerate(leds):
+        frame_data["leds"][led.name] = {
+            "u": float(leds_state["projected_coordinates"][i, 0]),
+            "v": float(leds_state["projected_coordinates"][i, 1]),
+            "x": float(leds_state["centers"][i, 0]),
+            "y": float(leds_state["centers"][i, 1]),
+            "z": float(leds_state["centers"][i, 2]),
+            "is_occluded": bool(leds_state["is_occluded"][i]),
+            "is_in_frame": bool(leds_state["is_in_frame"][i]),
+            "distance_from_camera": float(leds_state["distance_from_camera"][i]),
+            "led_relative_orientation": float(
+                leds_state["led_relative_orientation"][i]
+            ),
+        }
+        if "visible_pixels" in leds_state:
+            frame_data["leds"][led.name]["visible_pixels"] = int(
+                leds_state["visible_pixels"][i]
             )
-        elif CAMERA_TYPE == "PANO":
-            led_projected_coordinates = get_projected_coordinates_panoramic(
-                led_center, camera, camera_object
+            frame_data["leds"][led.name]["visibility_fraction"] = float(
+                leds_state["visibility_fraction"][i]
             )
-        else:
-            raise ValueError(f"❌ Camera type {CAMERA_TYPE} not supported.")
 
-        # Get location information
-        is_occluded = is_led_occluded(led, camera_object, leds, armature_arm)
-        is_in_frame = is_led_in_frame(led_projected_coordinates)
-        distance_from_camera = (camera_object.location - led_center).length
+    return frame_data
 
-        # Get orientation information
-        arrow_name = led.name.replace("LED", "Arrow")
-        arrow = bpy.data.objects.get(arrow_name)
-        if arrow is None:
-            raise ValueError(f"❌ Arrow {arrow_name} not found.")
-        led_relative_orientation = get_object_relative_orientation(
-            arrow, Vector((0, 0, 1)), camera_object
-        )
 
-        frame_data["leds"][led.name] = {
-            "u": led_projected_coordinates.x,
-            "v": led_projected_coordinates.y,
-            "x": led_center.x,
-            "y": led_center.y,
-            "z": led_center.z,
-            "is_occluded": is_occluded,
-            "is_in_frame": is_in_frame,
-            "distance_from_camera": distance_from_camera,
-            "led_relative_orientation": led_relative_orientation,
-        }
+def write_camera_export(
+    camera_export_writer: CameraExportWriter,
+    frame_index: int,
+    camera_object: bpy.types.Object,
+    camera: bpy.types.Camera,
+    stylus: bpy.types.Object,
+    leds: List[bpy.types.Object],
+    led_arrows: List[bpy.types.Object],
+) -> None:
+    """
+    Write the camera, stylus and LED matrices of the current frame to the camera export.
+
+    Args:
+        camera_export_writer (CameraExportWriter): The camera export writer.
+        frame_index (int): The frame index.
+        camera_object (bpy.types.Object): The camera object.
+        camera (bpy.types.Camera): The camera.
+        stylus (bpy.types.Object): The stylus object.
+        leds (List[bpy.types.Object]): The LED objects.
+        led_arrows (List[bpy.types.Object]): The arrow objects associated with the LEDs.
+
+    Raises:
+        ValueError: If the frame is out of the range of the run.
+    """
+    camera_export_writer.write(
+        frame_index,
+        np.array(camera_object.matrix_world),
+        get_camera_intrinsics(bpy.context.scene, camera),
+        np.array(stylus.matrix_world),
+        np.array([np.array(led.matrix_world) for led in leds]),
+        np.array([np.array(arrow.matrix_world) for arrow in led_arrows]),
+    )
+
+
+def render_no_bg_pass(
+    render_folder_path: str,
+    frame_index: int,
+    leds_state: Dict[str, np.ndarray],
+    memory_manager: MemoryManager,
+    frame_stores: Dict[str, FrameStore] | None,
+) -> None:
+    """
+    Render the no-bg pass of the current frame, only in the region of the in-frame LEDs if border rendering is enabled, and store its result.
+
+    Args:
+        render_folder_path (str): The folder path to render the frame to.
+        frame_index (int): The frame index.
+        leds_state (Dict[str, np.ndarray]): The state of the LEDs for the frame.
+        memory_manager (MemoryManager): The memory manager.
+        frame_stores (Dict[str, FrameStore] | None): The frame stores by pass name, or None if disabled.
+    """
+    border = None
+    if NO_BG_BORDER_RENDER:
+        border = get_no_bg_border(leds_state, NO_BG_BORDER_PADDING)
+
+    if NO_BG_BORDER_RENDER and border is None:
+        write_black_no_bg_frame(render_folder_path, frame_index)
+        if frame_stores is not None:
+            frame_stores["no-bg"].write_black(frame_index)
+    else:
+        with trace_span("no_bg_render", category="render"):
+            render_no_bg_frame(
+                render_folder_path,
+                memory_manager,
+                border,
+            )
+        if frame_stores is not None:
+            frame_stores["no-bg"].write(frame_index, get_viewer_pixels())
+
+
+def render_gated_frame(
+    render_folder_path: str,
+    frame_index: int,
+    gate_decision: str,
+    camera_object: bpy.types.Object,
+    stylus: bpy.types.Object,
+    leds: List[bpy.types.Object],
+    leds_state: Dict[str, np.ndarray],
+    memory_manager: MemoryManager,
+    frame_stores: Dict[str, FrameStore] | None,
+) -> Dict[str, Any]:
+    """
+    Render only the no-bg pass of a frame rejected by the visibility gate, or skip it, and get its frame data from the cheap annotation.
+
+    Args:
+        render_folder_path (str): The folder path to render the frame to.
+        frame_index (int): The frame index, already set.
+        gate_decision (str): The decision of the visibility gate, "no_bg_only" or "skip".
+        camera_object (bpy.types.Object): The camera object.
+        stylus (bpy.types.Object): The stylus object.
+        leds (List[bpy.types.Object]): The LED objects.
+        leds_state (Dict[str, np.ndarray]): The state of the LEDs for the frame, without the pixel visibility.
+        memory_manager (MemoryManager): The memory manager.
+        frame_stores (Dict[str, FrameStore] | None): The frame stores by pass name, or None if disabled.
+
+    Returns:
+        Dict[str, Any]: The frame data, with the gate decision.
+    """
+    frame_data = get_frame_data(camera_object, stylus, leds, leds_state)
+    frame_data["gate"] = gate_decision
+    if frame_stores is not None:
+        frame_stores["bg"].write_black(frame_index)
+
+    if gate_decision == GATE_SKIP:
+        if frame_stores is not None:
+            frame_stores["no-bg"].write_black(frame_index)
+        return frame_data
+
+    render_no_bg_pass(
+        render_folder_path, frame_index, leds_state, memory_manager, frame_stores
+    )
+    if ROI_CROP_SIZE is not None:
+        frame_data["crop"] = write_crops(
+            {"no-bg": get_rendered_image_file_paths(render_folder_path, frame_index)["no-bg"]},
+            render_folder_path,
+            frame_index,
+            frame_data["bounding_box"],
+            ROI_CROP_SIZE,
+        )
 
     return frame_data
 
@@ -575,9 +734,12 @@ def render_and_get_frame_data(
     camera: bpy.types.Camera,
     stylus: bpy.types.Object,
     leds: List[bpy.types.Object],
-    armature_suffix: str,
-    armature_arm: bpy.types.Object,
-    random_background_image_generator: RandomBackgroundImageGenerator,
+    led_arrows: List[bpy.types.Object],
+    led_occlusion_tester: LedOcclusionTester | None,
+    led_pixel_counter: LedPixelCounter | None,
+    memory_manager: MemoryManager,
+    frame_stores: Dict[str, FrameStore] | None,
+    leds_state: Dict[str, np.ndarray] | None = None,
 ) -> Dict[str, Any]:
     """
     Render a frame and get the camera projection coordinates of LED.
@@ -589,9 +751,12 @@ def render_and_get_frame_data(
         camera (bpy.types.Camera): The camera.
         stylus (bpy.types.Object): The stylus object.
         leds (List[bpy.types.Object]): The LED objects.
-        armature_suffix (str): The suffix of the armature.
-        armature_arm (bpy.types.Object): The armature arm object.
-        random_background_image_generator (RandomBackgroundImageGenerator): The random background image generator.
+        led_arrows (List[bpy.types.Object]): The arrow objects associated with the LEDs.
+        led_occlusion_tester (LedOcclusionTester | None): The LED occlusion tester, or None to skip the ray casts.
+        led_pixel_counter (LedPixelCounter | None): The LED pixel counter, or None to skip the pixel visibility.
+        memory_manager (MemoryManager): The memory manager.
+        frame_stores (Dict[str, FrameStore] | None): The frame stores by pass name, or None if disabled.
+        leds_state (Dict[str, np.ndarray] | None, optional): The state of the LEDs already computed for the frame, used if the pixel visibility is not needed. Defaults to None.
 
     Returns:
         Dict[str, Any]: The frame data.
@@ -600,53 +765,282 @@ def render_and_get_frame_data(
     bpy.context.scene.camera = camera_object
     bpy.context.scene.frame_set(frame_index)
 
-    # Center camera on device with a given probability
-    if frame_index == 1 and np.random.rand() < CENTER_CAMERA_ON_DEVICE_PROBABILITY:
-        print("➡️  Centering camera on device.")
-        device = bpy.data.objects.get(f"Stylus{armature_suffix}")
-        if device is None:
-            raise ValueError(f"❌ Device not found.")
-        # Get world coordinates of device
-        device_location = device.matrix_world.translation
-        # Add random variation
-        fixation_location = Vector(
-            (
-                device_location.x + np.random.uniform(-1, 1),
-                device_location.y + np.random.uniform(-1, 1),
-                device_location.z + np.random.uniform(-1, 1),
+    if SINGLE_PASS_RENDER:
+        with trace_span("single_pass_render", category="render"):
+            render_single_pass_frame(
+                render_folder_path,
+                memory_manager,
             )
+    else:
+        with trace_span("bg_render", category="render"):
+            render_bg_frame(
+                render_folder_path,
+                memory_manager,
+            )
+        if frame_stores is not None:
+            frame_stores["bg"].write(frame_index, get_viewer_pixels())
+
+    # The LED state is known before the no-bg pass, so that it only renders the LED region
+    with trace_span("annotation", category="render"):
+        if leds_state is None or led_pixel_counter is not None:
+            leds_state = get_leds_state(
+                camera_object,
+                camera,
+                led_arrows,
+                led_occlusion_tester,
+                led_pixel_counter,
+            )
+        frame_data = get_frame_data(
+            camera_object,
+            stylus,
+            leds,
+            leds_state,
         )
 
-        camera_location = camera_object.matrix_world.translation
-        fixation_direction = (fixation_location - camera_location).normalized()
-        rotation = fixation_direction.to_track_quat("-Z", "Y").to_euler()
+    if not SINGLE_PASS_RENDER:
+        render_no_bg_pass(
+            render_folder_path, frame_index, leds_state, memory_manager, frame_stores
+        )
 
-        camera_object.rotation_euler = rotation
-        bpy.context.view_layer.update()
+    # Crop the rendered images around the bounding box
+    if ROI_CROP_SIZE is not None:
+        frame_data["crop"] = write_crops(
+            get_rendered_image_file_paths(render_folder_path, frame_index),
+            render_folder_path,
+            frame_index,
+            frame_data["bounding_box"],
+            ROI_CROP_SIZE,
+        )
 
-    render_bg_frame(
-        render_folder_path,
-    )
+    return frame_data
 
-    render_no_bg_frame(
-        render_folder_path,
-        frame_index,
-        armature_suffix,
-        armature_arm,
-        random_background_image_generator,
-    )
 
-    frame_data = get_frame_data(
-        camera_object,
-        camera,
-        stylus,
-        leds,
-        armature_suffix,
-    )
+def link_duplicate_frame(
+    render_folder_path: str,
+    frame: int,
+    source_frame: int,
+    source_frame_data: Dict[str, Any],
+    frame_stores: Dict[str, FrameStore] | None,
+) -> Dict[str, Any] | None:
+    """
+    Hard link, or copy if links are not supported, the outputs of a frame with the same scene state instead of rendering the frame.
+
+    Args:
+        render_folder_path (str): The folder path the frames are rendered to.
+        frame (int): The frame index.
+        source_frame (int): The index of the frame with the same scene state.
+        source_frame_data (Dict[str, Any]): The frame data of the source frame.
+        frame_stores (Dict[str, FrameStore] | None): The frame stores by pass name, or None if disabled.
+
+    Raises:
+        ValueError: If an output node is not found.
+        ValueError: If the file format of an output node is not supported.
+
+    Returns:
+        Dict[str, Any] | None: The frame data, marked as a duplicate of the first rendered frame, or None if the outputs of the source frame were already packed.
+    """
+    source_file_paths = get_frame_file_paths(render_folder_path, source_frame, source_frame_data)
+    if get_node(bpy.context.scene.node_tree, IMAGE_OUTPUT_NODE_NAME).mute:
+        # The frame stores replace the rendered images
+        for pass_name in ["bg", "no-bg"]:
+            source_file_paths.pop(pass_name, None)
+    if not all(os.path.isfile(file_path) for file_path in source_file_paths.values()):
+        return None
+
+    frame_data = copy.deepcopy(source_frame_data)
+    frame_data["duplicate_of"] = source_frame_data.get("duplicate_of", source_frame)
+    file_paths = get_frame_file_paths(render_folder_path, frame, frame_data)
+    for key, source_file_path in source_file_paths.items():
+        if os.path.isfile(file_paths[key]):
+            os.remove(file_paths[key])
+        try:
+            os.link(source_file_path, file_paths[key])
+        except OSError:
+            shutil.copyfile(source_file_path, file_paths[key])
+
+    if frame_stores is not None:
+        for frame_store in frame_stores.values():
+            frame_store.copy(frame, source_frame)
 
     return frame_data
 
 
+def write_frame_outputs(
+    render_folder_path: str,
+    frame: int,
+    frame_data: Dict[str, Any],
+    annotation_writer: AnnotationWriter,
+    columnar_annotation_writer: ColumnarAnnotationWriter | None,
+    shard_writer: ShardWriter | None,
+) -> None:
+    """
+    Write the data and pack the files of a rendered frame, its annotation record last so that recorded frames have all their outputs.
+
+    Args:
+        render_folder_path (str): The folder path the frame was rendered to.
+        frame (int): The frame index.
+        frame_data (Dict[str, Any]): The frame data.
+        annotation_writer (AnnotationWriter): The annotation writer.
+        columnar_annotation_writer (ColumnarAnnotationWriter | None): The columnar annotation writer, or None if disabled.
+        shard_writer (ShardWriter | None): The shard writer, or None if disabled.
+    """
+    if columnar_annotation_writer is not None:
+        columnar_annotation_writer.write(frame, frame_data)
+    if shard_writer is not None:
+        shard_writer.write(
+            frame,
+            get_frame_file_paths(render_folder_path, frame, frame_data),
+            frame_data,
+        )
+
+    # Append frame data last, previous frames are never read back
+    annotation_writer.write(frame, frame_data)
+
+
+def render_animation(
+    render_folder_path: str,
+    frame_start: int,
+    frame_end: int,
+    memory_manager: MemoryManager,
+    no_bg_border: Tuple[float, float, float, float] | None,
+) -> None:
+    """
+    Render each pass of a frame range with a single animation render, keeping the render data between frames.
+
+    Args:
+        render_folder_path (str): The folder path to render the frames to.
+        frame_start (int): The first frame to render.
+        frame_end (int): The last frame to render.
+        memory_manager (MemoryManager): The memory manager.
+        no_bg_border (Tuple[float, float, float, float] | None): The region to render in the no-bg pass, or None for the whole frame.
+    """
+    scene = bpy.context.scene
+    old_frame_start, old_frame_end = scene.frame_start, scene.frame_end
+    old_file_path = scene.render.filepath
+    old_use_persistent_data = scene.render.use_persistent_data
+
+    # Animation renders always write the composite image, which the output nodes already write
+    animation_folder_path = os.path.join(render_folder_path, ANIMATION_FOLDER_NAME)
+    scene.frame_start, scene.frame_end = frame_start, frame_end
+    scene.render.filepath = os.path.join(os.path.abspath(animation_folder_path), "")
+    scene.render.use_persistent_data = True
+
+    if SINGLE_PASS_RENDER:
+        with trace_span("single_pass_render", category="render"):
+            render_single_pass_frame(render_folder_path, memory_manager, animation=True)
+    else:
+        with trace_span("bg_render", category="render"):
+            render_bg_frame(render_folder_path, memory_manager, animation=True)
+        with trace_span("no_bg_render", category="render"):
+            render_no_bg_frame(
+                render_folder_path, memory_manager, no_bg_border, animation=True
+            )
+
+    scene.frame_start, scene.frame_end = old_frame_start, old_frame_end
+    scene.render.filepath = old_file_path
+    scene.render.use_persistent_data = old_use_persistent_data
+    shutil.rmtree(animation_folder_path, ignore_errors=True)
+
+
+def render_animation_and_write_frame_data(
+    render_folder_path: str,
+    frames: List[int],
+    camera_object: bpy.types.Object,
+    camera: bpy.types.Camera,
+    stylus: bpy.types.Object,
+    leds: List[bpy.types.Object],
+    led_arrows: List[bpy.types.Object],
+    led_occlusion_tester: LedOcclusionTester | None,
+    memory_manager: MemoryManager,
+    annotation_writer: AnnotationWriter,
+    columnar_annotation_writer: ColumnarAnnotationWriter | None,
+    camera_export_writer: CameraExportWriter,
+    shard_writer: ShardWriter | None,
+) -> None:
+    """
+    Compute the data of all frames in a sweep over the timeline without rendering, render the frames with one animation render per pass, then write the data of each rendered frame.
+    Gestures and camera are keyframed before rendering, so the data of a frame does not depend on its render.
+
+    Args:
+        render_folder_path (str): The folder path to render the frames to.
+        frames (List[int]): The contiguous frames to render, in order.
+        camera_object (bpy.types.Object): The camera object.
+        camera (bpy.types.Camera): The camera.
+        stylus (bpy.types.Object): The stylus object.
+        leds (List[bpy.types.Object]): The LED objects.
+        led_arrows (List[bpy.types.Object]): The arrow objects associated with the LEDs.
+        led_occlusion_tester (LedOcclusionTester | None): The LED occlusion tester.
+        memory_manager (MemoryManager): The memory manager.
+        annotation_writer (AnnotationWriter): The annotation writer.
+        columnar_annotation_writer (ColumnarAnnotationWriter | None): The columnar annotation writer, or None if disabled.
+        camera_export_writer (CameraExportWriter): The camera export writer.
+        shard_writer (ShardWriter | None): The shard writer, or None if disabled.
+    """
+    bpy.context.scene.camera = camera_object
+
+    # Sweep over the timeline, the no-bg region covering the LEDs of all frames
+    frame_data_per_frame = {}
+    no_bg_borders = []
+    for frame in tqdm(frames, desc="🔄 Computing frame data..."):
+        with trace_span("annotation", category="render", frame=frame):
+            bpy.context.scene.frame_set(frame)
+            leds_state = get_leds_state(
+                camera_object, camera, led_arrows, led_occlusion_tester, None
+            )
+            frame_data_per_frame[frame] = get_frame_data(
+                camera_object, stylus, leds, leds_state
+            )
+            write_camera_export(
+                camera_export_writer,
+                frame,
+                camera_object,
+                camera,
+                stylus,
+                leds,
+                led_arrows,
+            )
+            if NO_BG_BORDER_RENDER and not SINGLE_PASS_RENDER:
+                no_bg_border = get_no_bg_border(leds_state, NO_BG_BORDER_PADDING)
+                if no_bg_border is not None:
+                    no_bg_borders.append(no_bg_border)
+
+    no_bg_border = None
+    if len(no_bg_borders) > 0:
+        no_bg_borders = np.array(no_bg_borders)
+        no_bg_border = (
+            float(np.min(no_bg_borders[:, 0])),
+            float(np.max(no_bg_borders[:, 1])),
+            float(np.min(no_bg_borders[:, 2])),
+            float(np.max(no_bg_borders[:, 3])),
+        )
+
+    print(f"⏳ Rendering frames {frames[0]} to {frames[-1]} as an animation...")
+    render_animation(
+        render_folder_path, frames[0], frames[-1], memory_manager, no_bg_border
+    )
+
+    # Join the frame data with the rendered frames
+    for frame in tqdm(frames, desc="🔄 Writing frame data..."):
+        with trace_span("json_write", category="render", frame=frame):
+            frame_data = frame_data_per_frame[frame]
+            if ROI_CROP_SIZE is not None:
+                frame_data["crop"] = write_crops(
+                    get_rendered_image_file_paths(render_folder_path, frame),
+                    render_folder_path,
+                    frame,
+                    frame_data["bounding_box"],
+                    ROI_CROP_SIZE,
+                )
+            write_frame_outputs(
+                render_folder_path,
+                frame,
+                frame_data,
+                annotation_writer,
+                columnar_annotation_writer,
+                shard_writer,
+            )
+
+
 def get_main_objects(
     armature_suffix: str,
 ) -> Tuple[
@@ -700,19 +1094,127 @@ def get_main_objects(
     return camera_object, camera, stylus, leds, armature_arm
 
 
+def get_frame_stores(
+    output_folder_path: str, frame_start: int, n_frames: int, resume: bool = False
+) -> Dict[str, FrameStore]:
+    """
+    Set up the viewer node and create the frame stores of the bg and no-bg passes, in the format of the image output node.
+    The image output node is muted when no other output reads its images, so that the frame stores replace them instead of adding to their encoding cost.
+    The viewer pixels are scene linear and only encoded with the sRGB transfer function, so the color management of the written images must add nothing else for the frame stores to match them.
+
+    Args:
+        output_folder_path (str): The folder path to write the frame stores to.
+        frame_start (int): The index of the first frame to store.
+        n_frames (int): The number of frames to store.
+        resume (bool, optional): Whether to keep the frames stored by an interrupted render. Defaults to False.
+
+    Raises:
+        ValueError: If single pass rendering is enabled.
+        ValueError: If the image output node is not found.
+        ValueError: If the image output node has no input.
+        ValueError: If the written images are not encoded with the standard sRGB view transform, without exposure, gamma or look.
+
+    Returns:
+        Dict[str, FrameStore]: The frame stores, by pass name.
+    """
+    if SINGLE_PASS_RENDER:
+        raise ValueError("❌ The frame store cannot be used with single pass rendering.")
+
+    setup_frame_store_viewer()
+    scene = bpy.context.scene
+    image_output_node = get_node(scene.node_tree, IMAGE_OUTPUT_NODE_NAME)
+
+    # The image output node either follows the scene color management or overrides it
+    view_settings, display_settings = scene.view_settings, scene.display_settings
+    if image_output_node.format.color_management == "OVERRIDE":
+        view_settings = image_output_node.format.view_settings
+        display_settings = image_output_node.format.display_settings
+    if (
+        display_settings.display_device != "sRGB"
+        or view_settings.view_transform != "Standard"
+        or view_settings.look != "None"
+        or view_settings.exposure != 0
+        or view_settings.gamma != 1
+    ):
+        raise ValueError(
+            f"❌ The frame store requires the Standard view transform on an sRGB display, without exposure, gamma or look, got {view_settings.view_transform} on {display_settings.display_device} with look {view_settings.look}, exposure {view_settings.exposure} and gamma {view_settings.gamma}."
+        )
+
+    # Sharded output and crops read the images, which are only written for them
+    image_output_node.mute = not SHARDED_OUTPUT and ROI_CROP_SIZE is None
+    if image_output_node.mute:
+        print("➡️  Muting the image output, the frame stores replace the bg and no-bg images.")
+    resolution_scale = scene.render.resolution_percentage / 100
+
+    return {
+        pass_name: FrameStore(
+            file_path=os.path.join(
+                output_folder_path, FRAME_STORE_FOLDER_NAME, f"{pass_name}.npy"
+            ),
+            frame_start=frame_start,
+            n_frames=n_frames,
+            height=int(scene.render.resolution_y * resolution_scale),
+            width=int(scene.render.resolution_x * resolution_scale),
+            n_channels={"BW": 1, "RGB": 3, "RGBA": 4}[image_output_node.format.color_mode],
+            color_depth=image_output_node.format.color_depth,
+            resume=resume,
+        )
+        for pass_name in ["bg", "no-bg"]
+    }
+
+
+def center_camera_on_device(armature_suffix: str) -> None:
+    """
+    Center the camera on the device at the first frame with a given probability.
+    This is done once before rendering, so that every frame range of the scene is rendered from the same camera.
+
+    Args:
+        armature_suffix (str): The suffix of the armature.
+
+    Raises:
+        ValueError: If the camera object is not found.
+        ValueError: If the device is not found.
+    """
+    camera_object = bpy.data.objects.get(CAMERA_NAME)
+    if camera_object is None:
+        raise ValueError("❌ Camera object not found.")
+    bpy.context.scene.frame_set(bpy.context.scene.frame_start)
+
+    # Center camera on device with a given probability
+    if np.random.rand() < CENTER_CAMERA_ON_DEVICE_PROBABILITY:
+        print("➡️  Centering camera on device.")
+        device = bpy.data.objects.get(f"Stylus{armature_suffix}")
+        if device is None:
+            raise ValueError(f"❌ Device not found.")
+        # Get world coordinates of device
+        device_location = device.matrix_world.translation
+        # Add random variation
+        fixation_location = Vector(
+            (
+                device_location.x + np.random.uniform(-1, 1),
+                device_location.y + np.random.uniform(-1, 1),
+                device_location.z + np.random.uniform(-1, 1),
+            )
+        )
+
+        camera_location = camera_object.matrix_world.translation
+        fixation_direction = (fixation_location - camera_location).normalized()
+        rotation = fixation_direction.to_track_quat("-Z", "Y").to_euler()
+
+        camera_object.rotation_euler = rotation
+        bpy.context.view_layer.update()
+
+
 def get_render_subfolder() -> str:
     """
-    Get the render subfolder path, and create it.
+    Get the render subfolder path of a new run, named by the run ID, and atomically create it.
 
     Returns:
         str: The render subfolder path.
     """
-    render_folder_path = RENDER_FOLDER_PATH
-    render_subfolder_path = 1
-    while os.path.exists(os.path.join(render_folder_path, str(render_subfolder_path))):
-        render_subfolder_path += 1
-    render_folder_path = os.path.join(render_folder_path, str(render_subfolder_path))
-    os.makedirs(render_folder_path, exist_ok=True)
+    render_folder_path = allocate_render_folder(
+        RENDER_FOLDER_PATH, get_seed(), RENDER_FOLDER_SHARD_LEVELS
+    )
     print(f"➡️  Rendering to {os.path.abspath(render_folder_path)}.")
 
     return render_folder_path
@@ -720,18 +1222,35 @@ def get_render_subfolder() -> str:
 
 def render(
     armature_suffix: str,
-    random_background_image_generator: RandomBackgroundImageGenerator,
+    render_folder_path: str | None = None,
+    frame_range: Tuple[int, int] | None = None,
+    resume: bool = False,
 ) -> None:
     """
     Render the animation and collect and write frame data.
-    
+    When a frame range is given, only these frames are rendered, and the run files are written to the part folder of the range, to be merged once all parts are rendered.
+    When resuming, the frames whose outputs were all written by an interrupted render are kept, and only the missing ones are rendered.
+
     Args:
         armature_suffix (str): The suffix of the armature.
-        random_background_image_generator (RandomBackgroundImageGenerator): The random background image generator.
+        render_folder_path (str | None, optional): The folder path to render to. Defaults to a new render subfolder.
+        frame_range (Tuple[int, int] | None, optional): The first and last frames to render. Defaults to the scene frame range.
+        resume (bool, optional): Whether to resume an interrupted render of the same scene in the render folder. Defaults to False.
 
     Raises:
         ValueError: If the camera is not found.
         ValueError: If the stylus is not found.
+        ValueError: If the inner stylus is not found.
+        ValueError: If the background collection is not in the view layer.
+        ValueError: If the background image node is not found.
+        ValueError: If the scale node is not found.
+        ValueError: If the animation render is used with pixel visibility, the frame store or the visibility gate.
+        ValueError: If frame deduplication is used with sharded output or the animation render.
+        ValueError: If pixel visibility is used with the frame store.
+        ValueError: If the visibility gate is used without ray cast occlusion or with single pass rendering.
+        ValueError: If another material already has the LED material pass index, with single pass rendering.
+        ValueError: If the frame store is used without the Standard view transform, or with exposure, gamma or a look.
+        ValueError: If the armature is not found.
     """
     # Get objects
     camera_object, camera, stylus, leds, armature_arm = get_main_objects(
@@ -739,31 +1258,258 @@ def render(
     )
 
     # Get render folder path
-    render_folder_path = get_render_subfolder()
+    if render_folder_path is None:
+        render_folder_path = get_render_subfolder()
+    if frame_range is None:
+        frame_start, frame_end = bpy.context.scene.frame_start, bpy.context.scene.frame_end
+        output_folder_path = render_folder_path
+    else:
+        frame_start, frame_end = frame_range
+        output_folder_path = get_part_folder_path(render_folder_path, frame_range)
+        os.makedirs(output_folder_path, exist_ok=True)
+    n_frames = frame_end - frame_start + 1
+    if ANIMATION_RENDER and (PIXEL_VISIBILITY or FRAME_STORE or VISIBILITY_GATE):
+        raise ValueError(
+            "❌ The animation render cannot be used with pixel visibility, the frame store or the visibility gate."
+        )
+    if DEDUPLICATE_FRAMES and SHARDED_OUTPUT:
+        raise ValueError(
+            "❌ Frame deduplication cannot be used with sharded output, as the outputs of the previous frame are already packed."
+        )
+    if DEDUPLICATE_FRAMES and ANIMATION_RENDER:
+        raise ValueError(
+            "❌ Frame deduplication cannot be used with the animation render, which renders every frame in one sweep."
+        )
+    if PIXEL_VISIBILITY and FRAME_STORE:
+        raise ValueError(
+            "❌ Pixel visibility and the frame store cannot be used together, as both read the single viewer image."
+        )
+    if VISIBILITY_GATE and (not RAY_CAST_OCCLUSION or SINGLE_PASS_RENDER):
+        raise ValueError(
+            "❌ The visibility gate requires ray cast occlusion and two pass rendering."
+        )
 
-    output_file_path = os.path.join(render_folder_path, "data.json")
-    for frame in tqdm(
-        range(bpy.context.scene.frame_start, bpy.context.scene.frame_end + 1),
-        desc="🔄 Rendering frames...",
-    ):
-        frame_data = render_and_get_frame_data(
-            render_folder_path,
-            frame,
-            camera_object,
-            camera,
-            stylus,
-            leds,
-            armature_suffix,
-            armature_arm,
-            random_background_image_generator,
+    led_arrows = get_led_arrows(leds)
+    led_occlusion_tester = None
+    if RAY_CAST_OCCLUSION:
+        led_occlusion_tester = LedOcclusionTester(leds, armature_arm)
+    led_pixel_counter = None
+    if PIXEL_VISIBILITY:
+        led_pixel_counter = LedPixelCounter(leds)
+    led_material_pass_indices = {}
+    if SINGLE_PASS_RENDER:
+        led_material_pass_indices = setup_single_pass_compositor(leds)
+    else:
+        inner_stylus = bpy.data.objects.get(f"Inner{armature_suffix}")
+        if inner_stylus is None:
+            raise ValueError("❌ Inner stylus not found.")
+        setup_no_bg_view_layer(bpy.context.scene, [armature_arm, inner_stylus])
+        setup_background_switch(
+            get_node(bpy.context.scene.node_tree, BACKGROUND_IMAGE_NODE_NAME)
+        )
+    memory_manager = MemoryManager(
+        rss_growth_watermark_mb=MEMORY_RSS_GROWTH_WATERMARK_MB,
+        datablocks_growth_watermark=MEMORY_DATABLOCKS_GROWTH_WATERMARK,
+        trend_window=MEMORY_TREND_WINDOW,
+        trend_threshold_mb=MEMORY_TREND_THRESHOLD_MB,
+    )
+
+    annotation_writer = AnnotationWriter(
+        file_path=os.path.join(output_folder_path, ANNOTATION_FILE_NAME),
+        index_file_path=os.path.join(output_folder_path, ANNOTATION_INDEX_FILE_NAME),
+        fsync_interval=ANNOTATION_FSYNC_INTERVAL,
+        resume=resume,
+    )
+    columnar_annotation_writer = None
+    if COLUMNAR_ANNOTATIONS:
+        columnar_annotation_writer = ColumnarAnnotationWriter(
+            folder_path=os.path.join(output_folder_path, COLUMNAR_ANNOTATION_FOLDER_NAME),
+            led_names=[led.name for led in leds],
+            frame_start=frame_start,
+            n_frames=n_frames,
+            resume=resume,
+        )
+    camera_export_writer = CameraExportWriter(
+        folder_path=os.path.join(output_folder_path, CAMERA_EXPORT_FOLDER_NAME),
+        led_names=[led.name for led in leds],
+        frame_start=frame_start,
+        n_frames=n_frames,
+        resume=resume,
+    )
+    frame_stores = None
+    if FRAME_STORE:
+        frame_stores = get_frame_stores(output_folder_path, frame_start, n_frames, resume)
+    shard_writer = None
+    if SHARDED_OUTPUT:
+        shard_writer = ShardWriter(
+            folder_path=os.path.join(output_folder_path, SHARD_FOLDER_NAME),
+            max_shard_size=SHARD_MAX_SIZE_MB * 2**20,
+            resume=resume,
         )
 
-        # Read JSON file, update data, and write it back
-        if os.path.exists(output_file_path):
-            with open(output_file_path, "r") as f:
-                data = json.load(f)
-        else:
-            data = {}
-        data[frame] = frame_data
-        with open(output_file_path, "w") as f:
-            json.dump(data, f, indent=4)
+    # The annotation record of a frame is written last, so recorded frames have all their outputs
+    completed_frames = set()
+    if resume:
+        completed_frames = annotation_writer.get_frames()
+        if shard_writer is not None:
+            completed_frames &= set(shard_writer.get_frames())
+            annotation_writer.keep_frames(completed_frames)
+            # Records after the first lost frame are truncated too, so those frames are rendered again
+            completed_frames = set(annotation_writer.get_frames())
+        print(f"♻️  Resuming render, {len(completed_frames)} of {n_frames} frames already rendered.")
+
+    frames = [
+        frame for frame in range(frame_start, frame_end + 1) if frame not in completed_frames
+    ]
+    scene_state_hasher = None
+    if DEDUPLICATE_FRAMES:
+        armature = bpy.data.objects.get(f"{ARMATURE_NAME}{armature_suffix}")
+        if armature is None:
+            raise ValueError("❌ Armature not found.")
+        scene_state_hasher = SceneStateHasher(
+            armature, camera_object, camera, DEDUPLICATE_FRAMES_TOLERANCE
+        )
+    n_duplicate_frames = 0
+    visibility_gate = None
+    if VISIBILITY_GATE:
+        visibility_gate = VisibilityGate(
+            min_visible_leds=GATE_MIN_VISIBLE_LEDS,
+            max_distance=GATE_MAX_DISTANCE,
+            fallback_decision=GATE_FALLBACK_DECISION,
+        )
+    with annotation_writer:
+        if ANIMATION_RENDER and len(frames) > 0:
+            render_animation_and_write_frame_data(
+                render_folder_path,
+                frames,
+                camera_object,
+                camera,
+                stylus,
+                leds,
+                led_arrows,
+                led_occlusion_tester,
+                memory_manager,
+                annotation_writer,
+                columnar_annotation_writer,
+                camera_export_writer,
+                shard_writer,
+            )
+            frames = []
+
+        previous_frame, previous_frame_data, previous_scene_state_hash = None, None, None
+        for frame in tqdm(frames, desc="🔄 Rendering frames..."):
+            refresh_render_lock(render_folder_path)
+            with trace_span("frame", category="render", frame=frame):
+                # Link the outputs of the previous frame if the scene state did not change
+                frame_data, scene_state_hash, first_state_frame = None, None, None
+                if scene_state_hasher is not None:
+                    bpy.context.scene.camera = camera_object
+                    bpy.context.scene.frame_set(frame)
+                    scene_state_hash = scene_state_hasher.get_hash()
+
+                    # Frames after a frame rendered elsewhere are rendered, but marked as a sequential render would
+                    if previous_frame != frame - 1:
+                        first_state_frame = scene_state_hasher.get_first_frame_of_state(
+                            frame, bpy.context.scene.frame_start
+                        )
+                    elif scene_state_hash == previous_scene_state_hash:
+                        frame_data = link_duplicate_frame(
+                            render_folder_path,
+                            frame,
+                            previous_frame,
+                            previous_frame_data,
+                            frame_stores,
+                        )
+                if frame_data is not None:
+                    n_duplicate_frames += 1
+
+                # Only render the frames with usable LEDs according to the cheap annotation
+                leds_state = None
+                if frame_data is None and visibility_gate is not None:
+                    bpy.context.scene.camera = camera_object
+                    bpy.context.scene.frame_set(frame)
+                    with trace_span("gate", category="render"):
+                        leds_state = get_leds_state(
+                            camera_object, camera, led_arrows, led_occlusion_tester, None
+                        )
+                        gate_decision = visibility_gate.decide(leds_state)
+                    if gate_decision != GATE_RENDER:
+                        frame_data = render_gated_frame(
+                            render_folder_path,
+                            frame,
+                            gate_decision,
+                            camera_object,
+                            stylus,
+                            leds,
+                            leds_state,
+                            memory_manager,
+                            frame_stores,
+                        )
+
+                if frame_data is None:
+                    frame_data = render_and_get_frame_data(
+                        render_folder_path,
+                        frame,
+                        camera_object,
+                        camera,
+                        stylus,
+                        leds,
+                        led_arrows,
+                        led_occlusion_tester,
+                        led_pixel_counter,
+                        memory_manager,
+                        frame_stores,
+                        leds_state,
+                    )
+                    if visibility_gate is not None:
+                        frame_data["gate"] = GATE_RENDER
+                if first_state_frame is not None and first_state_frame < frame:
+                    frame_data["duplicate_of"] = first_state_frame
+                previous_frame, previous_frame_data = frame, frame_data
+                previous_scene_state_hash = scene_state_hash
+
+                with trace_span("json_write", category="render"):
+                    write_camera_export(
+                        camera_export_writer,
+                        frame,
+                        camera_object,
+                        camera,
+                        stylus,
+                        leds,
+                        led_arrows,
+                    )
+                    write_frame_outputs(
+                        render_folder_path,
+                        frame,
+                        frame_data,
+                        annotation_writer,
+                        columnar_annotation_writer,
+                        shard_writer,
+                    )
+
+    if columnar_annotation_writer is not None:
+        columnar_annotation_writer.close()
+    camera_export_writer.close()
+    if shard_writer is not None:
+        shard_writer.close()
+    if frame_stores is not None:
+        for frame_store in frame_stores.values():
+            frame_store.close()
+        get_node(bpy.context.scene.node_tree, IMAGE_OUTPUT_NODE_NAME).mute = False
+    restore_material_pass_indices(led_material_pass_indices)
+    if led_pixel_counter is not None:
+        led_pixel_counter.restore_pass_indices()
+
+    print(f"➡️  Purged memory {memory_manager.n_purges} times.")
+    if scene_state_hasher is not None:
+        print(f"➡️  Linked {n_duplicate_frames} frames with an unchanged scene state.")
+    if visibility_gate is not None:
+        write_gate_stats(
+            (
+                frame_data
+                for _, frame_data in AnnotationReader(
+                    os.path.join(output_folder_path, ANNOTATION_FILE_NAME)
+                )
+            ),
+            os.path.join(output_folder_path, GATE_STATS_FILE_NAME),
+        )
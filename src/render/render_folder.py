@@ -0,0 +1,107 @@
+# This file contains functions to allocate the render folders of runs, with a constant cost whatever the number of runs and without collision between concurrent runs.
+
+import os
+import zlib
+import socket
+from typing import List
+
+
+def get_host_name() -> str:
+    """
+    Get the short name of the host, usable in a file name.
+
+    Returns:
+        str: The host name.
+    """
+    return socket.gethostname().split(".")[0].replace(os.sep, "_") or "host"
+
+
+def get_run_id(seed: int) -> str:
+    """
+    Get the ID of a run, unique among concurrent runs of all hosts.
+
+    Args:
+        seed (int): The random seed of the run.
+
+    Returns:
+        str: The run ID.
+    """
+    return f"{seed:010d}-{get_host_name()}-{os.getpid()}"
+
+
+def get_shard_folder_path(root_folder_path: str, run_id: str, n_shard_levels: int) -> str:
+    """
+    Get the shard folder of a run, each level being named by two hexadecimal digits of the hash of the run ID.
+
+    Args:
+        root_folder_path (str): The folder containing the render folders of the runs.
+        run_id (str): The run ID.
+        n_shard_levels (int): The number of shard folder levels, 0 for a flat layout.
+
+    Returns:
+        str: The shard folder path.
+    """
+    run_hash = f"{zlib.crc32(run_id.encode('utf-8')):08x}"
+    return os.path.join(
+        root_folder_path, *[run_hash[2 * i : 2 * i + 2] for i in range(n_shard_levels)]
+    )
+
+
+def allocate_render_folder(
+    root_folder_path: str, seed: int, n_shard_levels: int = 0
+) -> str:
+    """
+    Atomically create the render folder of a new run, with a suffix in the unlikely case that its ID is already taken.
+
+    Args:
+        root_folder_path (str): The folder containing the render folders of the runs.
+        seed (int): The random seed of the run.
+        n_shard_levels (int, optional): The number of shard folder levels, 0 for a flat layout. Defaults to 0.
+
+    Raises:
+        ValueError: If the number of shard levels is not between 0 and 4.
+
+    Returns:
+        str: The render folder path.
+    """
+    if n_shard_levels < 0 or n_shard_levels > 4:
+        raise ValueError("❌ The number of shard levels must be between 0 and 4.")
+
+    run_id = get_run_id(seed)
+    shard_folder_path = get_shard_folder_path(root_folder_path, run_id, n_shard_levels)
+    os.makedirs(shard_folder_path, exist_ok=True)
+
+    # mkdir fails if the folder exists, so that no two runs can get the same folder
+    render_folder_path = os.path.join(shard_folder_path, run_id)
+    n_attempts = 0
+    while True:
+        try:
+            os.mkdir(render_folder_path)
+            return render_folder_path
+        except FileExistsError:
+            n_attempts += 1
+            render_folder_path = os.path.join(shard_folder_path, f"{run_id}-{n_attempts}")
+
+
+def get_render_folder_paths(root_folder_path: str, n_shard_levels: int = 0) -> List[str]:
+    """
+    Get the render folders of all runs, walking the shard folders.
+
+    Args:
+        root_folder_path (str): The folder containing the render folders of the runs.
+        n_shard_levels (int, optional): The number of shard folder levels, 0 for a flat layout. Defaults to 0.
+
+    Returns:
+        List[str]: The render folder paths.
+    """
+    folder_paths = [root_folder_path]
+    for _ in range(n_shard_levels + 1):
+        folder_paths = [
+            entry.path
+            for folder_path in folder_paths
+            if os.path.isdir(folder_path)
+            for entry in os.scandir(folder_path)
+            if entry.is_dir()
+        ]
+
+    return folder_paths
@@ -0,0 +1,287 @@
+# This file contains the named render profiles, trading render quality for speed, and a tool to compare them against the production profile.
+
+import os
+
+# EXR decoding is disabled by default in OpenCV, and is only checked on first use
+os.environ.setdefault("OPENCV_IO_ENABLE_OPENEXR", "1")
+
+import cv2
+import bpy
+import json
+import time
+import numpy as np
+from tqdm import tqdm
+from typing import Any, Dict, List
+
+from render.memory_manager import MemoryManager
+from render.render import (
+    set_bg_output_folder,
+    get_rendered_image_file_paths,
+    get_main_objects,
+)
+from config.config import (
+    MEMORY_RSS_GROWTH_WATERMARK_MB,
+    MEMORY_DATABLOCKS_GROWTH_WATERMARK,
+    MEMORY_TREND_WINDOW,
+    MEMORY_TREND_THRESHOLD_MB,
+    PROFILE_COMPARISON_FILE_NAME,
+)
+
+REFERENCE_RENDER_PROFILE = "production"
+N_CPUS = os.cpu_count() or 1
+# The thread counts are overridden by --threads, applied after the profile
+RENDER_PROFILES: Dict[str, Dict[str, Any]] = {
+    "preview": {
+        "engine": "CYCLES",
+        "samples": 16,
+        "use_adaptive_sampling": True,
+        "adaptive_threshold": 0.1,
+        "use_denoising": True,
+        "denoiser": "OPENIMAGEDENOISE",
+        "max_bounces": 4,
+        "diffuse_bounces": 2,
+        "glossy_bounces": 2,
+        "transmission_bounces": 2,
+        "volume_bounces": 0,
+        "transparent_max_bounces": 4,
+        "use_persistent_data": True,
+        "threads": min(4, N_CPUS),
+    },
+    "production": {
+        "engine": "CYCLES",
+        "samples": 256,
+        "use_adaptive_sampling": True,
+        "adaptive_threshold": 0.01,
+        "use_denoising": True,
+        "denoiser": "OPENIMAGEDENOISE",
+        "max_bounces": 12,
+        "diffuse_bounces": 4,
+        "glossy_bounces": 4,
+        "transmission_bounces": 12,
+        "volume_bounces": 0,
+        "transparent_max_bounces": 8,
+        "use_persistent_data": False,
+        "threads": N_CPUS,
+    },
+    # The IR camera mostly sees the emissive LEDs, so light bounces matter little
+    "ir-fast": {
+        "engine": "CYCLES",
+        "samples": 32,
+        "use_adaptive_sampling": True,
+        "adaptive_threshold": 0.05,
+        "use_denoising": True,
+        "denoiser": "OPENIMAGEDENOISE",
+        "max_bounces": 2,
+        "diffuse_bounces": 1,
+        "glossy_bounces": 1,
+        "transmission_bounces": 0,
+        "volume_bounces": 0,
+        "transparent_max_bounces": 2,
+        "use_persistent_data": True,
+        "threads": N_CPUS,
+    },
+}
+CYCLES_SETTINGS = [
+    "samples",
+    "use_adaptive_sampling",
+    "adaptive_threshold",
+    "use_denoising",
+    "denoiser",
+    "max_bounces",
+    "diffuse_bounces",
+    "glossy_bounces",
+    "transmission_bounces",
+    "volume_bounces",
+    "transparent_max_bounces",
+]
+
+
+def apply_render_profile(scene: bpy.types.Scene, profile_name: str) -> None:
+    """
+    Apply the render settings of a named profile to a scene.
+
+    Args:
+        scene (bpy.types.Scene): The scene.
+        profile_name (str): The name of the profile.
+
+    Raises:
+        ValueError: If the profile is not found.
+    """
+    if profile_name not in RENDER_PROFILES:
+        raise ValueError(
+            f"❌ Render profile {profile_name} not found, expected one of {', '.join(RENDER_PROFILES)}."
+        )
+    profile = RENDER_PROFILES[profile_name]
+
+    scene.render.engine = profile["engine"]
+    for setting in CYCLES_SETTINGS:
+        setattr(scene.cycles, setting, profile[setting])
+    scene.render.use_persistent_data = profile["use_persistent_data"]
+    scene.render.threads_mode = "FIXED"
+    scene.render.threads = profile["threads"]
+    print(f"➡️  Using render profile {profile_name}.")
+
+
+def get_image_difference(image: np.ndarray, reference_image: np.ndarray) -> Dict[str, float]:
+    """
+    Get the difference between an image and its reference, both normalized to [0, 1].
+
+    Args:
+        image (np.ndarray): The image.
+        reference_image (np.ndarray): The reference image.
+
+    Raises:
+        ValueError: If the images do not have the same shape.
+
+    Returns:
+        Dict[str, float]: The mean absolute error and the mean squared error.
+    """
+    if image.shape != reference_image.shape:
+        raise ValueError(
+            f"❌ Image of shape {image.shape} does not match the reference of shape {reference_image.shape}."
+        )
+
+    max_value = np.iinfo(image.dtype).max if np.issubdtype(image.dtype, np.integer) else 1.0
+    image = image.astype(np.float64) / max_value
+    reference_image = reference_image.astype(np.float64) / max_value
+
+    return {
+        "mean_absolute_error": float(np.mean(np.abs(image - reference_image))),
+        "mean_squared_error": float(np.mean((image - reference_image) ** 2)),
+    }
+
+
+def get_psnr(mean_squared_error: float) -> float | None:
+    """
+    Get the PSNR of images normalized to [0, 1] from their mean squared error.
+
+    Args:
+        mean_squared_error (float): The mean squared error.
+
+    Returns:
+        float | None: The PSNR, in dB, or None for identical images, whose PSNR is infinite and cannot be written to JSON.
+    """
+    if mean_squared_error == 0:
+        return None
+
+    return float(-10 * np.log10(mean_squared_error))
+
+
+def render_timed_bg_frame(
+    render_folder_path: str, frame: int, memory_manager: MemoryManager
+) -> float:
+    """
+    Render the bg pass of a frame, timing only the render itself.
+
+    Args:
+        render_folder_path (str): The folder path to render the frame to.
+        frame (int): The frame index.
+        memory_manager (MemoryManager): The memory manager.
+
+    Returns:
+        float: The render time, in seconds.
+    """
+    bpy.context.scene.frame_set(frame)
+    set_bg_output_folder(render_folder_path)
+    start_time = time.perf_counter()
+    bpy.ops.render.render(animation=False, write_still=False)
+    render_time = time.perf_counter() - start_time
+
+    # Purges are left out of the render time
+    memory_manager.step()
+
+    return render_time
+
+
+def compare_render_profiles(
+    armature_suffix: str,
+    output_folder_path: str,
+    frames: List[int],
+    profile_names: List[str] | None = None,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Render the bg pass of the same frames of the current scene with each profile, and compare their time per frame and images against the production profile.
+    Each profile first renders an untimed warm-up frame, so that the scene sync and BVH build, kept by persistent data, are not timed.
+
+    Args:
+        armature_suffix (str): The suffix of the armature.
+        output_folder_path (str): The folder to render the profiles to, one subfolder per profile.
+        frames (List[int]): The frames to render.
+        profile_names (List[str] | None, optional): The profiles to compare. Defaults to all profiles.
+
+    Raises:
+        ValueError: If no frame is given.
+        ValueError: If the camera, stylus, LEDs or armature arm are not found.
+        ValueError: If a profile is not found.
+
+    Returns:
+        Dict[str, Dict[str, float]]: The mean time per frame, in seconds, the mean absolute and squared errors against the production profile, and the PSNR of the mean squared error, None for identical images, by profile name.
+    """
+    if len(frames) == 0:
+        raise ValueError("❌ At least one frame must be given.")
+    if profile_names is None:
+        profile_names = list(RENDER_PROFILES)
+
+    # The reference is rendered first, so that the other profiles are compared to it
+    profile_names = [REFERENCE_RENDER_PROFILE] + [
+        profile_name for profile_name in profile_names if profile_name != REFERENCE_RENDER_PROFILE
+    ]
+    camera_object, _, _, _, _ = get_main_objects(armature_suffix)
+    scene = bpy.context.scene
+    scene.camera = camera_object
+    memory_manager = MemoryManager(
+        rss_growth_watermark_mb=MEMORY_RSS_GROWTH_WATERMARK_MB,
+        datablocks_growth_watermark=MEMORY_DATABLOCKS_GROWTH_WATERMARK,
+        trend_window=MEMORY_TREND_WINDOW,
+        trend_threshold_mb=MEMORY_TREND_THRESHOLD_MB,
+    )
+
+    comparison = {}
+    for profile_name in profile_names:
+        apply_render_profile(scene, profile_name)
+        profile_folder_path = os.path.join(output_folder_path, profile_name)
+        render_timed_bg_frame(profile_folder_path, frames[0], memory_manager)
+
+        render_times = []
+        differences = []
+        for frame in tqdm(frames, desc=f"🔄 Rendering with profile {profile_name}..."):
+            render_times.append(
+                render_timed_bg_frame(profile_folder_path, frame, memory_manager)
+            )
+
+            image = cv2.imread(
+                get_rendered_image_file_paths(profile_folder_path, frame)["bg"],
+                cv2.IMREAD_UNCHANGED,
+            )
+            reference_image = cv2.imread(
+                get_rendered_image_file_paths(
+                    os.path.join(output_folder_path, REFERENCE_RENDER_PROFILE), frame
+                )["bg"],
+                cv2.IMREAD_UNCHANGED,
+            )
+            differences.append(get_image_difference(image, reference_image))
+
+        # The squared errors are averaged before the PSNR, which is undefined for identical frames
+        mean_squared_error = float(
+            np.mean([difference["mean_squared_error"] for difference in differences])
+        )
+        comparison[profile_name] = {
+            "time_per_frame": float(np.mean(render_times)),
+            "mean_absolute_error": float(
+                np.mean([difference["mean_absolute_error"] for difference in differences])
+            ),
+            "mean_squared_error": mean_squared_error,
+            "psnr": get_psnr(mean_squared_error),
+        }
+
+    for profile_name, profile_comparison in comparison.items():
+        psnr = profile_comparison["psnr"]
+        print(
+            f"➡️  Profile {profile_name}: {profile_comparison['time_per_frame']:.2f} s per frame, "
+            f"MAE {profile_comparison['mean_absolute_error']:.4f}, "
+            f"PSNR {'identical' if psnr is None else f'{psnr:.1f} dB'} against {REFERENCE_RENDER_PROFILE}."
+        )
+    with open(os.path.join(output_folder_path, PROFILE_COMPARISON_FILE_NAME), "w") as f:
+        json.dump({"frames": frames, "profiles": comparison}, f, allow_nan=False)
+
+    return comparison
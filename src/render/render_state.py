@@ -0,0 +1,294 @@
+# This file contains functions to record the state of a run in its render folder, so that a partially rendered run can be resumed.
+
+import os
+import json
+import time
+import shutil
+from typing import Any, Dict, List, Tuple
+
+from render.render_folder import get_render_folder_paths, get_host_name
+from config.config import (
+    RENDER_STATE_FILE_NAME,
+    RENDER_LOCK_FOLDER_NAME,
+    RENDER_LOCK_LEASE_TIMEOUT_S,
+)
+
+LOCK_OWNER_FILE_NAME = "owner.json"
+
+
+def get_scene_spec(input_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Get the scene spec of the generated input data, as stored in the render state.
+
+    Args:
+        input_data (Dict[str, Any]): The generated input data.
+
+    Returns:
+        Dict[str, Any]: The input data with only JSON types, NumPy values converted to Python ones.
+    """
+    return json.loads(json.dumps(input_data, default=lambda value: value.tolist()))
+
+
+def get_owner() -> Dict[str, Any]:
+    """
+    Get the owner of the runs rendered by the current process.
+
+    Returns:
+        Dict[str, Any]: The host name, process ID and heartbeat time.
+    """
+    return {"host": get_host_name(), "pid": os.getpid(), "heartbeat": time.time()}
+
+
+def is_owner_alive(owner: Dict[str, Any] | None) -> bool:
+    """
+    Check whether the process owning a run may still be rendering it.
+    Processes of other hosts cannot be checked, and are assumed alive until their heartbeat is older than the lease timeout.
+
+    Args:
+        owner (Dict[str, Any] | None): The host name, process ID and heartbeat time of the owner, or None if unknown.
+
+    Returns:
+        bool: Whether the owner may be alive.
+    """
+    if owner is None:
+        return False
+    if owner["host"] != get_host_name():
+        return time.time() - owner.get("heartbeat", 0) < RENDER_LOCK_LEASE_TIMEOUT_S
+
+    try:
+        os.kill(owner["pid"], 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
+
+
+def lock_render_folder(render_folder_path: str) -> bool:
+    """
+    Atomically take the lock of a render folder, taking over the lock of an owner that is no longer alive.
+
+    Args:
+        render_folder_path (str): The folder path of the run.
+
+    Returns:
+        bool: Whether the lock was taken, False if another process holds it.
+    """
+    lock_folder_path = os.path.join(render_folder_path, RENDER_LOCK_FOLDER_NAME)
+    for _ in range(2):
+        # mkdir fails if the folder exists, so that only one process gets the lock
+        try:
+            os.mkdir(lock_folder_path)
+        except FileExistsError:
+            try:
+                with open(os.path.join(lock_folder_path, LOCK_OWNER_FILE_NAME), "r") as f:
+                    owner = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                # The lock is being taken by another process
+                return False
+            if is_owner_alive(owner):
+                return False
+
+            # Move the stale lock aside atomically, so that only one process removes it
+            stale_lock_folder_path = f"{lock_folder_path}.stale-{os.getpid()}"
+            try:
+                os.rename(lock_folder_path, stale_lock_folder_path)
+            except OSError:
+                continue
+            shutil.rmtree(stale_lock_folder_path, ignore_errors=True)
+            continue
+
+        with open(os.path.join(lock_folder_path, LOCK_OWNER_FILE_NAME), "w") as f:
+            json.dump(get_owner(), f)
+        return True
+
+    return False
+
+
+def refresh_render_lock(render_folder_path: str) -> None:
+    """
+    Refresh the heartbeat of the lock of a render folder, so that its lease does not time out while the run is rendered.
+    The owner is kept, so that the workers of a run refresh the lock of their parent process.
+
+    Args:
+        render_folder_path (str): The folder path of the run.
+    """
+    owner_file_path = os.path.join(
+        render_folder_path, RENDER_LOCK_FOLDER_NAME, LOCK_OWNER_FILE_NAME
+    )
+    try:
+        with open(owner_file_path, "r") as f:
+            owner = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        # The render folder is not locked, or its lock is being taken
+        return
+
+    owner["heartbeat"] = time.time()
+    temporary_owner_file_path = f"{owner_file_path}.{os.getpid()}.tmp"
+    with open(temporary_owner_file_path, "w") as f:
+        json.dump(owner, f)
+    os.replace(temporary_owner_file_path, owner_file_path)
+
+
+def unlock_render_folder(render_folder_path: str) -> None:
+    """
+    Release the lock of a render folder taken by the current process.
+
+    Args:
+        render_folder_path (str): The folder path of the run.
+    """
+    shutil.rmtree(
+        os.path.join(render_folder_path, RENDER_LOCK_FOLDER_NAME), ignore_errors=True
+    )
+
+
+def write_render_state(render_folder_path: str, render_state: Dict[str, Any]) -> None:
+    """
+    Atomically write the render state of a run to its render folder.
+
+    Args:
+        render_folder_path (str): The folder path of the run.
+        render_state (Dict[str, Any]): The render state.
+    """
+    render_state_file_path = os.path.join(render_folder_path, RENDER_STATE_FILE_NAME)
+    temporary_render_state_file_path = f"{render_state_file_path}.tmp"
+    with open(temporary_render_state_file_path, "w") as f:
+        json.dump(render_state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_render_state_file_path, render_state_file_path)
+
+
+def create_render_state(
+    render_folder_path: str,
+    seed: int,
+    armature_suffix: str,
+    input_data: Dict[str, Any],
+    frame_start: int,
+    frame_end: int,
+    frame_ranges: List[Tuple[int, int]] | None = None,
+) -> Dict[str, Any]:
+    """
+    Create and write the render state of a new run, before rendering its first frame.
+
+    Args:
+        render_folder_path (str): The folder path of the run.
+        seed (int): The random seed the scene is generated with.
+        armature_suffix (str): The suffix of the armature.
+        input_data (Dict[str, Any]): The generated input data.
+        frame_start (int): The first frame of the run.
+        frame_end (int): The last frame of the run.
+        frame_ranges (List[Tuple[int, int]] | None, optional): The first and last frames of each worker. Defaults to None.
+
+    Returns:
+        Dict[str, Any]: The render state.
+    """
+    render_state = {
+        "seed": seed,
+        "armature_suffix": armature_suffix,
+        "frame_start": frame_start,
+        "frame_end": frame_end,
+        "frame_ranges": None
+        if frame_ranges is None
+        else [list(frame_range) for frame_range in frame_ranges],
+        "scene_spec": get_scene_spec(input_data),
+        "owner": get_owner(),
+        "is_complete": False,
+    }
+    write_render_state(render_folder_path, render_state)
+
+    return render_state
+
+
+def complete_render_state(
+    render_folder_path: str, render_state: Dict[str, Any]
+) -> None:
+    """
+    Mark the run as complete in its render state, once all its frames are rendered.
+
+    Args:
+        render_folder_path (str): The folder path of the run.
+        render_state (Dict[str, Any]): The render state.
+    """
+    render_state["is_complete"] = True
+    write_render_state(render_folder_path, render_state)
+
+
+def read_render_state(render_folder_path: str) -> Dict[str, Any]:
+    """
+    Read the render state of a run.
+
+    Args:
+        render_folder_path (str): The folder path of the run.
+
+    Raises:
+        FileNotFoundError: If the render state file does not exist.
+
+    Returns:
+        Dict[str, Any]: The render state.
+    """
+    render_state_file_path = os.path.join(render_folder_path, RENDER_STATE_FILE_NAME)
+    if not os.path.isfile(render_state_file_path):
+        raise FileNotFoundError(f"❌ Render state file {render_state_file_path} not found.")
+
+    with open(render_state_file_path, "r") as f:
+        return json.load(f)
+
+
+def take_over_render_state(render_folder_path: str) -> Dict[str, Any]:
+    """
+    Read the render state of a run locked by the current process, and record the process as its owner.
+
+    Args:
+        render_folder_path (str): The folder path of the run.
+
+    Raises:
+        FileNotFoundError: If the render state file does not exist.
+
+    Returns:
+        Dict[str, Any]: The render state.
+    """
+    render_state = read_render_state(render_folder_path)
+    render_state["owner"] = get_owner()
+    write_render_state(render_folder_path, render_state)
+
+    return render_state
+
+
+def find_partial_render_folder(root_folder_path: str, n_shard_levels: int = 0) -> str:
+    """
+    Find the most recently started run whose rendering did not complete and whose owner is no longer alive, and lock it.
+    The owner recorded in the render state is only used to skip runs early, the lock decides from the heartbeat refreshed each frame.
+
+    Args:
+        root_folder_path (str): The folder containing the render folders of the runs.
+        n_shard_levels (int, optional): The number of shard folder levels above the render folders. Defaults to 0.
+
+    Raises:
+        ValueError: If no partial run without a live owner is found.
+
+    Returns:
+        str: The folder path of the partial run.
+    """
+    partial_render_folder_paths = []
+    for render_folder_path in get_render_folder_paths(root_folder_path, n_shard_levels):
+        render_state_file_path = os.path.join(render_folder_path, RENDER_STATE_FILE_NAME)
+        if not os.path.isfile(render_state_file_path):
+            continue
+        render_state = read_render_state(render_folder_path)
+        if not render_state["is_complete"] and not is_owner_alive(render_state.get("owner")):
+            partial_render_folder_paths.append(render_folder_path)
+
+    # Concurrent resumes may find the same runs, each takes the newest one it can lock
+    partial_render_folder_paths.sort(
+        key=lambda render_folder_path: os.path.getmtime(
+            os.path.join(render_folder_path, RENDER_STATE_FILE_NAME)
+        ),
+        reverse=True,
+    )
+    for render_folder_path in partial_render_folder_paths:
+        if lock_render_folder(render_folder_path):
+            return render_folder_path
+
+    raise ValueError(f"❌ No partial run without a live owner found in {root_folder_path}.")
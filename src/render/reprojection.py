@@ -0,0 +1,115 @@
+# This file contains functions to recompute the frame labels of whole runs from their camera export, in bulk and without Blender.
+# It only depends on NumPy, so that it can be used from analysis and training code.
+
+import numpy as np
+from typing import Any, Dict
+
+from render.camera_export import INTRINSICS_NUMERIC_FIELDS, INTRINSICS_STRING_FIELDS
+from render.projection import (
+    project_points,
+    are_points_in_frame,
+    get_relative_orientations,
+)
+
+
+def get_export_intrinsics(frames: np.ndarray) -> Dict[str, Any]:
+    """
+    Get the camera intrinsics of exported frames, with one value per frame for the numerical ones.
+
+    Args:
+        frames (np.ndarray): The exported frame records, of shape (F,).
+
+    Raises:
+        ValueError: If the camera type, panorama type or sensor fit changes between frames.
+
+    Returns:
+        Dict[str, Any]: The camera intrinsics, whose numerical values are arrays of shape (F,).
+    """
+    intrinsics = {field: np.asarray(frames[field]) for field in INTRINSICS_NUMERIC_FIELDS}
+    for field in INTRINSICS_STRING_FIELDS:
+        values = np.unique(frames[field])
+        if len(values) != 1:
+            raise ValueError(f"❌ The camera {field} must be the same for all frames.")
+        intrinsics[field] = str(values[0])
+
+    return intrinsics
+
+
+def reproject_leds(
+    camera_export: Dict[str, np.ndarray],
+    intrinsics_overrides: Dict[str, Any] | None = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Recompute the LED labels of all exported frames at once, possibly with a different camera model.
+
+    Args:
+        camera_export (Dict[str, np.ndarray]): The camera export, as returned by load_camera_export.
+        intrinsics_overrides (Dict[str, Any] | None, optional): The camera intrinsics to replace, e.g. {"type": "PERSP"}. Defaults to None.
+
+    Raises:
+        ValueError: If the camera type, panorama type or sensor fit changes between frames.
+        ValueError: If the camera type is not supported.
+
+    Returns:
+        Dict[str, np.ndarray]: The frames, of shape (F,), the centers, projected coordinates, in frame, distance from camera and relative orientation of the LEDs, of shape (F, N, ...), and the stylus relative orientation, of shape (F,).
+    """
+    frames = camera_export["frames"][camera_export["frames"]["frame"] >= 0]
+    leds = camera_export["leds"][camera_export["frames"]["frame"] >= 0]
+    intrinsics = get_export_intrinsics(frames)
+    if intrinsics_overrides is not None:
+        intrinsics.update(intrinsics_overrides)
+
+    camera_matrix_world = np.asarray(frames["camera_matrix_world"])
+    arrow_matrices = np.asarray(leds["arrow_matrix_world"])
+    centers = arrow_matrices[..., :3, 3]
+    projected_coordinates = project_points(centers, camera_matrix_world, intrinsics)
+
+    return {
+        "frames": np.asarray(frames["frame"]),
+        "centers": centers,
+        "projected_coordinates": projected_coordinates,
+        "is_in_frame": are_points_in_frame(projected_coordinates),
+        "distance_from_camera": np.linalg.norm(
+            camera_matrix_world[:, None, :3, 3] - centers, axis=-1
+        ),
+        "led_relative_orientation": get_relative_orientations(
+            arrow_matrices, np.array((0, 0, 1)), camera_matrix_world
+        ),
+        "stylus_relative_orientation": get_relative_orientations(
+            np.asarray(frames["stylus_matrix_world"])[:, None],
+            np.array((1, 0, 0)),
+            camera_matrix_world,
+        )[:, 0],
+    }
+
+
+def get_bounding_boxes(
+    projected_coordinates: np.ndarray, is_visible: np.ndarray, padding: float
+) -> Dict[str, np.ndarray]:
+    """
+    Get the bounding boxes of the visible LEDs of all frames at once, as done by get_bounding_box.
+
+    Args:
+        projected_coordinates (np.ndarray): The projected coordinates of the LEDs, of shape (F, N, 2) or (F, N, 3).
+        is_visible (np.ndarray): Whether each LED is visible, e.g. in frame and not occluded, of shape (F, N).
+        padding (float): The padding of the bounding boxes, in camera view coordinates.
+
+    Returns:
+        Dict[str, np.ndarray]: The centers u and v, widths and heights of the bounding boxes, NaN for frames without visible LED, of shape (F,).
+    """
+    u = np.where(is_visible, projected_coordinates[..., 0], np.nan)
+    v = np.where(is_visible, projected_coordinates[..., 1], np.nan)
+    has_visible_led = np.any(is_visible, axis=-1)
+
+    with np.errstate(invalid="ignore"):
+        u_min = np.maximum(np.nanmin(np.where(has_visible_led[:, None], u, 0.0), axis=-1) - padding, 0)
+        u_max = np.minimum(np.nanmax(np.where(has_visible_led[:, None], u, 0.0), axis=-1) + padding, 1)
+        v_min = np.maximum(np.nanmin(np.where(has_visible_led[:, None], v, 0.0), axis=-1) - padding, 0)
+        v_max = np.minimum(np.nanmax(np.where(has_visible_led[:, None], v, 0.0), axis=-1) + padding, 1)
+
+    return {
+        "u": np.where(has_visible_led, (u_min + u_max) / 2, np.nan),
+        "v": np.where(has_visible_led, (v_min + v_max) / 2, np.nan),
+        "width": np.where(has_visible_led, u_max - u_min, np.nan),
+        "height": np.where(has_visible_led, v_max - v_min, np.nan),
+    }
@@ -0,0 +1,145 @@
+# This file contains functions to crop the rendered images around the constellation bounding box, so that training does not decode full frames.
+
+import os
+
+# EXR decoding is disabled by default in OpenCV, and is only checked on first use
+os.environ.setdefault("OPENCV_IO_ENABLE_OPENEXR", "1")
+
+import cv2
+import math
+import numpy as np
+from typing import Any, Dict
+
+
+def get_crop_file_path(
+    render_folder_path: str, pass_name: str, frame: int, extension: str
+) -> str:
+    """
+    Get the path of the crop of a pass for a frame.
+
+    Args:
+        render_folder_path (str): The folder path of the run.
+        pass_name (str): The name of the pass.
+        frame (int): The frame index.
+        extension (str): The extension of the rendered image of the pass, which the crop keeps the format of.
+
+    Returns:
+        str: The crop path.
+    """
+    return os.path.join(render_folder_path, f"{pass_name}-crop", f"{frame:04d}{extension}")
+
+
+def get_crop_window(
+    bounding_box: Dict[str, Any], image_width: int, image_height: int, crop_size: int
+) -> Dict[str, Any]:
+    """
+    Get the square window of the image to crop around a bounding box.
+    The window is the crop size, or the bounding box size if it is larger, in which case the window is scaled down to the crop size.
+
+    Args:
+        bounding_box (Dict[str, Any]): The bounding box, in camera view coordinates.
+        image_width (int): The width of the image, in pixels.
+        image_height (int): The height of the image, in pixels.
+        crop_size (int): The size of the crop, in pixels.
+
+    Returns:
+        Dict[str, Any]: The offset of the window top left corner in the image, in pixels, the scale from image to crop pixels and the crop size.
+    """
+    window_size = max(
+        crop_size,
+        math.ceil(bounding_box["width"] * image_width),
+        math.ceil(bounding_box["height"] * image_height),
+    )
+
+    # Camera view coordinates start at the bottom left corner, pixels at the top left one
+    center_x = bounding_box["center"]["u"] * image_width
+    center_y = (1 - bounding_box["center"]["v"]) * image_height
+
+    return {
+        "offset": {
+            "x": int(round(center_x - window_size / 2)),
+            "y": int(round(center_y - window_size / 2)),
+        },
+        "scale": crop_size / window_size,
+        "size": crop_size,
+    }
+
+
+def crop_image(image: np.ndarray, crop: Dict[str, Any]) -> np.ndarray:
+    """
+    Crop an image to a window, padding with black where the window leaves the image.
+
+    Args:
+        image (np.ndarray): The image, of shape (H, W) or (H, W, C).
+        crop (Dict[str, Any]): The crop window, as returned by get_crop_window.
+
+    Returns:
+        np.ndarray: The cropped image, of shape (size, size) or (size, size, C).
+    """
+    window_size = int(round(crop["size"] / crop["scale"]))
+    x_offset = crop["offset"]["x"]
+    y_offset = crop["offset"]["y"]
+    image_height, image_width = image.shape[:2]
+
+    window = np.zeros((window_size, window_size) + image.shape[2:], dtype=image.dtype)
+    x_start, x_end = max(x_offset, 0), min(x_offset + window_size, image_width)
+    y_start, y_end = max(y_offset, 0), min(y_offset + window_size, image_height)
+    if x_start < x_end and y_start < y_end:
+        window[
+            y_start - y_offset : y_end - y_offset, x_start - x_offset : x_end - x_offset
+        ] = image[y_start:y_end, x_start:x_end]
+
+    if window_size != crop["size"]:
+        window = cv2.resize(
+            window, (crop["size"], crop["size"]), interpolation=cv2.INTER_AREA
+        )
+
+    return window
+
+
+def write_crops(
+    image_file_paths: Dict[str, str],
+    render_folder_path: str,
+    frame: int,
+    bounding_box: Dict[str, Any] | None,
+    crop_size: int,
+) -> Dict[str, Any] | None:
+    """
+    Write the crops of the rendered images of a frame around its bounding box, each pass to its own crop folder.
+
+    Args:
+        image_file_paths (Dict[str, str]): The rendered image paths, by pass name.
+        render_folder_path (str): The folder path of the run.
+        frame (int): The frame index.
+        bounding_box (Dict[str, Any] | None): The bounding box of the frame, in camera view coordinates.
+        crop_size (int): The size of the crops, in pixels.
+
+    Raises:
+        ValueError: If the crop size is less than or equal to 0.
+        FileNotFoundError: If a rendered image is not found.
+
+    Returns:
+        Dict[str, Any] | None: The crop window, or None if the frame has no bounding box.
+    """
+    if crop_size <= 0:
+        raise ValueError("❌ The crop size must be greater than 0.")
+    if bounding_box is None:
+        return None
+
+    crop = None
+    for pass_name, image_file_path in image_file_paths.items():
+        image = cv2.imread(image_file_path, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise FileNotFoundError(f"❌ Rendered image {image_file_path} not found.")
+        if crop is None:
+            crop = get_crop_window(
+                bounding_box, image.shape[1], image.shape[0], crop_size
+            )
+
+        crop_file_path = get_crop_file_path(
+            render_folder_path, pass_name, frame, os.path.splitext(image_file_path)[1]
+        )
+        os.makedirs(os.path.dirname(crop_file_path), exist_ok=True)
+        cv2.imwrite(crop_file_path, crop_image(image, crop))
+
+    return crop
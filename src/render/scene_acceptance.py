@@ -0,0 +1,92 @@
+# This file contains functions to test whether a generated scene is worth rendering, by simulating its timeline without rendering.
+
+import os
+import bpy
+import json
+import numpy as np
+from tqdm import tqdm
+from typing import Any, Dict, List
+
+from render.occlusion import LedOcclusionTester
+from render.render import get_main_objects, get_led_arrows, get_leds_state
+
+
+def simulate_timeline(armature_suffix: str) -> Dict[str, float]:
+    """
+    Evaluate the keyframed scene at each frame of the timeline, and measure how visible the stylus LEDs are.
+
+    Args:
+        armature_suffix (str): The suffix of the armature.
+
+    Raises:
+        ValueError: If the camera, stylus, LEDs or armature arm are not found.
+
+    Returns:
+        Dict[str, float]: The ratio of frames with at least one LED in frame, the ratio of frames with at least one visible LED, and the mean ratio of visible LEDs per frame.
+    """
+    camera_object, camera, _, leds, armature_arm = get_main_objects(armature_suffix)
+    led_arrows = get_led_arrows(leds)
+    led_occlusion_tester = LedOcclusionTester(leds, armature_arm)
+
+    scene = bpy.context.scene
+    scene.camera = camera_object
+    frames = range(scene.frame_start, scene.frame_end + 1)
+    n_leds_in_frame = np.zeros(len(frames), dtype=np.int64)
+    n_visible_leds = np.zeros(len(frames), dtype=np.int64)
+    for i, frame in enumerate(tqdm(frames, desc="🔄 Simulating timeline...")):
+        scene.frame_set(frame)
+        leds_state = get_leds_state(
+            camera_object, camera, led_arrows, led_occlusion_tester, None
+        )
+        n_leds_in_frame[i] = np.sum(leds_state["is_in_frame"])
+        n_visible_leds[i] = np.sum(
+            leds_state["is_in_frame"] & ~leds_state["is_occluded"]
+        )
+    scene.frame_set(scene.frame_start)
+
+    return {
+        "in_frame_ratio": float(np.mean(n_leds_in_frame > 0)),
+        "visible_frame_ratio": float(np.mean(n_visible_leds > 0)),
+        "visible_led_ratio": float(np.mean(n_visible_leds / len(leds))),
+    }
+
+
+def get_failed_criteria(
+    stats: Dict[str, float],
+    min_in_frame_ratio: float,
+    min_visible_frame_ratio: float,
+    min_visible_led_ratio: float,
+) -> List[str]:
+    """
+    Get the acceptance criteria a simulated scene fails.
+
+    Args:
+        stats (Dict[str, float]): The statistics of the simulated timeline, as returned by simulate_timeline.
+        min_in_frame_ratio (float): The minimum ratio of frames with at least one LED in frame.
+        min_visible_frame_ratio (float): The minimum ratio of frames with at least one visible LED.
+        min_visible_led_ratio (float): The minimum mean ratio of visible LEDs per frame.
+
+    Returns:
+        List[str]: The names of the failed statistics, empty if the scene is accepted.
+    """
+    min_ratios = {
+        "in_frame_ratio": min_in_frame_ratio,
+        "visible_frame_ratio": min_visible_frame_ratio,
+        "visible_led_ratio": min_visible_led_ratio,
+    }
+
+    return [name for name, min_ratio in min_ratios.items() if stats[name] < min_ratio]
+
+
+def log_acceptance(file_path: str, record: Dict[str, Any]) -> None:
+    """
+    Append the acceptance test of a scene to the log shared by all runs, in a single write so that concurrent runs do not interleave.
+
+    Args:
+        file_path (str): The path of the JSON Lines log file.
+        record (Dict[str, Any]): The acceptance test record.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    line = json.dumps(record, separators=(",", ":")) + "\n"
+    with open(file_path, "a") as f:
+        f.write(line)
@@ -0,0 +1,114 @@
+# This file contains the scene state hasher class, which detects consecutive frames rendering the same scene state, e.g. during gestures without movement.
+
+import bpy
+import hashlib
+import numpy as np
+from typing import List
+
+
+class SceneStateHasher:
+    """
+    A scene state hasher, hashing the evaluated armature pose, the camera and the animated visibility of the objects of the current frame.
+    """
+
+    def __init__(
+        self,
+        armature: bpy.types.Object,
+        camera_object: bpy.types.Object,
+        camera: bpy.types.Camera,
+        tolerance: float,
+    ) -> None:
+        """
+        Initialize the scene state hasher.
+
+        Args:
+            armature (bpy.types.Object): The armature object.
+            camera_object (bpy.types.Object): The camera object.
+            camera (bpy.types.Camera): The camera.
+            tolerance (float): The step transforms are rounded to before hashing, so that negligible movements are ignored.
+
+        Raises:
+            ValueError: If the tolerance is less than or equal to 0.
+        """
+        if tolerance <= 0:
+            raise ValueError("❌ The tolerance must be greater than 0.")
+
+        self.armature = armature
+        self.camera_object = camera_object
+        self.camera = camera
+        self.tolerance = tolerance
+        self.hide_render_objects = SceneStateHasher.get_hide_render_objects()
+        print(f"➡️  Hashing the visibility of {len(self.hide_render_objects)} animated objects.")
+
+    @staticmethod
+    def get_hide_render_objects() -> List[bpy.types.Object]:
+        """
+        Get the objects whose render visibility is animated, e.g. flickering Christmas tree LEDs.
+
+        Returns:
+            List[bpy.types.Object]: The objects, sorted by name.
+        """
+        hide_render_objects = [
+            obj
+            for obj in bpy.data.objects
+            if obj.animation_data is not None
+            and obj.animation_data.action is not None
+            and any(
+                fcurve.data_path == "hide_render"
+                for fcurve in obj.animation_data.action.fcurves
+            )
+        ]
+        hide_render_objects.sort(key=lambda obj: obj.name)
+
+        return hide_render_objects
+
+    def get_hash(self) -> str:
+        """
+        Get the hash of the scene state of the current frame.
+
+        Returns:
+            str: The hexadecimal hash.
+        """
+        transforms = [np.array(self.armature.matrix_world)]
+        transforms += [np.array(bone.matrix) for bone in self.armature.pose.bones]
+        transforms.append(np.array(self.camera_object.matrix_world))
+        transforms.append(
+            np.array([self.camera.lens, self.camera.shift_x, self.camera.shift_y])
+        )
+        quantized_transforms = np.rint(
+            np.concatenate([transform.ravel() for transform in transforms])
+            / self.tolerance
+        ).astype(np.int64)
+
+        state_hash = hashlib.sha1(quantized_transforms.tobytes())
+        state_hash.update(
+            bytes(bool(obj.hide_render) for obj in self.hide_render_objects)
+        )
+
+        return state_hash.hexdigest()
+
+    def get_first_frame_of_state(self, frame: int, first_frame: int) -> int:
+        """
+        Get the first of the consecutive frames ending at a frame with its scene state, evaluating the frames before it.
+        This gives the frame a sequential render would have linked it to, when the frames before it are rendered by another process or were rendered before resuming.
+
+        Args:
+            frame (int): The frame index.
+            first_frame (int): The first frame of the scene, where the search stops.
+
+        Returns:
+            int: The first frame with the same scene state, the frame itself if the previous frame differs.
+        """
+        scene = bpy.context.scene
+        scene.frame_set(frame)
+        state_hash = self.get_hash()
+
+        first_state_frame = frame
+        while first_state_frame > first_frame:
+            scene.frame_set(first_state_frame - 1)
+            if self.get_hash() != state_hash:
+                break
+            first_state_frame -= 1
+        scene.frame_set(frame)
+
+        return first_state_frame
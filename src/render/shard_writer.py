@@ -0,0 +1,354 @@
+# This file contains the shard writer and reader classes, packing the files and annotation of each frame into size-bounded tar shards with an offset index.
+
+import io
+import os
+import json
+import tarfile
+from typing import Any, Dict, Iterator, List
+
+SHARD_FILE_NAME_FORMAT = "shard-{:06d}.tar"
+SHARD_INDEX_FILE_EXTENSION = ".index.json"
+
+
+def get_member_name(frame: int, key: str) -> str:
+    """
+    Get the name of a frame member in a shard, grouping the members of a frame by their common prefix.
+
+    Args:
+        frame (int): The frame index.
+        key (str): The key of the member, with its extension.
+
+    Returns:
+        str: The member name.
+    """
+    return f"{frame:06d}.{key}"
+
+
+class ShardWriter:
+    """
+    A shard writer, appending the members of each frame to a tar shard until it reaches its maximum size, then starting a new one.
+    """
+
+    def __init__(
+        self,
+        folder_path: str,
+        max_shard_size: int,
+        remove_packed_files: bool = True,
+        resume: bool = False,
+    ) -> None:
+        """
+        Initialize the shard writer.
+
+        Args:
+            folder_path (str): The folder to write the shards to.
+            max_shard_size (int): The size above which a new shard is started, in bytes.
+            remove_packed_files (bool, optional): Whether to remove the files once packed. Defaults to True.
+            resume (bool, optional): Whether to keep the shards of an interrupted run, finishing the unfinished one after its last complete frame and numbering new shards after them. Defaults to False.
+
+        Raises:
+            ValueError: If the maximum shard size is less than or equal to 0.
+        """
+        if max_shard_size <= 0:
+            raise ValueError("❌ The maximum shard size must be greater than 0.")
+
+        os.makedirs(folder_path, exist_ok=True)
+        self.folder_path = folder_path
+        self.max_shard_size = max_shard_size
+        self.remove_packed_files = remove_packed_files
+        self.n_shards = 0
+        self.shard_file_path = None
+        self.shard = None
+        self.shard_index: Dict[str, Dict[str, int]] = {}
+        if resume:
+            self.__recover_unfinished_shards()
+
+    def __enter__(self) -> "ShardWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __recover_unfinished_shards(self) -> None:
+        """
+        Finish the shards without an index, which were interrupted, after their last complete frame, remove any other leftover file, and count the shards.
+        """
+        for file_name in sorted(os.listdir(self.folder_path)):
+            file_path = os.path.join(self.folder_path, file_name)
+            if file_name.endswith(SHARD_INDEX_FILE_EXTENSION) or os.path.isfile(
+                file_path + SHARD_INDEX_FILE_EXTENSION
+            ):
+                continue
+            if file_name.endswith(".tar"):
+                self.__recover_unfinished_shard(file_path)
+            else:
+                os.remove(file_path)
+
+        self.n_shards = len(
+            [
+                file_name
+                for file_name in os.listdir(self.folder_path)
+                if file_name.endswith(SHARD_INDEX_FILE_EXTENSION)
+            ]
+        )
+
+    def __recover_unfinished_shard(self, file_path: str) -> None:
+        """
+        Truncate an interrupted shard after the last frame whose members were all written, the data member being written last, and write its index.
+        The shard is removed if it has no complete frame.
+
+        Args:
+            file_path (str): The path of the shard.
+        """
+        file_size = os.path.getsize(file_path)
+        shard_index: Dict[str, Dict[str, int]] = {}
+        frame_index: Dict[str, Dict[str, int]] = {}
+        end_offset = 0
+        try:
+            with tarfile.open(file_path, "r:") as shard:
+                while True:
+                    member = shard.next()
+                    if member is None or member.offset_data + member.size > file_size:
+                        break
+                    frame_index[member.name] = {
+                        "offset": member.offset_data,
+                        "size": member.size,
+                    }
+                    if member.name.split(".", 1)[1] == "json":
+                        shard_index.update(frame_index)
+                        frame_index = {}
+                        padded_size = -(-member.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+                        end_offset = member.offset_data + padded_size
+        except (tarfile.TarError, EOFError):
+            # The interrupted write of the next member ends the readable shard
+            pass
+
+        if len(shard_index) == 0:
+            os.remove(file_path)
+            return
+
+        # Cut the incomplete frame and end the archive with its two zero blocks
+        with open(file_path, "r+b") as f:
+            f.truncate(end_offset)
+            f.seek(end_offset)
+            f.write(bytes(2 * tarfile.BLOCKSIZE))
+        ShardWriter.write_index(file_path, shard_index)
+        print(
+            f"♻️  Recovered {len(ShardReader.get_member_frames(shard_index))} frames from unfinished shard {os.path.basename(file_path)}."
+        )
+
+    @staticmethod
+    def write_index(shard_file_path: str, shard_index: Dict[str, Dict[str, int]]) -> None:
+        """
+        Atomically write the offset index of a finished shard next to it.
+
+        Args:
+            shard_file_path (str): The path of the shard.
+            shard_index (Dict[str, Dict[str, int]]): The offset and size of the members, by member name.
+        """
+        index = {
+            "file_name": os.path.basename(shard_file_path),
+            "members": shard_index,
+        }
+        index_file_path = shard_file_path + SHARD_INDEX_FILE_EXTENSION
+        temporary_index_file_path = f"{index_file_path}.tmp"
+        with open(temporary_index_file_path, "w") as f:
+            json.dump(index, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_index_file_path, index_file_path)
+
+    def get_frames(self) -> List[int]:
+        """
+        Get the frames stored in the finished shards, including those recovered from an interrupted run.
+
+        Returns:
+            List[int]: The sorted frame indices.
+        """
+        return ShardReader(self.folder_path).get_frames()
+
+    def __open_shard(self) -> None:
+        """
+        Start a new shard.
+        """
+        self.shard_file_path = os.path.join(
+            self.folder_path, SHARD_FILE_NAME_FORMAT.format(self.n_shards)
+        )
+        self.shard = tarfile.open(self.shard_file_path, "w", format=tarfile.PAX_FORMAT)
+        self.shard_index = {}
+        self.n_shards += 1
+
+    def __close_shard(self) -> None:
+        """
+        Finish the current shard and atomically write its offset index next to it.
+        """
+        if self.shard is None:
+            return
+
+        self.shard.close()
+        self.shard = None
+        ShardWriter.write_index(self.shard_file_path, self.shard_index)
+
+    def __add_member(self, name: str, content: bytes) -> None:
+        """
+        Add a member to the current shard and record the offset of its data.
+
+        Args:
+            name (str): The member name.
+            content (bytes): The member content.
+        """
+        member = tarfile.TarInfo(name)
+        member.size = len(content)
+        self.shard.addfile(member, io.BytesIO(content))
+
+        # The data is padded to the next block after the header
+        padded_size = -(-member.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+        self.shard_index[name] = {
+            "offset": self.shard.offset - padded_size,
+            "size": member.size,
+        }
+
+    def write(
+        self, frame: int, file_paths: Dict[str, str], frame_data: Dict[str, Any]
+    ) -> None:
+        """
+        Pack the files and the data of a frame into the current shard, all members of a frame staying in the same shard.
+
+        Args:
+            frame (int): The frame index.
+            file_paths (Dict[str, str]): The paths of the frame files, by key.
+            frame_data (Dict[str, Any]): The frame data.
+
+        Raises:
+            FileNotFoundError: If a frame file does not exist.
+        """
+        members = {}
+        for key, file_path in file_paths.items():
+            if not os.path.isfile(file_path):
+                raise FileNotFoundError(f"❌ Frame file {file_path} not found.")
+            with open(file_path, "rb") as f:
+                members[key + os.path.splitext(file_path)[1]] = f.read()
+        members["json"] = json.dumps(
+            {"frame": frame, "data": frame_data}, separators=(",", ":")
+        ).encode("utf-8")
+
+        # Start a new shard if the frame does not fit, unless the shard is empty
+        frame_size = sum(len(content) for content in members.values())
+        if self.shard is not None and len(self.shard_index) > 0:
+            if self.shard.offset + frame_size > self.max_shard_size:
+                self.__close_shard()
+        if self.shard is None:
+            self.__open_shard()
+
+        for key, content in members.items():
+            self.__add_member(get_member_name(frame, key), content)
+
+        if self.remove_packed_files:
+            for file_path in file_paths.values():
+                os.remove(file_path)
+
+    def close(self) -> None:
+        """
+        Finish the current shard.
+        """
+        self.__close_shard()
+
+
+class ShardReader:
+    """
+    A shard reader, giving random access to the members of the frames through the shard indexes.
+    """
+
+    def __init__(self, folder_path: str) -> None:
+        """
+        Initialize the shard reader.
+
+        Args:
+            folder_path (str): The folder the shards were written to.
+
+        Raises:
+            FileNotFoundError: If the folder does not exist.
+        """
+        if not os.path.isdir(folder_path):
+            raise FileNotFoundError(f"❌ Shard folder {folder_path} not found.")
+
+        self.folder_path = folder_path
+        self.members: Dict[str, Dict[str, Any]] = {}
+        for file_name in sorted(os.listdir(folder_path)):
+            if not file_name.endswith(SHARD_INDEX_FILE_EXTENSION):
+                continue
+            with open(os.path.join(folder_path, file_name), "r") as f:
+                index = json.load(f)
+            for name, member in index["members"].items():
+                self.members[name] = {"file_name": index["file_name"], **member}
+
+    @staticmethod
+    def get_member_frames(members: Dict[str, Any]) -> List[int]:
+        """
+        Get the frames of shard members.
+
+        Args:
+            members (Dict[str, Any]): The members, by member name.
+
+        Returns:
+            List[int]: The sorted frame indices.
+        """
+        return sorted({int(name.split(".", 1)[0]) for name in members})
+
+    def get_frames(self) -> List[int]:
+        """
+        Get the frames stored in the shards.
+
+        Returns:
+            List[int]: The sorted frame indices.
+        """
+        return ShardReader.get_member_frames(self.members)
+
+    def read(self, frame: int, key: str) -> bytes:
+        """
+        Read a member of a frame, with a single seek into its shard.
+
+        Args:
+            frame (int): The frame index.
+            key (str): The key of the member, with its extension.
+
+        Raises:
+            KeyError: If the member is not found.
+
+        Returns:
+            bytes: The member content.
+        """
+        name = get_member_name(frame, key)
+        if name not in self.members:
+            raise KeyError(f"❌ Member {name} not found.")
+
+        member = self.members[name]
+        with open(os.path.join(self.folder_path, member["file_name"]), "rb") as f:
+            f.seek(member["offset"])
+            return f.read(member["size"])
+
+    def __getitem__(self, frame: int) -> Dict[str, bytes]:
+        """
+        Read all members of a frame.
+
+        Args:
+            frame (int): The frame index.
+
+        Returns:
+            Dict[str, bytes]: The member contents, by key.
+        """
+        prefix = get_member_name(frame, "")
+        return {
+            name[len(prefix) :]: self.read(frame, name[len(prefix) :])
+            for name in self.members
+            if name.startswith(prefix)
+        }
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over the annotation records of the frames, in frame order.
+
+        Yields:
+            Dict[str, Any]: The annotation record.
+        """
+        for frame in self.get_frames():
+            yield json.loads(self.read(frame, "json"))
@@ -0,0 +1,163 @@
+# This file contains functions to toggle what the view layers render, without adding animation data to the scene.
+
+import bpy
+from typing import List
+
+from render.compositor import get_render_layers_node
+from config.config import BACKGROUND_COLLECTION_NAME
+
+NO_BG_VIEW_LAYER_NAME = "NoBackground"
+HOLDOUT_COLLECTION_NAME = "ArmatureHoldout"
+
+
+def get_layer_collection(
+    layer_collection: bpy.types.LayerCollection, collection_name: str
+) -> bpy.types.LayerCollection | None:
+    """
+    Find the layer collection of a collection in a view layer hierarchy.
+
+    Args:
+        layer_collection (bpy.types.LayerCollection): The layer collection to search from.
+        collection_name (str): The name of the collection.
+
+    Returns:
+        bpy.types.LayerCollection | None: The layer collection, or None if it is not found.
+    """
+    if layer_collection.collection.name == collection_name:
+        return layer_collection
+
+    for child in layer_collection.children:
+        found_layer_collection = get_layer_collection(child, collection_name)
+        if found_layer_collection is not None:
+            return found_layer_collection
+
+    return None
+
+
+def set_collection_excluded(
+    view_layer: bpy.types.ViewLayer, collection_name: str, is_excluded: bool
+) -> bool:
+    """
+    Exclude a collection from a view layer, or include it back.
+
+    Args:
+        view_layer (bpy.types.ViewLayer): The view layer.
+        collection_name (str): The name of the collection.
+        is_excluded (bool): Whether to exclude the collection.
+
+    Raises:
+        ValueError: If the collection is not in the view layer.
+
+    Returns:
+        bool: Whether the collection was excluded before.
+    """
+    layer_collection = get_layer_collection(
+        view_layer.layer_collection, collection_name
+    )
+    if layer_collection is None:
+        raise ValueError(f"❌ {collection_name} collection not found in view layer.")
+
+    was_excluded = layer_collection.exclude
+    layer_collection.exclude = is_excluded
+
+    return was_excluded
+
+
+def get_or_create_view_layer(scene: bpy.types.Scene, name: str) -> bpy.types.ViewLayer:
+    """
+    Get a view layer of the scene, creating it if it does not exist.
+
+    Args:
+        scene (bpy.types.Scene): The scene.
+        name (str): The name of the view layer.
+
+    Returns:
+        bpy.types.ViewLayer: The view layer.
+    """
+    view_layer = scene.view_layers.get(name)
+    if view_layer is None:
+        view_layer = scene.view_layers.new(name)
+
+    return view_layer
+
+
+def get_or_create_holdout_collection(
+    scene: bpy.types.Scene, objects: List[bpy.types.Object]
+) -> bpy.types.Collection:
+    """
+    Get the holdout collection, creating it if it does not exist, and link objects to it in addition to their own collections.
+
+    Args:
+        scene (bpy.types.Scene): The scene.
+        objects (List[bpy.types.Object]): The objects to hold out.
+
+    Returns:
+        bpy.types.Collection: The holdout collection.
+    """
+    holdout_collection = bpy.data.collections.get(HOLDOUT_COLLECTION_NAME)
+    if holdout_collection is None:
+        holdout_collection = bpy.data.collections.new(HOLDOUT_COLLECTION_NAME)
+    if holdout_collection.name not in scene.collection.children:
+        scene.collection.children.link(holdout_collection)
+
+    for obj in objects:
+        if obj.name not in holdout_collection.objects:
+            holdout_collection.objects.link(obj)
+
+    return holdout_collection
+
+
+def setup_no_bg_view_layer(
+    scene: bpy.types.Scene, holdout_objects: List[bpy.types.Object]
+) -> bpy.types.ViewLayer:
+    """
+    Set up the view layer of the no-bg pass once per run.
+    The background collection is excluded and the holdout objects are rendered black, so that only the LEDs remain, without changing any object or mesh data.
+
+    Args:
+        scene (bpy.types.Scene): The scene.
+        holdout_objects (List[bpy.types.Object]): The objects hiding the LEDs without being rendered, the arm and the stylus body.
+
+    Raises:
+        ValueError: If the background collection is not in the view layer.
+
+    Returns:
+        bpy.types.ViewLayer: The no-bg view layer.
+    """
+    holdout_collection = get_or_create_holdout_collection(scene, holdout_objects)
+    no_bg_view_layer = get_or_create_view_layer(scene, NO_BG_VIEW_LAYER_NAME)
+    no_bg_view_layer.use = False
+
+    set_collection_excluded(no_bg_view_layer, BACKGROUND_COLLECTION_NAME, True)
+    get_layer_collection(
+        no_bg_view_layer.layer_collection, holdout_collection.name
+    ).holdout = True
+
+    return no_bg_view_layer
+
+
+def set_render_view_layer(scene: bpy.types.Scene, view_layer_name: str) -> str:
+    """
+    Render only a view layer, and feed it to the compositor.
+
+    Args:
+        scene (bpy.types.Scene): The scene.
+        view_layer_name (str): The name of the view layer to render.
+
+    Raises:
+        ValueError: If the view layer is not found.
+        ValueError: If the render layers node is not found.
+
+    Returns:
+        str: The name of the view layer rendered before.
+    """
+    if scene.view_layers.get(view_layer_name) is None:
+        raise ValueError(f"❌ {view_layer_name} view layer not found.")
+
+    render_layers_node = get_render_layers_node(scene.node_tree)
+    old_view_layer_name = render_layers_node.layer
+    for view_layer in scene.view_layers:
+        view_layer.use = view_layer.name == view_layer_name
+    render_layers_node.layer = view_layer_name
+
+    return old_view_layer_name
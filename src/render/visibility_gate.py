@@ -0,0 +1,118 @@
+# This file contains the visibility gate class, which decides from the cheap annotation of a frame whether it is worth rendering.
+
+import os
+import json
+import numpy as np
+from typing import Any, Dict, Iterable, List
+
+GATE_RENDER = "render"
+GATE_NO_BG_ONLY = "no_bg_only"
+GATE_SKIP = "skip"
+GATE_DECISIONS = [GATE_RENDER, GATE_NO_BG_ONLY, GATE_SKIP]
+
+
+class VisibilityGate:
+    """
+    A visibility gate, rendering the frames with enough usable LEDs and applying a fallback decision to the others.
+    """
+
+    def __init__(
+        self,
+        min_visible_leds: int,
+        max_distance: float | None,
+        fallback_decision: str,
+    ) -> None:
+        """
+        Initialize the visibility gate.
+
+        Args:
+            min_visible_leds (int): The minimum number of LEDs in frame, not occluded and close enough, for a frame to be rendered.
+            max_distance (float | None): The maximum distance from the camera of a usable LED, or None for no limit.
+            fallback_decision (str): The decision for the other frames, "no_bg_only" or "skip".
+
+        Raises:
+            ValueError: If the minimum number of visible LEDs is less than 0.
+            ValueError: If the maximum distance is less than or equal to 0.
+            ValueError: If the fallback decision is not "no_bg_only" or "skip".
+        """
+        if min_visible_leds < 0:
+            raise ValueError("❌ The minimum number of visible LEDs must be greater than or equal to 0.")
+        if max_distance is not None and max_distance <= 0:
+            raise ValueError("❌ The maximum distance must be greater than 0.")
+        if fallback_decision not in [GATE_NO_BG_ONLY, GATE_SKIP]:
+            raise ValueError(
+                f"❌ The fallback decision must be {GATE_NO_BG_ONLY} or {GATE_SKIP}."
+            )
+
+        self.min_visible_leds = min_visible_leds
+        self.max_distance = max_distance
+        self.fallback_decision = fallback_decision
+
+    def decide(self, leds_state: Dict[str, np.ndarray]) -> str:
+        """
+        Decide how to render a frame from the state of its LEDs.
+
+        Args:
+            leds_state (Dict[str, np.ndarray]): The state of the LEDs for the frame, without the pixel visibility.
+
+        Returns:
+            str: The decision, "render", "no_bg_only" or "skip".
+        """
+        is_usable = leds_state["is_in_frame"] & ~leds_state["is_occluded"]
+        if self.max_distance is not None:
+            is_usable &= leds_state["distance_from_camera"] <= self.max_distance
+
+        decision = GATE_RENDER
+        if int(np.sum(is_usable)) < self.min_visible_leds:
+            decision = self.fallback_decision
+
+        return decision
+
+
+def write_gate_stats(frames_data: Iterable[Dict[str, Any]], file_path: str) -> None:
+    """
+    Print the decision counts of the recorded frames of a run and write them to a JSON file.
+    The decisions are counted from the frame data rather than while rendering, so that the frames rendered before a resume are included.
+
+    Args:
+        frames_data (Iterable[Dict[str, Any]]): The data of the recorded frames, duplicate frames having the decision of their source.
+        file_path (str): The path of the statistics file.
+    """
+    decision_counts = {decision: 0 for decision in GATE_DECISIONS}
+    for frame_data in frames_data:
+        decision_counts[frame_data.get("gate", GATE_RENDER)] += 1
+
+    n_frames = sum(decision_counts.values())
+    for decision, count in decision_counts.items():
+        percentage = 100 * count / n_frames if n_frames > 0 else 0
+        print(f"➡️  Gate decision {decision}: {count} frames ({percentage:.1f}%).")
+
+    with open(file_path, "w") as f:
+        json.dump({"n_frames": n_frames, "decision_counts": decision_counts}, f)
+
+
+def merge_gate_stats(part_file_paths: List[str], file_path: str) -> None:
+    """
+    Sum the gate statistics of the parts of a run into a single file, if the parts were gated.
+
+    Args:
+        part_file_paths (List[str]): The paths of the statistics files of the parts.
+        file_path (str): The path of the merged statistics file.
+    """
+    part_file_paths = [
+        part_file_path for part_file_path in part_file_paths if os.path.isfile(part_file_path)
+    ]
+    if len(part_file_paths) == 0:
+        return
+
+    decision_counts = {decision: 0 for decision in GATE_DECISIONS}
+    for part_file_path in part_file_paths:
+        with open(part_file_path, "r") as f:
+            for decision, count in json.load(f)["decision_counts"].items():
+                decision_counts[decision] += count
+
+    with open(file_path, "w") as f:
+        json.dump(
+            {"n_frames": sum(decision_counts.values()), "decision_counts": decision_counts},
+            f,
+        )
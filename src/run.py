@@ -4,6 +4,13 @@
 # , where:
 #   --render is a flag indicating whether to render the animation after generating the scene, leaving it out will not render the animation.
 #   --quit is a flag indicating whether to quit Blender after rendering the animation, leaving it out will keep Blender open.
+#   --workers is the number of Blender processes rendering disjoint frame ranges of the scene, 1 by default.
+#   --resume resumes the last partial run, or the run of the given render folder, rendering only its missing frames, leaving it out starts a new run.
+#   --trace is the path of a Chrome trace JSON file recording the pipeline spans, viewable in Perfetto, leaving it out disables tracing.
+#   --render-profile is the name of the render profile applied before rendering, preview, production or ir-fast, RENDER_PROFILE by default.
+#   --compare-profiles renders a few frames of the scene with each render profile instead of the animation, and reports their time per frame and image difference against the production profile.
+#   --seed is the seed the scene is generated with, SEED by default, e.g. to compare the render profiles on a fixed scene.
+# The --frame-range, --render-folder and --armature-suffix arguments are only passed to the workers, along with --seed and --threads.
 
 import os
 import bpy
@@ -46,8 +53,31 @@ for path, name in zip(paths, names):
     spec.loader.exec_module(module)
 
 from utils.bone import Bone
-from utils.seed import set_seed
-from render.render import render
+from utils.seed import set_seed, get_seed, override_seed
+from utils.tracer import enable_tracing, trace_span, write_trace
+from render.render import render, center_camera_on_device, get_render_subfolder
+from render.render_profiles import apply_render_profile, compare_render_profiles
+from render.scene_acceptance import (
+    simulate_timeline,
+    get_failed_criteria,
+    log_acceptance,
+)
+from render.render_state import (
+    get_scene_spec,
+    create_render_state,
+    complete_render_state,
+    take_over_render_state,
+    find_partial_render_folder,
+    lock_render_folder,
+    unlock_render_folder,
+)
+from render.frame_range_render import (
+    save_scene,
+    split_frame_range,
+    render_with_workers,
+    merge_render_parts,
+    is_merged,
+)
 from utils import argument_parser
 from module_operators.all_of import AllOf
 from module_operators.one_of import OneOf
@@ -93,10 +123,20 @@ from config.config import (
     CAMERA_FOCAL_LENGTH,
     CAMERA_FOV_DEGREES,
     RENDER_RESOLUTION,
+    RENDER_FOLDER_PATH,
+    RENDER_FOLDER_SHARD_LEVELS,
     BACKGROUND_COLLECTION_NAME,
     HIDE_ARMATURE_PROBABILITY,
     ANIMATION_LENGTH,
     BACKGROUND_COLOR_SKEW_FACTOR,
+    SCENE_ACCEPTANCE,
+    SCENE_ACCEPTANCE_MAX_ATTEMPTS,
+    ACCEPTANCE_MIN_IN_FRAME_RATIO,
+    ACCEPTANCE_MIN_VISIBLE_FRAME_RATIO,
+    ACCEPTANCE_MIN_VISIBLE_LED_RATIO,
+    ACCEPTANCE_LOG_FILE_NAME,
+    RENDER_PROFILE,
+    PROFILE_COMPARISON_N_FRAMES,
 )
 
 
@@ -246,6 +286,80 @@ def get_parser() -> argument_parser.ArgumentParserForBlender:
         default=False,
     )
 
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="The number of Blender processes rendering disjoint frame ranges of the scene.",
+        type=int,
+        default=1,
+    )
+
+    parser.add_argument(
+        "--resume",
+        help="Resume the last partial run, or the run of the given render folder, rendering only its missing frames.",
+        type=str,
+        nargs="?",
+        const="",
+        default=None,
+    )
+
+    parser.add_argument(
+        "--frame-range",
+        help="The first and last frames to render, only rendering the saved scene without generating it.",
+        type=int,
+        nargs=2,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--render-folder",
+        help="The folder to render to, with --frame-range.",
+        type=str,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--armature-suffix",
+        help="The suffix of the armature of the saved scene, with --frame-range.",
+        type=str,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--seed",
+        help="The random seed to generate the scene with, or the seed the saved scene was generated with, with --frame-range.",
+        type=int,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--trace",
+        help="The path of a Chrome trace JSON file to record the pipeline spans to, viewable in Perfetto.",
+        type=str,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--render-profile",
+        help="The name of the render profile applied before rendering, preview, production or ir-fast.",
+        type=str,
+        default=RENDER_PROFILE,
+    )
+
+    parser.add_argument(
+        "--compare-profiles",
+        help="Whether to compare the time per frame and images of the render profiles on a few frames of the scene, instead of rendering the animation.",
+        action="store_true",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--threads",
+        help="The number of render threads, all available threads by default.",
+        type=int,
+        default=None,
+    )
+
     return parser
 
 
@@ -637,20 +751,30 @@ def get_background(blender_objects: dict) -> BlenderCollection:
     return background_collection
 
 
-def main() -> None:
+def generate_scene(
+    render_state: dict | None, center_camera: bool
+) -> Tuple[str, dict]:
     """
-    Run a Blender scene for synthetic data generation.
+    Generate the scene from the current seed, from the armature to the background image.
+
+    Args:
+        render_state (dict | None): The render state of the resumed run, which the generated scene must match, or None.
+        center_camera (bool): Whether to center the camera on the device with a given probability, as done before rendering.
+
+    Raises:
+        ValueError: If the generated scene does not match the resumed run.
+
+    Returns:
+        str: The armature suffix.
+        dict: The scene spec of the generated input data.
     """
-    # Parse the arguments
-    parser = get_parser()
-    args = parser.parse_args()
-    
     set_seed()
 
     # Get bones
-    armature, arm, forearm, hand, armature_suffix = setup_scene_and_get_objects(
-        hide_armature_probability=HIDE_ARMATURE_PROBABILITY,
-    )
+    with trace_span("setup_armature"):
+        armature, arm, forearm, hand, armature_suffix = setup_scene_and_get_objects(
+            hide_armature_probability=HIDE_ARMATURE_PROBABILITY,
+        )
 
     # Generate input data
     print("⏳ Generating input data...")
@@ -661,9 +785,19 @@ def main() -> None:
         camera_module=camera_module, 
         modules=modules,
     )
-    input_data = input_data_generator.generate_input_data()
+    with trace_span("InputDataGenerator.generate_input_data"):
+        input_data = input_data_generator.generate_input_data()
+    scene_spec = get_scene_spec(input_data)
+    if render_state is not None and (
+        armature_suffix != render_state["armature_suffix"]
+        or scene_spec != render_state["scene_spec"]
+    ):
+        raise ValueError(
+            "❌ The generated scene does not match the resumed run, the configuration must have changed."
+        )
     input_file_parser = InputDataParser(input_data)
-    input_data = input_file_parser.parse(armature)
+    with trace_span("InputDataParser.parse"):
+        input_data = input_file_parser.parse(armature)
 
     # Add gesture sequence
     print("⏳ Applying gestures...")
@@ -675,43 +809,257 @@ def main() -> None:
         forearm=forearm,
         hand=hand,
     )
-    gesture_sequence.apply()
+    with trace_span("GestureSequence.apply"):
+        gesture_sequence.apply()
 
     # Add background objects
     print("⏳ Adding background...")
     blender_objects = input_data["blender_objects"]
     background = get_background(blender_objects)
-    background.apply()
+    with trace_span("BlenderCollection.apply"):
+        background.apply()
 
     # Add background image
     print("⏳ Adding background image...")
-    random_background_image_generator = RandomBackgroundImageGenerator(
-        width=RENDER_RESOLUTION[0],
-        height=RENDER_RESOLUTION[1],
-        n_patches_range=(1000, 10000),
-        n_patch_corners_range=(1, 10),
-        patch_size_range=(1, 50),
-        n_lines_range=(10, 100),
-        line_size_range=(1, 100),
-        n_line_points_range=(3, 25),
-        line_thickness_range=(1, 3),
-        smooth_gaussian_kernel_size=301,
-        n_blur_steps=5,
-        max_blur=5,
-        color_skew_factor=BACKGROUND_COLOR_SKEW_FACTOR,
-    )
-    random_background_image_generator.apply_to_scene()
+    with trace_span("background_image"):
+        random_background_image_generator = RandomBackgroundImageGenerator(
+            width=RENDER_RESOLUTION[0],
+            height=RENDER_RESOLUTION[1],
+            n_patches_range=(1000, 10000),
+            n_patch_corners_range=(1, 10),
+            patch_size_range=(1, 50),
+            n_lines_range=(10, 100),
+            line_size_range=(1, 100),
+            n_line_points_range=(3, 25),
+            line_thickness_range=(1, 3),
+            smooth_gaussian_kernel_size=301,
+            n_blur_steps=5,
+            max_blur=5,
+            color_skew_factor=BACKGROUND_COLOR_SKEW_FACTOR,
+        )
+        random_background_image_generator.apply_to_scene()
 
     # Set output resolution
     print(f"➡️  Resolution set to {RENDER_RESOLUTION[0]}×{RENDER_RESOLUTION[1]}.")
     bpy.context.scene.render.resolution_x = RENDER_RESOLUTION[0]
     bpy.context.scene.render.resolution_y = RENDER_RESOLUTION[1]
 
+    if center_camera:
+        center_camera_on_device(armature_suffix)
+
+    return armature_suffix, scene_spec
+
+
+def is_scene_accepted(armature_suffix: str, scene_spec: dict, n_attempts: int) -> bool:
+    """
+    Simulate the timeline of the generated scene without rendering, decide whether it is worth rendering, and log the decision.
+
+    Args:
+        armature_suffix (str): The suffix of the armature.
+        scene_spec (dict): The scene spec of the generated input data.
+        n_attempts (int): The number of scenes generated by the run so far, this one included.
+
+    Returns:
+        bool: Whether the scene is accepted.
+    """
+    with trace_span("simulate_timeline"):
+        stats = simulate_timeline(armature_suffix)
+    failed_criteria = get_failed_criteria(
+        stats,
+        min_in_frame_ratio=ACCEPTANCE_MIN_IN_FRAME_RATIO,
+        min_visible_frame_ratio=ACCEPTANCE_MIN_VISIBLE_FRAME_RATIO,
+        min_visible_led_ratio=ACCEPTANCE_MIN_VISIBLE_LED_RATIO,
+    )
+    log_acceptance(
+        os.path.join(RENDER_FOLDER_PATH, ACCEPTANCE_LOG_FILE_NAME),
+        {
+            "seed": get_seed(),
+            "attempt": n_attempts,
+            "armature_suffix": armature_suffix,
+            "is_hidden_armature": bpy.data.objects[f"Arm{armature_suffix}"].hide_render,
+            "gestures": list(scene_spec["gestures"]),
+            "blender_objects": list(scene_spec["blender_objects"]),
+            "stats": stats,
+            "failed_criteria": failed_criteria,
+            "is_accepted": len(failed_criteria) == 0,
+        },
+    )
+    print(
+        "➡️  Simulated timeline: "
+        + ", ".join(f"{name} {value:.2f}" for name, value in stats.items())
+        + "."
+    )
+
+    return len(failed_criteria) == 0
+
+
+def render_frame_range(args) -> None:
+    """
+    Render a frame range of a saved scene, as a worker of a scene rendered by several processes.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Raises:
+        ValueError: If the render folder, armature suffix or seed is missing.
+    """
+    if args.render_folder is None or args.armature_suffix is None or args.seed is None:
+        raise ValueError(
+            "❌ --render-folder, --armature-suffix and --seed are required with --frame-range."
+        )
+
+    override_seed(args.seed)
+    set_seed()
+    if args.threads is not None:
+        bpy.context.scene.render.threads_mode = "FIXED"
+        bpy.context.scene.render.threads = args.threads
+
+    if args.trace is not None:
+        enable_tracing(args.trace)
+
+    render(
+        args.armature_suffix,
+        args.render_folder,
+        tuple(args.frame_range),
+        resume=args.resume is not None,
+    )
+    write_trace()
+
+
+def main() -> None:
+    """
+    Run a Blender scene for synthetic data generation.
+    """
+    # Parse the arguments
+    parser = get_parser()
+    args = parser.parse_args()
+
+    # Only render a frame range of the already generated scene
+    if args.frame_range is not None:
+        render_frame_range(args)
+        return
+
+    if args.workers <= 0:
+        raise ValueError("❌ The number of workers must be greater than 0.")
+    if args.compare_profiles and (args.render or args.resume is not None):
+        raise ValueError("❌ --compare-profiles cannot be used with --render or --resume.")
+    if args.seed is not None and args.resume is None:
+        override_seed(args.seed)
+
+    # Generate the scene of the resumed run again from its seed
+    render_state = None
+    if args.resume is not None:
+        if not args.render:
+            raise ValueError("❌ --resume requires --render.")
+        render_folder_path = args.resume
+        if render_folder_path == "":
+            render_folder_path = find_partial_render_folder(
+                RENDER_FOLDER_PATH, RENDER_FOLDER_SHARD_LEVELS
+            )
+        elif not lock_render_folder(render_folder_path):
+            raise ValueError(
+                f"❌ Render folder {render_folder_path} is being rendered by another process."
+            )
+        render_state = take_over_render_state(render_folder_path)
+        override_seed(render_state["seed"])
+        print(f"♻️  Resuming {os.path.abspath(render_folder_path)}.")
+
+    if args.trace is not None:
+        enable_tracing(args.trace)
+
+    # Generate scenes until one passes the acceptance test of its simulated timeline
+    for n_attempts in range(1, SCENE_ACCEPTANCE_MAX_ATTEMPTS + 1):
+        armature_suffix, scene_spec = generate_scene(
+            render_state, args.render or args.compare_profiles
+        )
+        if not SCENE_ACCEPTANCE or not args.render or render_state is not None:
+            break
+        if is_scene_accepted(armature_suffix, scene_spec, n_attempts):
+            break
+        if n_attempts == SCENE_ACCEPTANCE_MAX_ATTEMPTS:
+            raise ValueError(
+                f"❌ No scene accepted after {SCENE_ACCEPTANCE_MAX_ATTEMPTS} attempts."
+            )
+
+        # Start over from the saved file with a new seed derived from the rejected one
+        bpy.ops.wm.revert_mainfile()
+        override_seed(int(np.random.default_rng(get_seed()).integers(0, 2**32 - 1)))
+        print(f"♻️  Scene rejected, generating a new scene with seed {get_seed()}.")
+
+    if args.render_profile is not None:
+        apply_render_profile(bpy.context.scene, args.render_profile)
+    if args.threads is not None:
+        bpy.context.scene.render.threads_mode = "FIXED"
+        bpy.context.scene.render.threads = args.threads
+
+    # Compare the render profiles on frames evenly spaced over the timeline
+    if args.compare_profiles:
+        print("⏳ Comparing render profiles...")
+        frames = np.unique(
+            np.linspace(
+                bpy.context.scene.frame_start,
+                bpy.context.scene.frame_end,
+                PROFILE_COMPARISON_N_FRAMES,
+            ).round().astype(int)
+        ).tolist()
+        with trace_span("compare_render_profiles"):
+            compare_render_profiles(armature_suffix, get_render_subfolder(), frames)
+
     # Render the animation if specified
     if args.render:
         print("⏳ Rendering...")
-        render(armature_suffix, random_background_image_generator)
+        frame_start, frame_end = bpy.context.scene.frame_start, bpy.context.scene.frame_end
+        if render_state is None:
+            render_folder_path = get_render_subfolder()
+            lock_render_folder(render_folder_path)
+            frame_ranges = None
+            if args.workers > 1:
+                frame_ranges = split_frame_range(frame_start, frame_end, args.workers)
+            render_state = create_render_state(
+                render_folder_path,
+                get_seed(),
+                armature_suffix,
+                scene_spec,
+                frame_start,
+                frame_end,
+                frame_ranges,
+            )
+            is_resumed = False
+        else:
+            if (frame_start, frame_end) != (
+                render_state["frame_start"],
+                render_state["frame_end"],
+            ):
+                raise ValueError(
+                    "❌ The frame range does not match the resumed run, the configuration must have changed."
+                )
+            frame_ranges = render_state["frame_ranges"]
+            if frame_ranges is not None:
+                frame_ranges = [tuple(frame_range) for frame_range in frame_ranges]
+            is_resumed = True
+
+        if frame_ranges is None:
+            render(armature_suffix, render_folder_path, resume=is_resumed)
+        elif not is_resumed or not is_merged(render_folder_path):
+            with trace_span("save_scene"):
+                scene_file_path = save_scene(render_folder_path)
+            with trace_span("render_with_workers"):
+                render_with_workers(
+                    scene_file_path,
+                    os.path.join(wrk_dir, "run.py"),
+                    render_folder_path,
+                    armature_suffix,
+                    get_seed(),
+                    frame_ranges,
+                    args.trace,
+                    is_resumed,
+                )
+            with trace_span("merge_render_parts"):
+                merge_render_parts(render_folder_path, frame_ranges)
+        complete_render_state(render_folder_path, render_state)
+        unlock_render_folder(render_folder_path)
 
+    write_trace()
     print("✅ Done!")
 
     # Close Blender
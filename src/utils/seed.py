@@ -5,9 +5,33 @@ import numpy as np
 
 from config.config import SEED
 
+seed = SEED
+
+
+def get_seed() -> int:
+    """
+    Get the random seed of the run.
+
+    Returns:
+        int: The random seed.
+    """
+    return seed
+
+
+def override_seed(new_seed: int) -> None:
+    """
+    Override the random seed of the run, e.g. to render a scene built by another process.
+
+    Args:
+        new_seed (int): The new random seed.
+    """
+    global seed
+    seed = new_seed
+
+
 def set_seed() -> None:
     """
     Set the random seed for reproducibility.
     """
-    random.seed(SEED)
-    np.random.seed(SEED)
\ No newline at end of file
+    random.seed(seed)
+    np.random.seed(seed)
@@ -0,0 +1,120 @@
+# This utility file contains the tracer, recording spans of the pipeline as Chrome trace events viewable in Perfetto.
+
+import os
+import json
+import time
+import threading
+from typing import Any, Dict, List
+
+
+class Span:
+    """
+    A traced span, recorded as a complete event when exited.
+    """
+
+    def __init__(
+        self, events: List[Dict[str, Any]], name: str, category: str, args: Dict[str, Any]
+    ) -> None:
+        """
+        Initialize the span.
+
+        Args:
+            events (List[Dict[str, Any]]): The events of the tracer to record the span to.
+            name (str): The name of the span.
+            category (str): The category of the span.
+            args (Dict[str, Any]): The arguments shown with the span.
+        """
+        self.events = events
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = 0
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *args) -> None:
+        end = time.perf_counter_ns()
+        self.events.append(
+            {
+                "name": self.name,
+                "cat": self.category,
+                "ph": "X",
+                "ts": self.start / 1000,
+                "dur": (end - self.start) / 1000,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": self.args,
+            }
+        )
+
+
+class NullSpan:
+    """
+    A span doing nothing, returned while tracing is disabled.
+    """
+
+    def __enter__(self) -> "NullSpan":
+        return self
+
+    def __exit__(self, *args) -> None:
+        return None
+
+
+NULL_SPAN = NullSpan()
+events: List[Dict[str, Any]] | None = None
+trace_file_path: str | None = None
+
+
+def enable_tracing(file_path: str) -> None:
+    """
+    Enable tracing, the trace being written to a file by write_trace.
+
+    Args:
+        file_path (str): The path of the Chrome trace JSON file.
+    """
+    global events, trace_file_path
+    events = []
+    trace_file_path = file_path
+
+
+def is_tracing_enabled() -> bool:
+    """
+    Check if tracing is enabled.
+
+    Returns:
+        bool: Whether tracing is enabled.
+    """
+    return events is not None
+
+
+def trace_span(name: str, category: str = "pipeline", **args: Any) -> Span | NullSpan:
+    """
+    Get a span to trace a block with, as a context manager.
+
+    Args:
+        name (str): The name of the span.
+        category (str, optional): The category of the span. Defaults to "pipeline".
+        **args (Any): The arguments shown with the span.
+
+    Returns:
+        Span | NullSpan: The span, or a shared span doing nothing if tracing is disabled.
+    """
+    if events is None:
+        return NULL_SPAN
+
+    return Span(events, name, category, args)
+
+
+def write_trace() -> None:
+    """
+    Write the recorded spans to the trace file, if tracing is enabled.
+    """
+    if events is None:
+        return
+
+    os.makedirs(os.path.dirname(os.path.abspath(trace_file_path)), exist_ok=True)
+    with open(trace_file_path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    print(f"➡️  Trace written to {os.path.abspath(trace_file_path)}.")